@@ -0,0 +1,50 @@
+"""Compare rows/sec of one INSERT + COMMIT per log (/add_to_db) with LogsManager.create_logs_bulk.
+
+Needs the database from .env with at least one user; the inserted rows are deleted afterwards.
+
+    python -m benchmarks.logs_bulk_insert [--rows 5000]
+"""
+import argparse
+import asyncio
+import time
+
+from sqlalchemy import delete, func, select
+
+from src.database import async_session_maker
+from src.manager import LogsManager
+from src.models import Logs, User
+from src.schemas import LogSchema
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=5000)
+    args = parser.parse_args()
+    logs = [LogSchema(winner_id=i % 150 + 1, loser_id=(i + 7) % 150 + 1, total_rounds=i % 20 + 1)
+            for i in range(args.rows)]
+
+    async with async_session_maker() as session:
+        user_id = (await session.execute(select(User.id).limit(1))).scalar_one_or_none()
+        if user_id is None:
+            raise SystemExit("Register a user first")
+        first_id = (await session.execute(select(func.coalesce(func.max(Logs.id), 0)))).scalar_one()
+        manager = LogsManager(session)
+
+        started = time.perf_counter()
+        for log in logs:
+            await manager.create_log(user_id, log.winner_id, log.loser_id, log.total_rounds)
+        single = args.rows / (time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await manager.create_logs_bulk(user_id, logs)
+        bulk = args.rows / (time.perf_counter() - started)
+
+        await session.execute(delete(Logs).where(Logs.id > first_id))
+        await session.commit()
+
+    print(f"{'rows':>6} {'single rows/s':>14} {'bulk rows/s':>12} {'speedup':>8}")
+    print(f"{args.rows:>6} {single:>14.0f} {bulk:>12.0f} {bulk / single:>7.1f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,69 @@
+"""Login throughput and event loop latency while logins are verified inline, in threads or in processes.
+
+Each login is one PasswordHasher.verify_and_update call, as in UserManager.authenticate. Next to them a probe
+stands in for an unrelated endpoint: it sleeps 5 ms in a loop and records how late it wakes up.
+
+    python -m benchmarks.password_hashing [--logins 50] [--concurrency 32] [--workers 4]
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from src.auth.hashing import PasswordHasher, password_helper
+
+PASSWORD = "Pikachu1!"
+
+
+async def probe(lags: list, stop: asyncio.Event):
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(0.005)
+        lags.append(time.perf_counter() - started - 0.005)
+
+
+async def run(mode: str, hashed: str, logins: int, concurrency: int, workers: int) -> dict:
+    hasher = PasswordHasher(mode=mode, workers=workers, max_pending=concurrency)
+    hasher.start()
+    # warm the pool up so process start-up is not measured
+    await asyncio.gather(*(hasher.verify_and_update(PASSWORD, hashed) for _ in range(workers)))
+    semaphore = asyncio.Semaphore(concurrency)
+    lags, stop = [], asyncio.Event()
+
+    async def login():
+        async with semaphore:
+            await hasher.verify_and_update(PASSWORD, hashed)
+
+    prober = asyncio.create_task(probe(lags, stop))
+    started = time.perf_counter()
+    await asyncio.gather(*(login() for _ in range(logins)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await prober
+    hasher.shutdown()
+    lags.sort()
+    return {
+        "logins/s": logins / elapsed,
+        "p50 lag ms": 1000 * statistics.median(lags) if lags else float("nan"),
+        "p99 lag ms": 1000 * lags[int(len(lags) * 0.99)] if lags else float("nan"),
+        "max lag ms": 1000 * lags[-1] if lags else float("nan"),
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--logins", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+    hashed = password_helper.hash(PASSWORD)
+
+    print(f"{'mode':>8} {'logins/s':>9} {'p50 lag ms':>11} {'p99 lag ms':>11} {'max lag ms':>11}")
+    for mode in ("inline", "thread", "process"):
+        result = await run(mode, hashed, args.logins, args.concurrency, args.workers)
+        print(f"{mode:>8} " + " ".join(f"{value:>{len(key) + (1 if key == 'logins/s' else 0)}.1f}"
+                                       for key, value in result.items()))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,92 @@
+"""Compare per-hit cost of /pokemon/{poke_name} cached as JSON (decoded and revalidated through PokemonSchema)
+with the pre-serialized ResponseCoder entries and the normalized, deflated CompactResponseCoder entries.
+
+    python -m benchmarks.pokemon_cache_hits
+"""
+import time
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from fastapi_cache import FastAPICache, JsonCoder
+from fastapi_cache.backends.inmemory import InMemoryBackend
+
+from src.cache import ResponseCoder, CompactResponseCoder, cached
+from src.schemas import PokemonSchema
+
+REQUESTS = 100
+
+PokemonCoder = CompactResponseCoder.for_model(PokemonSchema)
+
+
+def resource(kind: str, i: int) -> dict:
+    return {"name": f"{kind}-{i}", "url": f"https://pokeapi.co/api/v2/{kind}/{i}/"}
+
+
+def make_pokemon(moves: int) -> dict:
+    # moves are distinct, version groups and learn methods repeat across them as in real PokeAPI records
+    return {
+        "abilities": [{"ability": resource("ability", i), "is_hidden": i == 1, "slot": i + 1} for i in range(2)],
+        "forms": [resource("pokemon-form", 25)],
+        "game_indices": [{"game_index": 84, "version": resource("version", i)} for i in range(20)],
+        "height": 4,
+        "id": 25,
+        "moves": [{"move": resource("move", m), "version_group_details": [
+            {"level_learned_at": m % 50, "move_learn_method": resource("move-learn-method", (m + g) % 4),
+             "version_group": resource("version-group", g)} for g in range(10)
+        ]} for m in range(moves)],
+        "name": "pikachu",
+        "order": 35,
+        "species": resource("pokemon-species", 25),
+        "sprites": {"front_default": None, "front_shiny": None},
+        "stats": [{"base_stat": 35, "effort": 0, "stat": resource("stat", i)} for i in range(6)],
+        "types": [{"slot": 1, "type": resource("type", 13)}],
+        "weight": 60,
+    }
+
+
+def make_app(payload: dict) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/json/{poke_name}", response_model=PokemonSchema)
+    @cached(expire=600, namespace="json", coder=JsonCoder)
+    async def json_pokemon(poke_name: str):
+        return PokemonSchema(**payload)
+
+    @app.get("/response/{poke_name}", response_model=PokemonSchema)
+    @cached(expire=600, namespace="response", coder=ResponseCoder)
+    async def response_pokemon(poke_name: str):
+        return PokemonSchema(**payload)
+
+    @app.get("/compact/{poke_name}", response_model=PokemonSchema)
+    @cached(expire=600, namespace="compact", coder=PokemonCoder)
+    async def compact_pokemon(poke_name: str):
+        return PokemonSchema(**payload)
+
+    return app
+
+
+def measure(client: TestClient, path: str) -> float:
+    client.get(path)
+    started = time.perf_counter()
+    for _ in range(REQUESTS):
+        response = client.get(path)
+        assert response.headers["X-FastAPI-Cache"] == "HIT"
+    return (time.perf_counter() - started) / REQUESTS * 1000
+
+
+def main():
+    FastAPICache.init(InMemoryBackend(), prefix="fastapi-cache")
+    print(f"{'moves':>6} {'bytes':>9} {'compact bytes':>14} {'json hit, ms':>13} {'response hit, ms':>17} "
+          f"{'compact hit, ms':>16}")
+    for moves in (10, 100, 500, 1000):
+        payload = make_pokemon(moves)
+        client = TestClient(make_app(payload))
+        size = len(ResponseCoder.encode(PokemonSchema(**payload)))
+        compact_size = len(PokemonCoder.encode(PokemonSchema(**payload)))
+        print(f"{moves:>6} {size:>9} {compact_size:>14} {measure(client, f'/json/pikachu-{moves}'):>13.3f} "
+              f"{measure(client, f'/response/pikachu-{moves}'):>17.3f} "
+              f"{measure(client, f'/compact/pikachu-{moves}'):>16.3f}")
+
+
+if __name__ == "__main__":
+    main()
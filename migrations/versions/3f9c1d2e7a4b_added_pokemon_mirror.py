@@ -0,0 +1,33 @@
+"""added_pokemon_mirror
+
+Revision ID: 3f9c1d2e7a4b
+Revises: 4939ee17c4eb
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '3f9c1d2e7a4b'
+down_revision: Union[str, None] = '4939ee17c4eb'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('pokemon',
+                    sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+                    sa.Column('name', sa.String(length=100), nullable=False),
+                    sa.Column('data', sa.JSON(), nullable=False),
+                    sa.Column('updated_at', sa.TIMESTAMP(), nullable=False),
+                    sa.PrimaryKeyConstraint('id')
+                    )
+    op.create_index(op.f('ix_pokemon_name'), 'pokemon', ['name'], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_pokemon_name'), table_name='pokemon')
+    op.drop_table('pokemon')
@@ -0,0 +1,36 @@
+"""added_logs_keyset_indexes
+
+Revision ID: 8d2b6c1f4e90
+Revises: 3f9c1d2e7a4b
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = '8d2b6c1f4e90'
+down_revision: Union[str, None] = '3f9c1d2e7a4b'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDEXES = {
+    'ix_logs_created_at_id': ['created_at', 'id'],
+    'ix_logs_user_id_created_at_id': ['user_id', 'created_at', 'id'],
+    'ix_logs_winner_id_created_at_id': ['winner_id', 'created_at', 'id'],
+    'ix_logs_loser_id_created_at_id': ['loser_id', 'created_at', 'id'],
+}
+
+
+def upgrade() -> None:
+    # CONCURRENTLY keeps the table writable while large indexes build; it cannot run inside a transaction
+    with op.get_context().autocommit_block():
+        for name, columns in INDEXES.items():
+            op.create_index(name, 'logs', columns, postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name in INDEXES:
+            op.drop_index(name, table_name='logs', postgresql_concurrently=True, if_exists=True)
@@ -0,0 +1,94 @@
+"""added_logs_partitioning
+
+Revision ID: c47e9a0d5b13
+Revises: 8d2b6c1f4e90
+Create Date: 2026-10-18 16:00:00.000000
+
+"""
+from datetime import date, datetime
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'c47e9a0d5b13'
+down_revision: Union[str, None] = '8d2b6c1f4e90'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDEXES = {
+    'ix_logs_created_at_id': ['created_at', 'id'],
+    'ix_logs_user_id_created_at_id': ['user_id', 'created_at', 'id'],
+    'ix_logs_winner_id_created_at_id': ['winner_id', 'created_at', 'id'],
+    'ix_logs_loser_id_created_at_id': ['loser_id', 'created_at', 'id'],
+}
+MONTHS_AHEAD = 3
+COLUMNS = 'id, user_id, winner_id, loser_id, total_rounds, created_at'
+
+
+def add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def rename_logs_to_logs_old():
+    # the new table takes over the constraint and sequence names, instead of getting logs_pkey1 and the like
+    op.rename_table('logs', 'logs_old')
+    bind = op.get_bind()
+    constraints = bind.execute(sa.text(
+        "SELECT conname FROM pg_constraint WHERE conrelid = 'logs_old'::regclass AND conname LIKE 'logs\\_%'"
+    )).scalars().all()
+    for name in constraints:
+        op.execute(f"ALTER TABLE logs_old RENAME CONSTRAINT {name} TO logs_old{name[len('logs'):]}")
+    sequence = bind.execute(sa.text("SELECT pg_get_serial_sequence('logs_old', 'id')")).scalar()
+    if sequence is not None:
+        op.execute(f"ALTER SEQUENCE {sequence} RENAME TO logs_old_id_seq")
+    for name in INDEXES:
+        op.drop_index(name, table_name='logs_old')
+
+
+def create_logs_table(partitioned: bool):
+    op.execute(f"""
+        CREATE TABLE logs (
+            id INTEGER GENERATED ALWAYS AS IDENTITY,
+            user_id UUID NOT NULL REFERENCES "user" (id),
+            winner_id INTEGER NOT NULL,
+            loser_id INTEGER NOT NULL,
+            total_rounds INTEGER NOT NULL,
+            created_at TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+            PRIMARY KEY ({'id, created_at' if partitioned else 'id'})
+        ){' PARTITION BY RANGE (created_at)' if partitioned else ''}
+    """)
+
+
+def move_rows_from_old_logs():
+    op.execute(f"INSERT INTO logs ({COLUMNS}) OVERRIDING SYSTEM VALUE SELECT {COLUMNS} FROM logs_old")
+    op.execute("SELECT setval(pg_get_serial_sequence('logs', 'id'), COALESCE((SELECT MAX(id) FROM logs), 0) + 1, false)")
+    op.drop_table('logs_old')
+    for name, columns in INDEXES.items():
+        op.create_index(name, 'logs', columns)
+
+
+def upgrade() -> None:
+    # The rows are copied in this transaction: on a large table, run it in a maintenance window.
+    rename_logs_to_logs_old()
+    create_logs_table(partitioned=True)
+
+    # one partition per month that has rows, up to MONTHS_AHEAD months from now; src.partitions keeps ahead
+    first = op.get_bind().execute(sa.text("SELECT MIN(created_at) FROM logs_old")).scalar()
+    month = (first or datetime.utcnow()).date().replace(day=1)
+    last = add_months(datetime.utcnow().date().replace(day=1), MONTHS_AHEAD)
+    while month <= last:
+        op.execute(f"CREATE TABLE logs_y{month.year:04d}m{month.month:02d} PARTITION OF logs "
+                   f"FOR VALUES FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')")
+        month = add_months(month, 1)
+    op.execute("CREATE TABLE logs_default PARTITION OF logs DEFAULT")
+
+    move_rows_from_old_logs()
+
+
+def downgrade() -> None:
+    rename_logs_to_logs_old()
+    create_logs_table(partitioned=False)
+    move_rows_from_old_logs()
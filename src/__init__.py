@@ -1,4 +1,4 @@
 from src.models import Base
-from src.database import get_async_session
+from src.database import get_async_session, get_read_session
 from src.main import app
 from src.mail_service import send_logs_mail
@@ -1,8 +1,14 @@
 import uuid
+from datetime import datetime
+from typing import AsyncIterator, List, Optional, Sequence, Tuple
 
+from sqlalchemy import Row, Select, insert, or_, select, tuple_, union_all
+from sqlalchemy.orm import aliased
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from .config import LOGS_BULK_CHUNK_SIZE, LOGS_EXPORT_CHUNK_SIZE
 from .models import Logs
+from .schemas import LogSchema
 
 
 class SQLAlchemyLogsAdapter:
@@ -17,3 +23,78 @@ class SQLAlchemyLogsAdapter:
         logs = Logs(user_id=user_id, winner_id=winner_id, loser_id=loser_id, total_rounds=total_rounds)
         self.session.add(logs)
         await self.session.commit()
+
+    async def insert_logs(self, user_id: uuid.UUID, logs: List[LogSchema]):
+        # executemany form: one cached statement, batched by the driver, instead of compiling a VALUES list per chunk
+        for start in range(0, len(logs), LOGS_BULK_CHUNK_SIZE):
+            chunk = logs[start:start + LOGS_BULK_CHUNK_SIZE]
+            await self.session.execute(insert(Logs), [
+                {"user_id": user_id, "winner_id": log.winner_id, "loser_id": log.loser_id,
+                 "total_rounds": log.total_rounds}
+                for log in chunk
+            ])
+
+    async def create_logs_bulk(self, user_id: uuid.UUID, logs: List[LogSchema]) -> int:
+        await self.insert_logs(user_id, logs)
+        await self.session.commit()
+        return len(logs)
+
+    async def get_logs(
+            self,
+            limit: int,
+            after: Optional[Tuple[datetime, int]] = None,
+            user_id: Optional[uuid.UUID] = None,
+            pokemon_id: Optional[int] = None,
+            created_from: Optional[datetime] = None,
+            created_to: Optional[datetime] = None,
+    ) -> List[Logs]:
+        """Newest first, keyset-paginated on ``(created_at, id)``: ``after`` is the last row of the previous page."""
+
+        def page(entity, *conditions) -> Select:
+            stmt = select(entity).where(*conditions)
+            if user_id is not None:
+                stmt = stmt.where(entity.user_id == user_id)
+            if created_from is not None:
+                stmt = stmt.where(entity.created_at >= created_from)
+            if created_to is not None:
+                stmt = stmt.where(entity.created_at < created_to)
+            if after is not None:
+                # the plain bound on created_at lets the planner skip partitions newer than the cursor
+                stmt = stmt.where(entity.created_at <= after[0],
+                                  tuple_(entity.created_at, entity.id) < tuple_(*after))
+            return stmt.order_by(entity.created_at.desc(), entity.id.desc()).limit(limit)
+
+        if pokemon_id is None:
+            stmt = page(Logs)
+        else:
+            # winner OR loser would defeat both indexes, so each side walks its own index and the pages are merged
+            winners, losers = aliased(Logs), aliased(Logs)
+            winner_ids = page(winners, winners.winner_id == pokemon_id).with_only_columns(winners.id).subquery()
+            loser_ids = page(losers, losers.loser_id == pokemon_id, losers.winner_id != pokemon_id) \
+                .with_only_columns(losers.id).subquery()
+            ids = union_all(select(winner_ids.c.id), select(loser_ids.c.id))
+            stmt = page(Logs, Logs.id.in_(ids))
+        return list((await self.session.execute(stmt)).scalars())
+
+    async def stream_logs(
+            self,
+            user_id: Optional[uuid.UUID] = None,
+            pokemon_id: Optional[int] = None,
+            created_from: Optional[datetime] = None,
+            created_to: Optional[datetime] = None,
+            chunk_size: int = LOGS_EXPORT_CHUNK_SIZE,
+    ) -> AsyncIterator[Sequence[Row]]:
+        """Oldest first, ``chunk_size`` rows at a time from a server-side cursor; same filters as ``get_logs``."""
+        stmt = select(Logs.id, Logs.user_id, Logs.winner_id, Logs.loser_id, Logs.total_rounds, Logs.created_at)
+        if user_id is not None:
+            stmt = stmt.where(Logs.user_id == user_id)
+        if pokemon_id is not None:
+            stmt = stmt.where(or_(Logs.winner_id == pokemon_id, Logs.loser_id == pokemon_id))
+        if created_from is not None:
+            stmt = stmt.where(Logs.created_at >= created_from)
+        if created_to is not None:
+            stmt = stmt.where(Logs.created_at < created_to)
+        stmt = stmt.order_by(Logs.created_at, Logs.id).execution_options(yield_per=chunk_size)
+        result = await self.session.stream(stmt)
+        async for rows in result.partitions():
+            yield rows
@@ -0,0 +1,50 @@
+from typing import Dict, List, Optional
+
+
+def canonical_name(poke_name: str) -> str:
+    # PokeAPI names are lowercase and hyphenated
+    return "-".join(poke_name.strip().lower().split())
+
+
+class AliasIndex:
+    """Maps Pokemon names to ids, learned from fetched records, so every spelling shares one cache entry.
+
+    Lookups hit a per-worker dict first and the shared redis hash after that, when a client is set.
+    """
+
+    key = "pokemon:aliases"
+
+    def __init__(self, redis=None):
+        self.redis = redis
+        self._ids: Dict[str, int] = {}
+
+    async def resolve(self, poke_name: str) -> Optional[int]:
+        name = canonical_name(poke_name)
+        if name.isdigit():
+            return int(name)
+        if name in self._ids:
+            return self._ids[name]
+        if self.redis is None:
+            return None
+        poke_id = await self.redis.hget(self.key, name)
+        if poke_id is None:
+            return None
+        self._ids[name] = int(poke_id)
+        return self._ids[name]
+
+    async def resolve_many(self, poke_names: List[str]) -> List[Optional[int]]:
+        """``resolve`` for every name, with one HMGET for the names this worker has not seen yet."""
+        names = [canonical_name(poke_name) for poke_name in poke_names]
+        unknown = [name for name in dict.fromkeys(names) if not name.isdigit() and name not in self._ids]
+        if unknown and self.redis is not None:
+            for name, poke_id in zip(unknown, await self.redis.hmget(self.key, unknown)):
+                if poke_id is not None:
+                    self._ids[name] = int(poke_id)
+        return [int(name) if name.isdigit() else self._ids.get(name) for name in names]
+
+    async def learn(self, name: str, poke_id: int):
+        if self._ids.get(name) == poke_id:
+            return
+        self._ids[name] = poke_id
+        if self.redis is not None:
+            await self.redis.hset(self.key, name, poke_id)
@@ -4,7 +4,7 @@ from fastapi_users import FastAPIUsers
 from fastapi_users.authentication import CookieTransport, AuthenticationBackend
 from fastapi_users.authentication import JWTStrategy
 
-from .manager import get_user_manager
+from .manager import get_user_manager, get_lean_user_manager
 from ..config import AUTH_SECRET
 from ..models import User
 
@@ -26,5 +26,11 @@ fastapi_users = FastAPIUsers[User, uuid.UUID](
     [auth_backend],
 )
 
-current_user = fastapi_users.current_user(active=True)
-current_superuser = fastapi_users.current_user(active=True, superuser=True)
+# the users and auth routers return the full user with its role, the app routes only need the principal
+lean_fastapi_users = FastAPIUsers[User, uuid.UUID](
+    get_lean_user_manager,
+    [auth_backend],
+)
+
+current_user = lean_fastapi_users.current_user(active=True)
+current_superuser = lean_fastapi_users.current_user(active=True, superuser=True)
@@ -0,0 +1,98 @@
+import asyncio
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Optional, Tuple
+
+from fastapi_users.password import PasswordHelper
+
+from ..config import PASSWORD_HASH_EXECUTOR, PASSWORD_HASH_WORKERS, PASSWORD_HASH_MAX_PENDING
+
+# module level so that process pool workers build their own on first use
+password_helper = PasswordHelper()
+
+
+class HashingOverloadedException(Exception):
+    pass
+
+
+def _hash(password: str) -> str:
+    return password_helper.hash(password)
+
+
+def _verify_and_update(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    return password_helper.verify_and_update(plain_password, hashed_password)
+
+
+def _timed(func, *args):
+    started = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - started
+
+
+class PasswordHasher:
+    """Runs password hashing off the event loop, in a pool of ``workers`` threads or processes.
+
+    At most ``max_pending`` hashes are queued or running at once; past that ``HashingOverloadedException``
+    is raised right away instead of queueing the request behind seconds of hashing.
+    """
+
+    def __init__(self, mode: str = PASSWORD_HASH_EXECUTOR, workers: int = PASSWORD_HASH_WORKERS,
+                 max_pending: int = PASSWORD_HASH_MAX_PENDING):
+        self.mode = mode
+        self.workers = workers
+        self.max_pending = max_pending
+        self.pending = 0
+        self.counters = {"hashed": 0, "verified": 0, "rejected": 0}
+        self.seconds = {"queued": 0.0, "hashing": 0.0}
+        self._executor: Optional[Executor] = None
+
+    def start(self):
+        if self._executor is not None or self.mode == "inline":
+            return
+        if self.mode == "process":
+            self._executor = ProcessPoolExecutor(self.workers)
+        else:
+            self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix="password-hash")
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    async def _run(self, counter: str, func, *args):
+        if self.pending >= self.max_pending:
+            self.counters["rejected"] += 1
+            raise HashingOverloadedException("Too many password checks in progress, try again later")
+        self.pending += 1
+        queued = time.perf_counter()
+        try:
+            if self.mode == "inline":
+                result, hashing = _timed(func, *args)
+            else:
+                self.start()
+                result, hashing = await asyncio.get_running_loop().run_in_executor(self._executor, _timed, func, *args)
+        finally:
+            self.pending -= 1
+        self.counters[counter] += 1
+        self.seconds["hashing"] += hashing
+        self.seconds["queued"] += time.perf_counter() - queued - hashing
+        return result
+
+    async def hash(self, password: str) -> str:
+        return await self._run("hashed", _hash, password)
+
+    async def verify_and_update(self, plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+        return await self._run("verified", _verify_and_update, plain_password, hashed_password)
+
+    def stats(self) -> dict:
+        done = self.counters["hashed"] + self.counters["verified"]
+        return {
+            **self.counters,
+            "mode": self.mode,
+            "pending": self.pending,
+            "avg_queued_ms": 1000 * self.seconds["queued"] / done if done else None,
+            "avg_hashing_ms": 1000 * self.seconds["hashing"] / done if done else None,
+        }
+
+
+password_hasher = PasswordHasher()
@@ -1,14 +1,17 @@
 import re
 import uuid
 from threading import Thread
-from typing import Optional
+from typing import Any, Dict, Optional
 
 from fastapi import Depends, Request
 from fastapi_users import BaseUserManager, UUIDIDMixin, exceptions, models, schemas
+from fastapi.security import OAuth2PasswordRequestForm
 from httpx_oauth.clients.google import GoogleOAuth2
 
 from ..mail_service import send_reset_password_mail
-from .utils import get_user_db
+from .hashing import password_hasher
+from .principals import principal_cache
+from .utils import get_user_db, get_lean_user_db
 from ..config import RESET_SECRET, VERIFICATION_SECRET, CLIENT_ID, CLIENT_SECRET
 from ..models import User
 
@@ -30,6 +33,18 @@ class UserManager(UUIDIDMixin, BaseUserManager[User, uuid.UUID]):
             self, user: models.UP, request: Optional[Request] = None
     ) -> None:
         print("reset")
+        await principal_cache.set(user)
+
+    async def on_after_update(self, user: User, update_dict: Dict[str, Any], request: Optional[Request] = None):
+        # covers deactivation, superuser changes and email changes; the updated user is cached rather than
+        # dropped, so the next lookup does not re-cache the old row from a lagging read replica
+        await principal_cache.set(user)
+
+    async def on_after_verify(self, user: User, request: Optional[Request] = None):
+        await principal_cache.set(user)
+
+    async def on_after_delete(self, user: User, request: Optional[Request] = None):
+        await principal_cache.invalidate(user.id)
 
     async def validate_password(self, password: str, user: models.UP):
         if len(password) < 8:
@@ -45,6 +60,24 @@ class UserManager(UUIDIDMixin, BaseUserManager[User, uuid.UUID]):
                 reason="Password should contain at least one letter, one number and one special character"
             )
 
+    async def authenticate(self, credentials: OAuth2PasswordRequestForm) -> Optional[User]:
+        # BaseUserManager.authenticate with the hashing moved off the event loop
+        try:
+            user = await self.get_by_email(credentials.username)
+        except exceptions.UserNotExists:
+            # hash anyway, so unknown emails take as long as wrong passwords
+            await password_hasher.hash(credentials.password)
+            return None
+
+        verified, updated_password_hash = await password_hasher.verify_and_update(
+            credentials.password, user.hashed_password
+        )
+        if not verified:
+            return None
+        if updated_password_hash is not None:
+            await self.user_db.update(user, {"hashed_password": updated_password_hash})
+        return user
+
     async def create(
             self,
             user_create: schemas.UC,
@@ -63,7 +96,7 @@ class UserManager(UUIDIDMixin, BaseUserManager[User, uuid.UUID]):
             else user_create.create_update_dict_superuser()
         )
         password = user_dict.pop("password")
-        user_dict["hashed_password"] = self.password_helper.hash(password)
+        user_dict["hashed_password"] = await password_hasher.hash(password)
         user_dict["role_id"] = 1
 
         created_user = await self.user_db.create(user_dict)
@@ -108,7 +141,7 @@ class UserManager(UUIDIDMixin, BaseUserManager[User, uuid.UUID]):
                 password = self.password_helper.generate()
                 user_dict = {
                     "email": account_email,
-                    "hashed_password": self.password_helper.hash(password),
+                    "hashed_password": await password_hasher.hash(password),
                     "is_verified": is_verified_by_default,
                     "role_id": 1,
                 }
@@ -131,3 +164,7 @@ class UserManager(UUIDIDMixin, BaseUserManager[User, uuid.UUID]):
 
 async def get_user_manager(user_db=Depends(get_user_db)):
     yield UserManager(user_db)
+
+
+async def get_lean_user_manager(user_db=Depends(get_lean_user_db)):
+    yield UserManager(user_db)
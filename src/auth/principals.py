@@ -0,0 +1,69 @@
+import json
+import logging
+import uuid
+from typing import Optional
+
+from ..config import AUTH_PRINCIPAL_CACHE_TTL
+from ..models import User
+
+logger = logging.getLogger(__name__)
+
+# the columns current_user loads and the cache stores
+PRINCIPAL_FIELDS = ("id", "email", "is_active", "is_superuser", "is_verified")
+
+
+class PrincipalCache:
+    """Short-lived copies of authenticated principals in redis, keyed by user id.
+
+    ``UserManager`` overwrites an entry with the updated user whenever the user changes, and invalidates it
+    when the user is deleted; ``ttl`` bounds how long a write racing with a lookup can leave a stale one.
+    Without a redis client, or with ``ttl=0``, nothing is cached.
+    """
+
+    prefix = "auth:principal"
+
+    def __init__(self, redis=None, ttl: int = AUTH_PRINCIPAL_CACHE_TTL):
+        self.redis = redis
+        self.ttl = ttl
+
+    @property
+    def enabled(self) -> bool:
+        return self.redis is not None and self.ttl > 0
+
+    def key(self, user_id: uuid.UUID) -> str:
+        return f"{self.prefix}:{user_id}"
+
+    async def get(self, user_id: uuid.UUID) -> Optional[User]:
+        """A detached ``User`` with only ``PRINCIPAL_FIELDS`` set, or ``None`` on a miss."""
+        if not self.enabled:
+            return None
+        try:
+            cached = await self.redis.get(self.key(user_id))
+        except Exception:
+            logger.warning("Principal cache lookup failed", exc_info=True)
+            return None
+        if cached is None:
+            return None
+        fields = json.loads(cached)
+        return User(**{**fields, "id": uuid.UUID(fields["id"])})
+
+    async def set(self, user: User):
+        if not self.enabled:
+            return
+        fields = {field: getattr(user, field) for field in PRINCIPAL_FIELDS}
+        try:
+            await self.redis.set(self.key(user.id), json.dumps({**fields, "id": str(user.id)}), ex=self.ttl)
+        except Exception:
+            logger.warning("Principal cache update failed", exc_info=True)
+
+    async def invalidate(self, user_id: uuid.UUID):
+        if self.redis is None:
+            return
+        try:
+            await self.redis.delete(self.key(user_id))
+        except Exception:
+            # the entry expires after ttl seconds anyway
+            logger.warning("Principal cache invalidation failed", exc_info=True)
+
+
+principal_cache = PrincipalCache()
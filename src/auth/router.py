@@ -4,14 +4,14 @@ from typing import Tuple
 from fastapi import APIRouter, Depends, HTTPException, status, Form
 from fastapi.security import OAuth2PasswordRequestForm
 
-from fastapi_users import models
+from fastapi_users import exceptions, models
 from fastapi_users.authentication import AuthenticationBackend, Authenticator, Strategy
 from fastapi_users.manager import BaseUserManager, UserManagerDependency
 from fastapi_users.openapi import OpenAPIResponseType
 from fastapi_users.router.common import ErrorCode, ErrorModel
 from starlette.responses import JSONResponse
 
-from .two_f_a import generate_otp, set_otp_to_redis, verify_otp_from_redis
+from .two_f_a import generate_otp, create_challenge, read_challenge, set_otp_to_redis, verify_otp_from_redis
 from .common import ErrorCode as AuthErrorCode
 
 from ..mail_service import send_otp_mail
@@ -56,7 +56,7 @@ def get_auth_router(
                     "examples": {
                         "2fa_required": {
                             "summary": "2FA verification required.",
-                            "value": {"message": "2FA verification required", "user_id": "UUID пользователя"},
+                            "value": {"message": "2FA verification required", "challenge_id": "Токен для /verify-otp"},
                         }
                     }
                 }
@@ -89,10 +89,13 @@ def get_auth_router(
                 detail=ErrorCode.LOGIN_USER_NOT_VERIFIED,
             )
         otp = generate_otp()
+        # /verify-otp proves the password check through the challenge instead of hashing it again
+        challenge_token, challenge_id = create_challenge(user.id)
         Thread(target=send_otp_mail, args=(user.email, otp)).start()
-        await set_otp_to_redis(user.id, otp, redis)
+        await set_otp_to_redis(challenge_id, user.id, otp, redis)
 
-        return JSONResponse(content={"message": "2FA verification required"}, status_code=status.HTTP_202_ACCEPTED)
+        return JSONResponse(content={"message": "2FA verification required", "challenge_id": challenge_token},
+                            status_code=status.HTTP_202_ACCEPTED)
 
     verify_otp_responses: OpenAPIResponseType = {
         status.HTTP_204_NO_CONTENT: {
@@ -121,14 +124,18 @@ def get_auth_router(
     @router.post("/verify-otp", responses=verify_otp_responses)
     async def verify_otp(
             otp: str = Form(...),
-            credentials: OAuth2PasswordRequestForm = Depends(),
+            challenge_id: str = Form(...),
             user_manager: BaseUserManager[models.UP, models.ID] = Depends(get_user_manager),
             strategy: Strategy[models.UP, models.ID] = Depends(backend.get_strategy),
     ):
-        user = await user_manager.authenticate(credentials)
-        if not await verify_otp_from_redis(user.id, otp, redis):
+        challenge = read_challenge(challenge_id)
+        if challenge is None or not await verify_otp_from_redis(challenge[1], challenge[0], otp, redis):
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid OTP")
 
+        try:
+            user = await user_manager.get(challenge[0])
+        except exceptions.UserNotExists:
+            user = None
         if user is None or not user.is_active:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="User not found or not active")
 
@@ -1,6 +1,15 @@
+import hmac
+import secrets
 import uuid
+from typing import Optional, Tuple
 
+import jwt
 import pyotp
+from fastapi_users.jwt import decode_jwt, generate_jwt
+
+from ..config import OTP_SECRET, OTP_TTL, OTP_MAX_ATTEMPTS
+
+CHALLENGE_AUDIENCE = "auth:otp-challenge"
 
 
 def generate_otp():
@@ -8,13 +17,47 @@ def generate_otp():
     return totp.now()
 
 
-async def set_otp_to_redis(user_id, otp, redis):
-    await redis.set(f"otp:{user_id}", otp, ex=300)
+def create_challenge(user_id: uuid.UUID, secret: str = OTP_SECRET, lifetime: int = OTP_TTL) -> Tuple[str, str]:
+    """A signed challenge token bound to ``user_id`` and the random challenge id inside it."""
+    challenge_id = secrets.token_urlsafe(16)
+    token = generate_jwt({"sub": str(user_id), "cid": challenge_id, "aud": CHALLENGE_AUDIENCE}, secret, lifetime)
+    return token, challenge_id
+
+
+def read_challenge(token: str, secret: str = OTP_SECRET) -> Optional[Tuple[uuid.UUID, str]]:
+    """The user id and challenge id of a valid, unexpired challenge token, ``None`` otherwise."""
+    try:
+        data = decode_jwt(token, secret, [CHALLENGE_AUDIENCE])
+        return uuid.UUID(data["sub"]), data["cid"]
+    except (jwt.PyJWTError, KeyError, ValueError):
+        return None
+
+
+async def set_otp_to_redis(challenge_id: str, user_id: uuid.UUID, otp: str, redis, ttl: int = OTP_TTL):
+    await redis.hset(f"otp:{challenge_id}", mapping={"user_id": str(user_id), "otp": otp, "attempts": 0})
+    await redis.expire(f"otp:{challenge_id}", ttl)
 
 
-async def verify_otp_from_redis(user_id: uuid.UUID, otp: str, redis):
-    stored_otp = await redis.get(f"otp:{user_id}")
-    if not stored_otp or stored_otp != otp:
+async def verify_otp_from_redis(challenge_id: str, user_id: uuid.UUID, otp: str, redis,
+                                max_attempts: int = OTP_MAX_ATTEMPTS):
+    key = f"otp:{challenge_id}"
+    # every attempt is counted before the code is compared, so concurrent guesses cannot exceed max_attempts
+    async with redis.pipeline(transaction=True) as pipe:
+        pipe.hincrby(key, "attempts", 1)
+        pipe.hgetall(key)
+        attempts, stored = await pipe.execute()
+    if "otp" not in stored or attempts > max_attempts:
+        # the challenge expired, was used or was guessed too often; HINCRBY may have just recreated it
+        await redis.delete(key)
+        return None
+    if stored["user_id"] != str(user_id):
+        return None
+    if not hmac.compare_digest(stored["otp"], otp):
+        # a challenge is dropped after max_attempts wrong codes
+        if attempts >= max_attempts:
+            await redis.delete(key)
+        return None
+    # only the request that deletes the challenge logs in
+    if not await redis.delete(key):
         return None
-    await redis.delete(f"otp:{user_id}")
     return True
@@ -1,10 +1,64 @@
+from typing import Any, Optional
+
 from fastapi import Depends
 from fastapi_users.db import SQLAlchemyUserDatabase
+from sqlalchemy import select
+from sqlalchemy.orm import load_only, raiseload, selectinload
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from ..database import get_async_session
+from ..database import get_async_session, get_read_session
 from ..models import User, OAuthAccount
+from .principals import PRINCIPAL_FIELDS, principal_cache
+
+
+class UserDatabase(SQLAlchemyUserDatabase):
+    """``SQLAlchemyUserDatabase`` that loads relationships only where they are used.
+
+    With ``lean=True``, ``get`` (the token authentication path) fetches ``PRINCIPAL_FIELDS`` from the user row
+    and nothing else, so its cost does not depend on the user's logs, role or OAuth accounts. Those principals
+    are served from ``principal_cache`` while it holds them.
+    """
+
+    def __init__(self, session: AsyncSession, lean: bool = False):
+        super().__init__(session, User, OAuthAccount)
+        self.lean = lean
+
+    async def get(self, id) -> Optional[User]:
+        if not self.lean:
+            return await self._get_user(select(User).where(User.id == id))
+        user = await principal_cache.get(id)
+        if user is not None:
+            return user
+        columns = [getattr(User, field) for field in PRINCIPAL_FIELDS]
+        user = await self._get_user(
+            select(User).where(User.id == id).options(load_only(*columns, raiseload=True), raiseload("*"))
+        )
+        if user is not None:
+            await principal_cache.set(user)
+        return user
+
+    async def get_by_oauth_account(self, oauth: str, account_id: str) -> Optional[User]:
+        # the OAuth callback updates the matching account in user.oauth_accounts
+        statement = (
+            select(User)
+            .join(OAuthAccount)
+            .where(OAuthAccount.oauth_name == oauth, OAuthAccount.account_id == account_id)
+            .options(selectinload(User.oauth_accounts))
+        )
+        return await self._get_user(statement)
+
+    async def add_oauth_account(self, user: User, create_dict: dict[str, Any]) -> User:
+        await self.session.refresh(user, ["oauth_accounts"])
+        oauth_account = OAuthAccount(**create_dict)
+        self.session.add(oauth_account)
+        user.oauth_accounts.append(oauth_account)
+        await self.session.commit()
+        return user
 
 
 async def get_user_db(session: AsyncSession = Depends(get_async_session)):
-    yield SQLAlchemyUserDatabase(session, User, OAuthAccount)
+    yield UserDatabase(session)
+
+
+async def get_lean_user_db(session: AsyncSession = Depends(get_read_session)):
+    yield UserDatabase(session, lean=True)
@@ -0,0 +1,431 @@
+import asyncio
+import hashlib
+import json
+import logging
+import time
+import uuid
+from collections import OrderedDict
+from functools import wraps
+from inspect import Parameter, signature
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple, Type
+
+from fastapi import HTTPException
+from fastapi.dependencies.utils import get_typed_return_annotation
+from fastapi.encoders import jsonable_encoder
+from fastapi_cache import FastAPICache
+from fastapi_cache.backends.redis import RedisBackend
+from fastapi_cache.coder import Coder
+from fastapi_cache.types import Backend
+from pydantic import BaseModel
+from starlette.responses import Response
+
+from . import compact
+from .config import (CACHE_L1_MAX_BYTES, CACHE_INVALIDATION_CHANNEL, CACHE_GRACE_SECONDS,
+                     CACHE_STALE_WHILE_REVALIDATE, CACHE_STALE_IF_ERROR, CACHE_COMPRESS_LEVEL,
+                     CACHE_DECODED_MAX_BYTES)
+
+logger = logging.getLogger(__name__)
+
+
+class LRUCache:
+    """In-process LRU bounded by the total size of the stored values, with a TTL per entry."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries: OrderedDict[str, Tuple[bytes, Optional[float]]] = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get_with_ttl(self, key: str) -> Tuple[int, Optional[bytes]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return 0, None
+        value, expires_at = entry
+        if expires_at is None:
+            ttl = -1
+        else:
+            ttl = int(expires_at - time.monotonic())
+            if ttl <= 0:
+                self.delete(key)
+                return 0, None
+        self._entries.move_to_end(key)
+        return ttl, value
+
+    def set(self, key: str, value: bytes, expire: Optional[int] = None):
+        self.delete(key)
+        if len(value) > self.max_bytes:
+            return
+        expires_at = time.monotonic() + expire if expire else None
+        self._entries[key] = (value, expires_at)
+        self.size += len(value)
+        while self.size > self.max_bytes:
+            _, (evicted, _) = self._entries.popitem(last=False)
+            self.size -= len(evicted)
+
+    def delete(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.size -= len(entry[0])
+
+    def clear(self, namespace: Optional[str] = None):
+        if namespace is None:
+            self._entries.clear()
+            self.size = 0
+            return
+        for key in [key for key in self._entries if key.startswith(f"{namespace}:")]:
+            self.delete(key)
+
+
+class ResponseCoder(Coder):
+    """Stores the final response body with its media type, so hits skip decoding and response validation.
+
+    Values are laid out as ``<media type>\\n<body>``.
+    """
+    media_type = "application/json"
+
+    @classmethod
+    def encode(cls, value: Any) -> bytes:
+        if isinstance(value, Response):
+            return f"{value.media_type}\n".encode() + value.body
+        if isinstance(value, BaseModel):
+            body = value.model_dump_json().encode()
+        else:
+            body = json.dumps(jsonable_encoder(value), separators=(",", ":")).encode()
+        return f"{cls.media_type}\n".encode() + body
+
+    @classmethod
+    def decode(cls, value: bytes) -> Response:
+        media_type, _, body = value.partition(b"\n")
+        return Response(content=body, media_type=media_type.decode())
+
+    @classmethod
+    def decode_as_type(cls, value: bytes, *, type_: Any) -> Response:
+        return cls.decode(value)
+
+    @classmethod
+    def body(cls, value: bytes) -> bytes:
+        return value.partition(b"\n")[2]
+
+
+COMPACT_PREFIX = b"!compact\n"
+
+
+class CompactResponseCoder(ResponseCoder):
+    """``ResponseCoder`` for one pydantic ``model`` that stores records in the normalized, optionally deflated
+    form of ``compact.encode`` and rebuilds the full JSON body on read.
+
+    Use ``CompactResponseCoder.for_model(PokemonSchema)``. Entries written by ``ResponseCoder`` still decode.
+    Rebuilt bodies are kept in a per-worker LRU keyed by a digest of the entry, so only redis pays for the
+    small form and repeated hits skip the rebuild.
+    """
+    model: Type[BaseModel]
+    compress_level: int = CACHE_COMPRESS_LEVEL
+    bodies = LRUCache(CACHE_DECODED_MAX_BYTES)
+
+    @classmethod
+    def for_model(cls, model: Type[BaseModel]) -> Type["CompactResponseCoder"]:
+        return type(f"Compact{model.__name__}Coder", (cls,), {"model": model})
+
+    @classmethod
+    def encode(cls, value: Any) -> bytes:
+        if isinstance(value, Response):
+            data = json.loads(value.body)
+        else:
+            data = jsonable_encoder(value)
+        return COMPACT_PREFIX + compact.encode(cls.model, data, cls.compress_level)
+
+    @classmethod
+    def decode(cls, value: bytes) -> Response:
+        if not value.startswith(COMPACT_PREFIX):
+            return super().decode(value)
+        return Response(content=cls.body(value), media_type=cls.media_type)
+
+    @classmethod
+    def body(cls, value: bytes) -> bytes:
+        if not value.startswith(COMPACT_PREFIX):
+            return super().body(value)
+        digest = hashlib.blake2b(value, digest_size=16).hexdigest()
+        _, body = cls.bodies.get_with_ttl(digest)
+        if body is None:
+            data = compact.decode(cls.model, value[len(COMPACT_PREFIX):])
+            body = json.dumps(data, separators=(",", ":"), ensure_ascii=False).encode()
+            cls.bodies.set(digest, body)
+        return body
+
+
+NEGATIVE_PREFIX = b"!negative\n"
+
+negative_stats = {"hits": 0, "stores": 0}
+
+
+def encode_negative(error: HTTPException) -> bytes:
+    return NEGATIVE_PREFIX + json.dumps({"status_code": error.status_code, "detail": error.detail}).encode()
+
+
+def decode_negative(value: bytes) -> Optional[HTTPException]:
+    """Return the cached error if ``value`` is a negative entry, else ``None``."""
+    if not value.startswith(NEGATIVE_PREFIX):
+        return None
+    return HTTPException(**json.loads(value[len(NEGATIVE_PREFIX):]))
+
+
+async def redis_get_many_with_ttl(redis, keys: List[str]) -> List[Tuple[int, Optional[bytes]]]:
+    """Fetch TTLs and values of many keys in a single pipelined round trip."""
+    async with redis.pipeline(transaction=False) as pipe:
+        for key in keys:
+            pipe.ttl(key).get(key)
+        values = await pipe.execute()
+    return list(zip(values[::2], values[1::2]))
+
+
+class TwoTierBackend(Backend):
+    """fastapi-cache backend with a per-worker L1 in front of the shared redis L2.
+
+    Writes and clears are broadcast on a pub/sub channel so every other worker drops its L1 copy.
+    """
+
+    def __init__(self, redis, max_bytes: int = CACHE_L1_MAX_BYTES, channel: str = CACHE_INVALIDATION_CHANNEL):
+        self.redis = redis
+        self.channel = channel
+        self.l1 = LRUCache(max_bytes)
+        self.l2 = RedisBackend(redis)
+        self.worker_id = uuid.uuid4().hex
+        self.hits = {"l1": 0, "l2": 0}
+        self.misses = {"l1": 0, "l2": 0}
+
+    async def get_with_ttl(self, key: str) -> Tuple[int, Optional[bytes]]:
+        ttl, value = self.l1.get_with_ttl(key)
+        if value is not None:
+            self.hits["l1"] += 1
+            return ttl, value
+        self.misses["l1"] += 1
+
+        ttl, value = await self.l2.get_with_ttl(key)
+        if value is None:
+            self.misses["l2"] += 1
+            return ttl, None
+        self.hits["l2"] += 1
+        self.l1.set(key, value, ttl if ttl > 0 else None)
+        return ttl, value
+
+    async def get(self, key: str) -> Optional[bytes]:
+        _, value = await self.get_with_ttl(key)
+        return value
+
+    async def get_many_with_ttl(self, keys: List[str]) -> List[Tuple[int, Optional[bytes]]]:
+        results: Dict[str, Tuple[int, Optional[bytes]]] = {}
+        for key in keys:
+            ttl, value = self.l1.get_with_ttl(key)
+            if value is not None:
+                self.hits["l1"] += 1
+                results[key] = ttl, value
+            else:
+                self.misses["l1"] += 1
+
+        missing = [key for key in keys if key not in results]
+        if missing:
+            for key, (ttl, value) in zip(missing, await redis_get_many_with_ttl(self.redis, missing)):
+                if value is None:
+                    self.misses["l2"] += 1
+                else:
+                    self.hits["l2"] += 1
+                    self.l1.set(key, value, ttl if ttl > 0 else None)
+                results[key] = ttl, value
+        return [results[key] for key in keys]
+
+    async def set(self, key: str, value: bytes, expire: Optional[int] = None) -> None:
+        await self.l2.set(key, value, expire)
+        self.l1.set(key, value, expire)
+        await self._publish(key=key)
+
+    async def clear(self, namespace: Optional[str] = None, key: Optional[str] = None) -> int:
+        result = await self.l2.clear(namespace, key)
+        self._invalidate(namespace, key)
+        await self._publish(namespace=namespace, key=key)
+        return result
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        return {
+            "l1": {"hits": self.hits["l1"], "misses": self.misses["l1"], "entries": len(self.l1),
+                   "bytes": self.l1.size, "max_bytes": self.l1.max_bytes},
+            "l2": {"hits": self.hits["l2"], "misses": self.misses["l2"]},
+        }
+
+    def _invalidate(self, namespace: Optional[str] = None, key: Optional[str] = None):
+        if namespace:
+            self.l1.clear(namespace)
+        elif key:
+            self.l1.delete(key)
+
+    async def _publish(self, namespace: Optional[str] = None, key: Optional[str] = None):
+        message = json.dumps({"origin": self.worker_id, "namespace": namespace, "key": key})
+        await self.redis.publish(self.channel, message)
+
+    async def listen_for_invalidations(self):
+        while True:
+            try:
+                async with self.redis.pubsub() as pubsub:
+                    await pubsub.subscribe(self.channel)
+                    async for message in pubsub.listen():
+                        if message["type"] != "message":
+                            continue
+                        data = json.loads(message["data"])
+                        if data["origin"] != self.worker_id:
+                            self._invalidate(data["namespace"], data["key"])
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # redis went away: entries may have changed meanwhile, so start over with an empty L1
+                self.l1.clear()
+                await asyncio.sleep(1)
+
+
+async def get_many_with_ttl(keys: List[str]) -> List[Tuple[int, Optional[bytes]]]:
+    backend = FastAPICache.get_backend()
+    if isinstance(backend, TwoTierBackend):
+        return await backend.get_many_with_ttl(keys)
+    if isinstance(backend, RedisBackend):
+        return await redis_get_many_with_ttl(backend.redis, keys)
+    return [await backend.get_with_ttl(key) for key in keys]
+
+
+_background_tasks: Set[asyncio.Task] = set()
+_refreshing: Dict[str, asyncio.Task] = {}
+
+
+def cached(
+        expire: int,
+        grace: int = CACHE_GRACE_SECONDS,
+        stale_while_revalidate: bool = CACHE_STALE_WHILE_REVALIDATE,
+        stale_if_error: bool = CACHE_STALE_IF_ERROR,
+        namespace: str = "",
+        coder: Optional[Type[Coder]] = None,
+        negative_expire: Optional[int] = None,
+        negative_status_codes: Tuple[int, ...] = (404, 422),
+        key_builder: Optional[Callable[..., Any]] = None,
+        result_key: Optional[Callable[[str, Any], Awaitable[Optional[str]]]] = None,
+):
+    """Cache an endpoint like fastapi-cache's ``@cache``, optionally serving entries past ``expire``.
+
+    Entries are kept for ``expire + grace`` seconds; the remaining redis TTL tells whether a hit is fresh or
+    stale. With ``stale_while_revalidate`` a stale hit is returned at once and refreshed in the background;
+    with ``stale_if_error`` it is refreshed inline and only returned if the refresh fails.
+
+    ``coder`` defaults to the one given to ``FastAPICache.init``. With ``ResponseCoder`` the endpoint returns
+    the stored bytes as a ready ``Response`` on hits and misses alike.
+
+    With ``negative_expire``, an ``HTTPException`` in ``negative_status_codes`` is cached for that many
+    seconds and raised again on hits (see ``decode_negative``).
+
+    ``key_builder`` defaults to the one given to ``FastAPICache.init``. ``result_key(namespace, result)`` may
+    return another key to store a freshly loaded result under, e.g. one derived from the result itself.
+
+    The wrapped endpoint exposes ``cache_key(**kwargs)`` and ``is_fresh(ttl)`` for callers that read its
+    entries in bulk.
+    """
+    if not (stale_while_revalidate or stale_if_error):
+        grace = 0
+    response_param = Parameter("__cache_response", Parameter.KEYWORD_ONLY, annotation=Response)
+
+    def wrapper(func: Callable[..., Awaitable[Any]]):
+        func_signature = signature(func)
+        return_type = get_typed_return_annotation(func)
+
+        async def cache_key(*args, **kwargs) -> str:
+            key = (key_builder or FastAPICache.get_key_builder())(func, f"{FastAPICache.get_prefix()}:{namespace}",
+                                                                  args=args, kwargs=kwargs)
+            if not isinstance(key, str):
+                key = await key
+            return key
+
+        def is_fresh(ttl: int) -> bool:
+            return ttl < 0 or ttl > grace
+
+        def get_coder() -> Type[Coder]:
+            return coder or FastAPICache.get_coder()
+
+        async def fill(key: str, args, kwargs) -> Any:
+            try:
+                result = await func(*args, **kwargs)
+            except HTTPException as e:
+                if negative_expire and e.status_code in negative_status_codes:
+                    try:
+                        await FastAPICache.get_backend().set(key, encode_negative(e), negative_expire)
+                        negative_stats["stores"] += 1
+                    except Exception:
+                        logger.warning(f"Error setting negative cache key '{key}' in backend:", exc_info=True)
+                raise
+            if result_key is not None:
+                key = await result_key(f"{FastAPICache.get_prefix()}:{namespace}", result) or key
+            to_cache = get_coder().encode(result)
+            try:
+                await FastAPICache.get_backend().set(key, to_cache, expire + grace)
+            except Exception:
+                logger.warning(f"Error setting cache key '{key}' in backend:", exc_info=True)
+            if issubclass(get_coder(), ResponseCoder):
+                return get_coder().decode(to_cache)
+            return result
+
+        async def refresh(key: str, args, kwargs):
+            try:
+                await fill(key, args, kwargs)
+            except Exception:
+                logger.warning(f"Background refresh of cache key '{key}' failed, keeping the stale entry",
+                               exc_info=True)
+
+        @wraps(func)
+        async def inner(*args, **kwargs):
+            response: Optional[Response] = kwargs.pop(response_param.name, None)
+            if not FastAPICache.get_enable():
+                return await func(*args, **kwargs)
+
+            value_coder = get_coder()
+            key = await cache_key(*args, **kwargs)
+
+            try:
+                ttl, value = await FastAPICache.get_backend().get_with_ttl(key)
+            except Exception:
+                logger.warning(f"Error retrieving cache key '{key}' from backend:", exc_info=True)
+                ttl, value = 0, None
+
+            if value is not None and (error := decode_negative(value)) is not None:
+                negative_stats["hits"] += 1
+                raise error
+
+            if value is None:
+                cache_status, result = "MISS", await fill(key, args, kwargs)
+                ttl = expire + grace
+            elif is_fresh(ttl):
+                cache_status, result = "HIT", value_coder.decode_as_type(value, type_=return_type)
+            elif stale_while_revalidate:
+                if key not in _refreshing:
+                    task = asyncio.create_task(refresh(key, args, kwargs))
+                    _refreshing[key] = task
+                    _background_tasks.add(task)
+                    task.add_done_callback(lambda t: (_background_tasks.discard(t), _refreshing.pop(key, None)))
+                cache_status, result = "STALE", value_coder.decode_as_type(value, type_=return_type)
+            else:
+                try:
+                    cache_status, result = "MISS", await fill(key, args, kwargs)
+                    ttl = expire + grace
+                except Exception:
+                    logger.warning(f"Refresh of cache key '{key}' failed, serving the stale entry", exc_info=True)
+                    cache_status, result = "STALE", value_coder.decode_as_type(value, type_=return_type)
+
+            # a returned Response is sent as is, so the headers have to go on it rather than on the injected one
+            headers_target = result if isinstance(result, Response) else response
+            if headers_target is not None:
+                headers_target.headers["Cache-Control"] = f"max-age={max(ttl - grace, 0)}"
+                headers_target.headers[FastAPICache.get_cache_status_header()] = cache_status
+            return result
+
+        inner.__signature__ = func_signature.replace(
+            parameters=[*func_signature.parameters.values(), response_param]
+        )
+        inner.cache_key = cache_key
+        inner.is_fresh = is_fresh
+        return inner
+
+    return wrapper
@@ -0,0 +1,68 @@
+import time
+from typing import Optional
+
+
+class CircuitOpenException(Exception):
+    pass
+
+
+class CircuitBreaker:
+    """Closed -> open after ``failure_threshold`` consecutive failures; open -> half-open after
+    ``recovery_timeout`` seconds, where a single probe call decides between closed and open again."""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int, recovery_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.probe_in_flight = False
+        self.rejected = 0
+        self.times_opened = 0
+
+    def reset(self):
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.probe_in_flight = False
+
+    def before_call(self):
+        if self.state == self.OPEN:
+            if time.monotonic() - self.opened_at < self.recovery_timeout:
+                self.rejected += 1
+                raise CircuitOpenException("Circuit is open")
+            self.state = self.HALF_OPEN
+        if self.state == self.HALF_OPEN:
+            if self.probe_in_flight:
+                self.rejected += 1
+                raise CircuitOpenException("Circuit is half-open, waiting for the probe call")
+            self.probe_in_flight = True
+
+    def release(self):
+        # the call ended without an outcome (e.g. it was cancelled), let another probe through
+        self.probe_in_flight = False
+
+    def record_success(self):
+        self.state = self.CLOSED
+        self.failures = 0
+        self.probe_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        self.probe_in_flight = False
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+            self.times_opened += 1
+
+    def stats(self) -> dict:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.failures,
+            "rejected": self.rejected,
+            "times_opened": self.times_opened,
+        }
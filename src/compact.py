@@ -0,0 +1,98 @@
+import json
+import zlib
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Tuple, Type, get_args, get_origin
+
+from pydantic import BaseModel
+
+Ref = Tuple[str, str]
+
+
+def _is_ref(model: Type[BaseModel]) -> bool:
+    # PokeAPI's NamedAPIResource: the name/url pairs repeated all over a record
+    return set(model.model_fields) == {"name", "url"}
+
+
+def _model_of(annotation: Any) -> Any:
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return annotation
+    return None
+
+
+def _identity(value: Any, refs: Any) -> Any:
+    return value
+
+
+@lru_cache(maxsize=None)
+def _packer(annotation: Any) -> Callable[[Any, Dict[Ref, int]], Any]:
+    # built once per annotation, so packing a record does no schema introspection
+    if get_origin(annotation) is list:
+        pack_item = _packer(get_args(annotation)[0])
+        return lambda value, refs: [pack_item(item, refs) for item in value]
+    if get_origin(annotation) is not None:
+        # Optional[X]
+        pack_value = _packer(next(arg for arg in get_args(annotation) if arg is not type(None)))
+        return lambda value, refs: None if value is None else pack_value(value, refs)
+    model = _model_of(annotation)
+    if model is None:
+        return _identity
+    if _is_ref(model):
+        return lambda value, refs: refs.setdefault((value["name"], value["url"]), len(refs))
+    fields = [(name, _packer(field.annotation)) for name, field in model.model_fields.items()]
+    return lambda value, refs: [pack_field(value[name], refs) for name, pack_field in fields]
+
+
+@lru_cache(maxsize=None)
+def _unpacker(annotation: Any) -> Callable[[Any, List[dict]], Any]:
+    if get_origin(annotation) is list:
+        unpack_item = _unpacker(get_args(annotation)[0])
+        if unpack_item is _identity:
+            return _identity
+        return lambda value, refs: [unpack_item(item, refs) for item in value]
+    if get_origin(annotation) is not None:
+        unpack_value = _unpacker(next(arg for arg in get_args(annotation) if arg is not type(None)))
+        if unpack_value is _identity:
+            return _identity
+        return lambda value, refs: None if value is None else unpack_value(value, refs)
+    model = _model_of(annotation)
+    if model is None:
+        return _identity
+    if _is_ref(model):
+        return lambda value, refs: refs[value]
+    fields = [(name, _unpacker(field.annotation)) for name, field in model.model_fields.items()]
+    return lambda value, refs: {name: unpack_field(element, refs)
+                                for (name, unpack_field), element in zip(fields, value)}
+
+
+def pack(model: Type[BaseModel], data: dict) -> dict:
+    """Normalize ``data`` (a dump of ``model``) into a table of name/url references and a positional record.
+
+    Nested models become lists in field order and every name/url pair becomes an index into ``refs``,
+    so repeated references (version groups, learn methods, ...) are stored once per record.
+    """
+    refs: Dict[Ref, int] = {}
+    record = _packer(model)(data, refs)
+    return {"refs": [list(ref) for ref in refs], "record": record}
+
+
+def unpack(model: Type[BaseModel], packed: dict) -> dict:
+    # the rebuilt records share these dicts, callers only serialize them
+    refs = [{"name": name, "url": url} for name, url in packed["refs"]]
+    return _unpacker(model)(packed["record"], refs)
+
+
+def is_packed(data: dict) -> bool:
+    return "refs" in data and "record" in data
+
+
+def encode(model: Type[BaseModel], data: dict, compress_level: int = 0) -> bytes:
+    """``pack`` as JSON, deflated unless ``compress_level`` is 0; the first byte tells which."""
+    body = json.dumps(pack(model, data), separators=(",", ":"), ensure_ascii=False).encode()
+    if compress_level:
+        return b"z" + zlib.compress(body, compress_level)
+    return b"j" + body
+
+
+def decode(model: Type[BaseModel], value: bytes) -> dict:
+    body = zlib.decompress(value[1:]) if value[:1] == b"z" else value[1:]
+    return unpack(model, json.loads(body))
@@ -9,6 +9,18 @@ DB_PORT = os.getenv("DB_PORT")
 DB_NAME = os.getenv("DB_NAME")
 DB_USER = os.getenv("DB_USER")
 DB_PASSWORD = os.getenv("DB_PASSWORD")
+# read-only handlers use the replica when DB_REPLICA_HOST is set, the primary otherwise
+DB_REPLICA_HOST = os.getenv("DB_REPLICA_HOST")
+DB_REPLICA_PORT = os.getenv("DB_REPLICA_PORT", DB_PORT)
+DB_ECHO = os.getenv("DB_ECHO", 'false').lower() == 'true'
+# per engine and per worker process
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", '5'))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", '10'))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", '30'))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", '1800'))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", 'false').lower() == 'true'
+# prepared statements cached per connection; 0 disables them, as PgBouncer in transaction mode requires
+DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", '100'))
 
 EMAIL_LOGIN = os.getenv("EMAIL_LOGIN", 'default_login')
 EMAIL_PASSWORD = os.getenv("EMAIL_PASSWORD", 'default_password')
@@ -23,7 +35,99 @@ AUTH_SECRET = os.getenv("AUTH_SECRET")
 MANAGER_SECRET = os.getenv("MANAGER_SECRET")
 RESET_SECRET = os.getenv("RESET_SECRET")
 VERIFICATION_SECRET = os.getenv("VERIFICATION_SECRET")
+# signs the challenge ids /login hands out for /verify-otp; the tokens have their own audience, so
+# AUTH_SECRET can be shared when OTP_SECRET is not set
+OTP_SECRET = os.getenv("OTP_SECRET") or AUTH_SECRET
+OTP_TTL = int(os.getenv("OTP_TTL", '300'))
+OTP_MAX_ATTEMPTS = int(os.getenv("OTP_MAX_ATTEMPTS", '5'))
+# where password hashes run: 'thread' (argon2 and bcrypt release the GIL), 'process' or 'inline'
+PASSWORD_HASH_EXECUTOR = os.getenv("PASSWORD_HASH_EXECUTOR", 'thread')
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", '4'))
+# hashes queued or running per worker process before new ones are rejected with 503
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", '32'))
+# seconds an authenticated principal is served from redis, 0 disables the cache
+AUTH_PRINCIPAL_CACHE_TTL = int(os.getenv("AUTH_PRINCIPAL_CACHE_TTL", '30'))
 
 CLIENT_ID = os.getenv("CLIENT_ID")
 CLIENT_SECRET = os.getenv("CLIENT_SECRET")
 STATE_SECRET = os.getenv("STATE_SECRET")
+
+POKEAPI_URL = os.getenv("POKEAPI_URL", 'https://pokeapi.co/api/v2')
+POKEAPI_MAX_CONNECTIONS = int(os.getenv("POKEAPI_MAX_CONNECTIONS", '20'))
+POKEAPI_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("POKEAPI_MAX_KEEPALIVE_CONNECTIONS", '10'))
+POKEAPI_KEEPALIVE_EXPIRY = float(os.getenv("POKEAPI_KEEPALIVE_EXPIRY", '30'))
+POKEAPI_HTTP2 = os.getenv("POKEAPI_HTTP2", 'false').lower() == 'true'
+POKEAPI_TIMEOUT = float(os.getenv("POKEAPI_TIMEOUT", '10'))
+POKEAPI_CONNECT_TIMEOUT = float(os.getenv("POKEAPI_CONNECT_TIMEOUT", '5'))
+
+SINGLE_FLIGHT_REDIS_LOCK = os.getenv("SINGLE_FLIGHT_REDIS_LOCK", 'false').lower() == 'true'
+SINGLE_FLIGHT_LOCK_TIMEOUT = float(os.getenv("SINGLE_FLIGHT_LOCK_TIMEOUT", '15'))
+SINGLE_FLIGHT_WAIT_TIMEOUT = float(os.getenv("SINGLE_FLIGHT_WAIT_TIMEOUT", '15'))
+SINGLE_FLIGHT_RESULT_TTL = int(os.getenv("SINGLE_FLIGHT_RESULT_TTL", '5'))
+
+CACHE_L1_MAX_BYTES = int(os.getenv("CACHE_L1_MAX_BYTES", str(64 * 1024 * 1024)))
+CACHE_INVALIDATION_CHANNEL = os.getenv("CACHE_INVALIDATION_CHANNEL", 'fastapi-cache:invalidate')
+CACHE_GRACE_SECONDS = int(os.getenv("CACHE_GRACE_SECONDS", '86400'))
+CACHE_STALE_WHILE_REVALIDATE = os.getenv("CACHE_STALE_WHILE_REVALIDATE", 'true').lower() == 'true'
+CACHE_STALE_IF_ERROR = os.getenv("CACHE_STALE_IF_ERROR", 'true').lower() == 'true'
+CACHE_COMPACT_POKEMON = os.getenv("CACHE_COMPACT_POKEMON", 'true').lower() == 'true'
+CACHE_COMPRESS_LEVEL = int(os.getenv("CACHE_COMPRESS_LEVEL", '6'))
+CACHE_DECODED_MAX_BYTES = int(os.getenv("CACHE_DECODED_MAX_BYTES", str(32 * 1024 * 1024)))
+
+POKEMON_SOURCE = os.getenv("POKEMON_SOURCE", 'upstream')
+# largest pokemon id a battle log may reference; PokeAPI numbers alternate forms from 10001
+POKEMON_MAX_ID = int(os.getenv("POKEMON_MAX_ID", '20000'))
+MIRROR_INGEST_CONCURRENCY = int(os.getenv("MIRROR_INGEST_CONCURRENCY", '16'))
+MIRROR_INGEST_BATCH_SIZE = int(os.getenv("MIRROR_INGEST_BATCH_SIZE", '100'))
+
+POKEMON_BATCH_CONCURRENCY = int(os.getenv("POKEMON_BATCH_CONCURRENCY", '6'))
+POKEMONS_MAX_PAGE_SIZE = int(os.getenv("POKEMONS_MAX_PAGE_SIZE", '100'))
+
+NEGATIVE_CACHE_EXPIRE = int(os.getenv("NEGATIVE_CACHE_EXPIRE", '60'))
+CIRCUIT_BREAKER_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_BREAKER_FAILURE_THRESHOLD", '5'))
+CIRCUIT_BREAKER_RECOVERY_TIMEOUT = float(os.getenv("CIRCUIT_BREAKER_RECOVERY_TIMEOUT", '30'))
+
+POPULARITY_FLUSH_INTERVAL = float(os.getenv("POPULARITY_FLUSH_INTERVAL", '10'))
+# popularity sets keep this many times the warm-up size, so members just below the top can still climb into it
+POPULARITY_HEADROOM = int(os.getenv("POPULARITY_HEADROOM", '4'))
+WARMUP_ON_STARTUP = os.getenv("WARMUP_ON_STARTUP", 'true').lower() == 'true'
+WARMUP_TOP_POKEMONS = int(os.getenv("WARMUP_TOP_POKEMONS", '100'))
+WARMUP_TOP_PAGES = int(os.getenv("WARMUP_TOP_PAGES", '10'))
+WARMUP_CONCURRENCY = int(os.getenv("WARMUP_CONCURRENCY", '8'))
+WARMUP_BUDGET_SECONDS = float(os.getenv("WARMUP_BUDGET_SECONDS", '5'))
+
+LOGS_BULK_CHUNK_SIZE = int(os.getenv("LOGS_BULK_CHUNK_SIZE", '1000'))
+LOGS_MAX_PAGE_SIZE = int(os.getenv("LOGS_MAX_PAGE_SIZE", '100'))
+LOGS_WRITE_BEHIND = os.getenv("LOGS_WRITE_BEHIND", 'off')
+LOGS_BUFFER_MAX_SIZE = int(os.getenv("LOGS_BUFFER_MAX_SIZE", '10000'))
+LOGS_BUFFER_BATCH_SIZE = int(os.getenv("LOGS_BUFFER_BATCH_SIZE", '500'))
+LOGS_BUFFER_FLUSH_INTERVAL = float(os.getenv("LOGS_BUFFER_FLUSH_INTERVAL", '1'))
+LOGS_BUFFER_PUT_TIMEOUT = float(os.getenv("LOGS_BUFFER_PUT_TIMEOUT", '1'))
+LOGS_BUFFER_MAX_RETRIES = int(os.getenv("LOGS_BUFFER_MAX_RETRIES", '3'))
+# a batch that still fails after LOGS_BUFFER_MAX_RETRIES is retried at most this many seconds apart, until it is written
+LOGS_BUFFER_MAX_RETRY_DELAY = float(os.getenv("LOGS_BUFFER_MAX_RETRY_DELAY", '30'))
+LOGS_BUFFER_DRAIN_TIMEOUT = float(os.getenv("LOGS_BUFFER_DRAIN_TIMEOUT", '10'))
+LOGS_STREAM_KEY = os.getenv("LOGS_STREAM_KEY", 'logs:write-behind')
+LOGS_STREAM_GROUP = os.getenv("LOGS_STREAM_GROUP", 'logs-writers')
+LOGS_STREAM_CLAIM_IDLE = float(os.getenv("LOGS_STREAM_CLAIM_IDLE", '60'))
+# entries that cannot be written are moved here, once rejected by the database or after this many deliveries
+LOGS_STREAM_DEAD_LETTER_KEY = os.getenv("LOGS_STREAM_DEAD_LETTER_KEY", f"{LOGS_STREAM_KEY}:dead")
+LOGS_STREAM_MAX_DELIVERIES = int(os.getenv("LOGS_STREAM_MAX_DELIVERIES", '5'))
+
+LEADERBOARD_MAX_SIZE = int(os.getenv("LEADERBOARD_MAX_SIZE", '100'))
+LEADERBOARD_REBUILD_CHUNK_SIZE = int(os.getenv("LEADERBOARD_REBUILD_CHUNK_SIZE", '10000'))
+
+WIN_RATES_CHANNEL = os.getenv("WIN_RATES_CHANNEL", 'win-rates:battles')
+WIN_RATES_RELOAD_INTERVAL = float(os.getenv("WIN_RATES_RELOAD_INTERVAL", '3600'))
+WIN_RATES_SCAN_CHUNK_SIZE = int(os.getenv("WIN_RATES_SCAN_CHUNK_SIZE", '50000'))
+WIN_RATES_MAX_SIZE = int(os.getenv("WIN_RATES_MAX_SIZE", '100'))
+
+LOGS_PARTITION_MAINTENANCE = os.getenv("LOGS_PARTITION_MAINTENANCE", 'true').lower() == 'true'
+LOGS_PARTITIONS_AHEAD = int(os.getenv("LOGS_PARTITIONS_AHEAD", '3'))
+LOGS_PARTITIONS_INTERVAL = float(os.getenv("LOGS_PARTITIONS_INTERVAL", '86400'))
+LOGS_RETENTION_MONTHS = int(os.getenv("LOGS_RETENTION_MONTHS", '0'))
+LOGS_RETENTION_MODE = os.getenv("LOGS_RETENTION_MODE", 'detach')
+# how long retention waits for the lock a plain DETACH PARTITION needs before trying again on the next run
+LOGS_RETENTION_LOCK_TIMEOUT = float(os.getenv("LOGS_RETENTION_LOCK_TIMEOUT", '5'))
+
+LOGS_EXPORT_CHUNK_SIZE = int(os.getenv("LOGS_EXPORT_CHUNK_SIZE", '10000'))
@@ -1,18 +1,44 @@
 from typing import AsyncGenerator
 
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine
 # from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
-from .config import DB_HOST, DB_NAME, DB_PASSWORD, DB_PORT, DB_USER
+from .config import (DB_HOST, DB_NAME, DB_PASSWORD, DB_PORT, DB_USER, DB_REPLICA_HOST, DB_REPLICA_PORT, DB_ECHO,
+                     DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_RECYCLE, DB_POOL_PRE_PING,
+                     DB_STATEMENT_CACHE_SIZE)
 
 DATABASE_URL = f"postgresql+asyncpg://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+REPLICA_DATABASE_URL = f"postgresql+asyncpg://{DB_USER}:{DB_PASSWORD}@{DB_REPLICA_HOST}:{DB_REPLICA_PORT}/{DB_NAME}"
 # Base = declarative_base()
 
-engine = create_async_engine(DATABASE_URL, echo=True)
+
+def make_engine(url: str) -> AsyncEngine:
+    return create_async_engine(
+        # SQLAlchemy's own prepared statement cache, next to asyncpg's statement cache below
+        f"{url}?prepared_statement_cache_size={DB_STATEMENT_CACHE_SIZE}",
+        echo=DB_ECHO,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=DB_POOL_PRE_PING,
+        connect_args={"statement_cache_size": DB_STATEMENT_CACHE_SIZE},
+    )
+
+
+engine = make_engine(DATABASE_URL)
+read_engine = make_engine(REPLICA_DATABASE_URL) if DB_REPLICA_HOST else engine
 async_session_maker = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+read_session_maker = sessionmaker(read_engine, class_=AsyncSession, expire_on_commit=False)
 
 
 async def get_async_session() -> AsyncGenerator[AsyncSession, None]:
     async with async_session_maker() as session:
         yield session
+
+
+async def get_read_session() -> AsyncGenerator[AsyncSession, None]:
+    """Session for handlers that only read; the replica may lag the primary slightly."""
+    async with read_session_maker() as session:
+        yield session
@@ -0,0 +1,120 @@
+import argparse
+import asyncio
+import csv
+import io
+import uuid
+from datetime import datetime
+from typing import AsyncIterator, Optional, Sequence
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from sqlalchemy import Row
+
+from .database import read_session_maker
+from .manager import LogsManager
+from .schemas import to_naive_utc
+
+COLUMNS = ("id", "user_id", "winner_id", "loser_id", "total_rounds", "created_at")
+PARQUET_SCHEMA = pa.schema([
+    ("id", pa.int64()),
+    ("user_id", pa.string()),
+    ("winner_id", pa.int32()),
+    ("loser_id", pa.int32()),
+    ("total_rounds", pa.int32()),
+    ("created_at", pa.timestamp("us")),
+])
+
+
+async def csv_chunks(partitions: AsyncIterator[Sequence[Row]]) -> AsyncIterator[bytes]:
+    """One CSV chunk per partition of rows, the header comes first."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(COLUMNS)
+    async for rows in partitions:
+        writer.writerows(rows)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file for ``ParquetWriter`` whose bytes are taken out as they are written; ``tell`` keeps
+    counting from the start, which is what the file footer offsets are computed from."""
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def take(self) -> bytes:
+        data, self.chunks = b"".join(self.chunks), []
+        return data
+
+
+async def parquet_chunks(partitions: AsyncIterator[Sequence[Row]]) -> AsyncIterator[bytes]:
+    """One Parquet row group per partition of rows; only the file footer is written at the end."""
+    sink = _ChunkSink()
+    with pq.ParquetWriter(sink, PARQUET_SCHEMA) as writer:
+        async for rows in partitions:
+            columns = list(zip(*rows))
+            columns[1] = [str(user_id) for user_id in columns[1]]
+            writer.write_batch(pa.record_batch(columns, schema=PARQUET_SCHEMA))
+            yield sink.take()
+    yield sink.take()
+
+
+FORMATS = {
+    "csv": ("text/csv", csv_chunks),
+    "parquet": ("application/vnd.apache.parquet", parquet_chunks),
+}
+
+
+async def export_logs(
+        session_maker,
+        format: str,
+        user_id: Optional[uuid.UUID] = None,
+        pokemon_id: Optional[int] = None,
+        created_from: Optional[datetime] = None,
+        created_to: Optional[datetime] = None,
+) -> AsyncIterator[bytes]:
+    """Stream the matching logs in ``format``, holding one chunk of rows in memory at a time."""
+    _, encode = FORMATS[format]
+    async with session_maker() as session:
+        partitions = LogsManager(session).stream_logs(user_id, pokemon_id, created_from, created_to)
+        async for chunk in encode(partitions):
+            yield chunk
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Export battle logs")
+    parser.add_argument("output", help="Output file")
+    parser.add_argument("--format", choices=FORMATS, default="csv")
+    parser.add_argument("--user-id", type=uuid.UUID)
+    parser.add_argument("--pokemon-id", type=int)
+    parser.add_argument("--created-from", type=lambda value: to_naive_utc(datetime.fromisoformat(value)))
+    parser.add_argument("--created-to", type=lambda value: to_naive_utc(datetime.fromisoformat(value)))
+    args = parser.parse_args()
+
+    size = 0
+    with open(args.output, "wb") as output:
+        async for chunk in export_logs(read_session_maker, args.format, args.user_id, args.pokemon_id,
+                                       args.created_from, args.created_to):
+            output.write(chunk)
+            size += len(chunk)
+    print(f"Exported {size} bytes to {args.output}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,102 @@
+import argparse
+import asyncio
+import time
+import uuid
+from typing import List, Optional, Tuple
+
+from redis import asyncio as aioredis
+from sqlalchemy import extract, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .config import REDIS_HOST, REDIS_PORT, LEADERBOARD_REBUILD_CHUNK_SIZE
+from .database import async_session_maker
+from .models import Logs
+from .schemas import LogSchema
+
+BOARDS = ("battles", "rounds", "recent")
+
+
+class Leaderboard:
+    """Per-user leaderboards kept in redis sorted sets: battles played, total rounds and the time of the last
+    battle (UTC epoch seconds). Writes update all boards in one MULTI/EXEC; reads are O(log N) per rank."""
+
+    prefix = "leaderboard"
+
+    def __init__(self, redis=None):
+        self.redis = redis
+
+    def key(self, board: str) -> str:
+        return f"{self.prefix}:{board}"
+
+    async def on_logs(self, logs: List[Tuple[uuid.UUID, LogSchema]]):
+        if self.redis is None or not logs:
+            return
+        now = time.time()
+        async with self.redis.pipeline(transaction=True) as pipe:
+            for user_id, log in logs:
+                member = str(user_id)
+                pipe.zincrby(self.key("battles"), 1, member)
+                pipe.zincrby(self.key("rounds"), log.total_rounds, member)
+                pipe.zadd(self.key("recent"), {member: now}, gt=True)
+            await pipe.execute()
+
+    async def top(self, board: str, limit: int) -> List[Tuple[str, float]]:
+        return await self.redis.zrevrange(self.key(board), 0, limit - 1, withscores=True)
+
+    async def rank(self, board: str, user_id: uuid.UUID) -> Optional[Tuple[int, float]]:
+        """Zero-based rank and score of ``user_id``, or ``None`` if the user has no battles."""
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.zrevrank(self.key(board), str(user_id)).zscore(self.key(board), str(user_id))
+            rank, score = await pipe.execute()
+        if rank is None:
+            return None
+        return rank, score
+
+    async def rebuild(self, session: AsyncSession, chunk_size: int = LEADERBOARD_REBUILD_CHUNK_SIZE) -> int:
+        """Recompute every board from the ``logs`` table into temporary keys and swap them in atomically.
+
+        Logs written while the scan runs may be missing from the result; run it when writes are quiet, and
+        on a session of the primary, as a lagging replica would drop battles the live updates already counted.
+        """
+        stmt = select(
+            Logs.user_id,
+            func.count(),
+            func.sum(Logs.total_rounds),
+            # created_at is naive UTC, so its epoch is on the same clock as time.time() in on_logs
+            extract("epoch", func.max(Logs.created_at)),
+        ).group_by(Logs.user_id)
+        staging = {board: f"{self.key(board)}:rebuild" for board in BOARDS}
+        await self.redis.delete(*staging.values())
+        users = 0
+        result = await session.stream(stmt.execution_options(yield_per=chunk_size))
+        async for rows in result.partitions():
+            async with self.redis.pipeline(transaction=False) as pipe:
+                pipe.zadd(staging["battles"], {str(user_id): count for user_id, count, _, _ in rows})
+                pipe.zadd(staging["rounds"], {str(user_id): rounds for user_id, _, rounds, _ in rows})
+                pipe.zadd(staging["recent"], {str(user_id): float(last) for user_id, _, _, last in rows})
+                await pipe.execute()
+            users += len(rows)
+
+        async with self.redis.pipeline(transaction=True) as pipe:
+            for board, key in staging.items():
+                if users:
+                    pipe.rename(key, self.key(board))
+                else:
+                    pipe.delete(self.key(board))
+            await pipe.execute()
+        return users
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Leaderboard maintenance")
+    parser.add_argument("command", choices=["rebuild"])
+    parser.parse_args()
+
+    redis = aioredis.from_url(f"redis://{REDIS_HOST}:{REDIS_PORT}", encoding="utf-8", decode_responses=True)
+    async with async_session_maker() as session:
+        users = await Leaderboard(redis).rebuild(session)
+    print(f"Rebuilt leaderboards for {users} users")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,292 @@
+import asyncio
+import logging
+import os
+import socket
+import uuid
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from redis.exceptions import ResponseError
+from sqlalchemy.exc import DataError, IntegrityError
+
+from .config import (LOGS_WRITE_BEHIND, LOGS_BUFFER_MAX_SIZE, LOGS_BUFFER_BATCH_SIZE, LOGS_BUFFER_FLUSH_INTERVAL,
+                     LOGS_BUFFER_PUT_TIMEOUT, LOGS_BUFFER_MAX_RETRIES, LOGS_BUFFER_MAX_RETRY_DELAY, LOGS_STREAM_KEY, LOGS_STREAM_GROUP,
+                     LOGS_STREAM_CLAIM_IDLE, LOGS_STREAM_DEAD_LETTER_KEY, LOGS_STREAM_MAX_DELIVERIES)
+from .manager import LogsManager
+from .schemas import LogSchema
+
+logger = logging.getLogger(__name__)
+
+BufferedLog = Tuple[uuid.UUID, LogSchema]
+# errors that retrying the same log cannot fix, e.g. a user deleted since the log was queued
+REJECTED_ERRORS = (IntegrityError, DataError)
+
+
+class LogBufferFullException(Exception):
+    pass
+
+
+class LogWriteBuffer:
+    """Write-behind buffer for battle logs: ``put`` only enqueues, ``run`` writes batches of up to
+    ``batch_size`` logs at least every ``flush_interval`` seconds in one transaction each.
+
+    The queue holds at most ``max_size`` logs; ``put`` waits ``put_timeout`` seconds for room and then raises
+    ``LogBufferFullException``. ``drain`` stops accepting logs and waits until the queued ones are written.
+    """
+
+    def __init__(
+            self,
+            session_maker,
+            max_size: int = LOGS_BUFFER_MAX_SIZE,
+            batch_size: int = LOGS_BUFFER_BATCH_SIZE,
+            flush_interval: float = LOGS_BUFFER_FLUSH_INTERVAL,
+            put_timeout: float = LOGS_BUFFER_PUT_TIMEOUT,
+            max_retries: int = LOGS_BUFFER_MAX_RETRIES,
+            listeners: Sequence = (),
+    ):
+        self.session_maker = session_maker
+        self.listeners = listeners
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+        self.max_retries = max_retries
+        self.closing = False
+        self.counters = {"queued": 0, "written": 0, "dropped": 0, "rejected": 0}
+        self._queue: asyncio.Queue[BufferedLog] = asyncio.Queue(max_size)
+        self._batch_ready = asyncio.Event()
+
+    async def put(self, user_id: uuid.UUID, log: LogSchema):
+        if self.closing:
+            raise LogBufferFullException("Log buffer is shutting down")
+        try:
+            await asyncio.wait_for(self._queue.put((user_id, log)), self.put_timeout)
+        except asyncio.TimeoutError:
+            self.counters["rejected"] += 1
+            raise LogBufferFullException("Log buffer is full") from None
+        self.counters["queued"] += 1
+        # + 1: the flusher already holds the first log of the batch it is waiting on
+        if self._queue.qsize() + 1 >= self.batch_size:
+            self._batch_ready.set()
+
+    async def write(self, logs: List[BufferedLog]):
+        """Insert ``logs`` in one transaction, retrying ``max_retries`` times with backoff."""
+        for attempt in range(self.max_retries + 1):
+            try:
+                async with self.session_maker() as session:
+                    await LogsManager(session, listeners=self.listeners).create_logs_for_users(logs)
+                self.counters["written"] += len(logs)
+                return
+            except Exception as e:
+                if attempt == self.max_retries or isinstance(e, REJECTED_ERRORS):
+                    raise
+                logger.warning("Failed to write buffered logs, retrying", exc_info=True)
+                await asyncio.sleep(0.5 * 2 ** attempt)
+
+    async def write_each(self, logs: List[BufferedLog]) -> Dict[int, Exception]:
+        """Insert ``logs`` one transaction each, after their batch failed; returns the errors by index."""
+        errors = {}
+        for index, log in enumerate(logs):
+            try:
+                async with self.session_maker() as session:
+                    await LogsManager(session, listeners=self.listeners).create_logs_for_users([log])
+                self.counters["written"] += 1
+            except Exception as e:
+                errors[index] = e
+        return errors
+
+    async def _next_batch(self) -> List[BufferedLog]:
+        first = await self._queue.get()
+        if not self.closing and self._queue.qsize() + 1 < self.batch_size:
+            self._batch_ready.clear()
+            try:
+                await asyncio.wait_for(self._batch_ready.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+        return [first] + [self._queue.get_nowait() for _ in range(min(self._queue.qsize(), self.batch_size - 1))]
+
+    async def _write_batch(self, batch: List[BufferedLog]):
+        """Write ``batch``, dropping only the logs the database rejects; the others were already accepted by
+        the API, so they are retried with backoff until they are written, however long the outage."""
+        delay = 0.5
+        while True:
+            try:
+                await self.write(batch)
+                return
+            except REJECTED_ERRORS:
+                logger.warning("A batch of buffered logs was rejected, writing them one by one", exc_info=True)
+                errors = await self.write_each(batch)
+                rejected = [index for index, error in errors.items() if isinstance(error, REJECTED_ERRORS)]
+                if rejected:
+                    self.counters["dropped"] += len(rejected)
+                    logger.error(f"Dropping {len(rejected)} buffered logs the database rejected",
+                                 exc_info=errors[rejected[0]])
+                batch = [batch[index] for index in errors if index not in rejected]
+                if not batch:
+                    return
+            except Exception:
+                logger.warning(f"Failed to write {len(batch)} buffered logs, retrying in {delay} s", exc_info=True)
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, LOGS_BUFFER_MAX_RETRY_DELAY)
+
+    async def run(self):
+        while True:
+            batch = await self._next_batch()
+            try:
+                await self._write_batch(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def drain(self, timeout: Optional[float] = None):
+        self.closing = True
+        self._batch_ready.set()
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.error(f"{self._queue.qsize()} buffered logs were not written before shutdown")
+
+    def stats(self) -> dict:
+        return {**self.counters, "pending": self._queue.qsize()}
+
+
+class RedisStreamLogBuffer(LogWriteBuffer):
+    """``LogWriteBuffer`` backed by a redis stream read through a consumer group, so queued logs survive a
+    worker restart: entries are acknowledged only after their batch is committed, and entries left pending
+    by a dead worker are claimed after ``LOGS_STREAM_CLAIM_IDLE`` seconds.
+
+    Entries that do not parse, or that the database rejects, are moved to the ``dead_letter`` stream with
+    their error, so one bad entry never blocks the others; a batch the database rejects is retried entry by
+    entry to find them. A batch that fails for another reason stays pending, unless its entries were already
+    delivered ``max_deliveries`` times: then it is retried entry by entry too, and an entry that still fails
+    while others go through is moved to the dead-letter stream.
+    """
+
+    def __init__(self, session_maker, redis, stream: str = LOGS_STREAM_KEY, group: str = LOGS_STREAM_GROUP,
+                 dead_letter: str = LOGS_STREAM_DEAD_LETTER_KEY, max_deliveries: int = LOGS_STREAM_MAX_DELIVERIES,
+                 **kwargs):
+        super().__init__(session_maker, **kwargs)
+        self.redis = redis
+        self.stream = stream
+        self.group = group
+        self.dead_letter = dead_letter
+        self.max_deliveries = max_deliveries
+        self.max_size = self._queue.maxsize
+        self.consumer = f"{socket.gethostname()}-{os.getpid()}"
+
+    async def put(self, user_id: uuid.UUID, log: LogSchema):
+        if self.closing:
+            raise LogBufferFullException("Log buffer is shutting down")
+        # the length check and the add are not atomic, so the stream may overshoot max_size by a few entries
+        if await self.redis.xlen(self.stream) >= self.max_size:
+            self.counters["rejected"] += 1
+            raise LogBufferFullException("Log buffer is full")
+        await self.redis.xadd(self.stream, {"user_id": str(user_id), "log": log.model_dump_json()})
+        self.counters["queued"] += 1
+
+    async def _ensure_group(self):
+        try:
+            await self.redis.xgroup_create(self.stream, self.group, id="0", mkstream=True)
+        except ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    async def _read(self, block: Optional[int]) -> List[Tuple[str, dict]]:
+        _, claimed, *_ = await self.redis.xautoclaim(self.stream, self.group, self.consumer,
+                                                     min_idle_time=int(LOGS_STREAM_CLAIM_IDLE * 1000),
+                                                     count=self.batch_size)
+        if claimed:
+            return claimed
+        response = await self.redis.xreadgroup(self.group, self.consumer, {self.stream: ">"},
+                                               count=self.batch_size, block=block)
+        return response[0][1] if response else []
+
+    async def _flush(self, block: Optional[int]) -> int:
+        entries = await self._read(block)
+        if not entries:
+            return 0
+        valid, logs = [], []
+        for entry_id, fields in entries:
+            try:
+                logs.append((uuid.UUID(fields["user_id"]), LogSchema.model_validate_json(fields["log"])))
+                valid.append((entry_id, fields))
+            # a ValidationError is a ValueError
+            except (KeyError, ValueError) as e:
+                await self._dead_letter(entry_id, fields, e)
+        if not valid:
+            return len(entries)
+        try:
+            await self.write(logs)
+        except Exception as e:
+            if not isinstance(e, REJECTED_ERRORS) and \
+                    max([await self._deliveries(entry_id) for entry_id, _ in valid]) < self.max_deliveries:
+                # most likely the database is down, the entries stay pending and are claimed again
+                raise
+            logger.warning("Failed to write a batch from the log stream, writing it entry by entry", exc_info=True)
+            errors = await self.write_each(logs)
+            # an entry failing for another reason is set aside only if the database took the others
+            reachable = len(errors) < len(logs) or any(isinstance(error, REJECTED_ERRORS) for error in errors.values())
+            retry = []
+            for index, error in errors.items():
+                entry_id, fields = valid[index]
+                if isinstance(error, REJECTED_ERRORS) or (
+                        reachable and await self._deliveries(entry_id) >= self.max_deliveries):
+                    await self._dead_letter(entry_id, fields, error)
+                else:
+                    retry.append(entry_id)
+            await self._remove([entry_id for index, (entry_id, _) in enumerate(valid) if index not in errors])
+            if retry:
+                raise next(iter(errors.values()))
+            return len(entries)
+        await self._remove([entry_id for entry_id, _ in valid])
+        return len(entries)
+
+    async def _dead_letter(self, entry_id: str, fields: dict, error: Exception):
+        await self.redis.xadd(self.dead_letter, {**fields, "error": str(error)[:1000]})
+        await self._remove([entry_id])
+        self.counters["dropped"] += 1
+
+    async def _deliveries(self, entry_id: str) -> int:
+        pending = await self.redis.xpending_range(self.stream, self.group, min=entry_id, max=entry_id, count=1)
+        return pending[0]["times_delivered"] if pending else 0
+
+    async def _remove(self, ids: List[str]):
+        if ids:
+            await self.redis.xack(self.stream, self.group, *ids)
+            await self.redis.xdel(self.stream, *ids)
+
+    async def run(self):
+        await self._ensure_group()
+        while True:
+            try:
+                # a short batch waits for the flush interval before it is written
+                if await self._flush(block=int(self.flush_interval * 1000)) < self.batch_size:
+                    await asyncio.sleep(self.flush_interval)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # unacknowledged entries stay pending and are claimed again
+                logger.warning("Failed to flush the log stream", exc_info=True)
+                await asyncio.sleep(self.flush_interval)
+
+    async def drain(self, timeout: Optional[float] = None):
+        self.closing = True
+
+        async def flush_all():
+            while await self._flush(block=None):
+                pass
+
+        try:
+            await asyncio.wait_for(flush_all(), timeout)
+        except Exception:
+            logger.warning("Log stream was not fully drained, the rest is written after restart", exc_info=True)
+
+    def stats(self) -> dict:
+        return dict(self.counters)
+
+
+def make_log_buffer(session_maker, redis=None, mode: str = LOGS_WRITE_BEHIND,
+                    listeners: Sequence = ()) -> Optional[LogWriteBuffer]:
+    if mode == "memory":
+        return LogWriteBuffer(session_maker, listeners=listeners)
+    if mode == "redis":
+        return RedisStreamLogBuffer(session_maker, redis, listeners=listeners)
+    return None
@@ -1,29 +1,66 @@
-from fastapi import FastAPI, Depends, HTTPException
+import asyncio
+import json
+import logging
+import uuid
+from typing import Annotated, Any, List, Literal, Optional, Union
+
+from fastapi import FastAPI, Depends, HTTPException, Path, Query, Request
+from fastapi.encoders import jsonable_encoder
 from fastapi.security import HTTPBasic, HTTPBasicCredentials
-import httpx
 from fastapi_cache import FastAPICache
-from fastapi_cache.decorator import cache
-from fastapi_cache.backends.redis import RedisBackend
-from pydantic import EmailStr
+from pydantic import EmailStr, ValidationError
 from sqlalchemy.ext.asyncio import AsyncSession
 from starlette import status
 from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse, Response, StreamingResponse
 from redis import asyncio as aioredis
 
 from .auth.base_config import fastapi_users, auth_backend, current_user
 from .auth.manager import google_oauth_client
+from .auth.hashing import password_hasher, HashingOverloadedException
+from .auth.principals import principal_cache
 from .auth.router import get_auth_router
 from .auth.schemas import UserRead, UserCreate, UserUpdate
-from .database import get_async_session
+from .aliases import AliasIndex, canonical_name
+from .cache import TwoTierBackend, ResponseCoder, CompactResponseCoder, cached, get_many_with_ttl, decode_negative, negative_stats
+from . import export, mirror, partitions
+from .database import get_async_session, get_read_session, async_session_maker, read_session_maker
 from .mail_service import send_logs_mail
-from .manager import LogsManager
+from .manager import LogsManager, InvalidCursorException
 from .ftp_client import save_pokemon_md, FTPException
+from .leaderboard import Leaderboard
+from .log_buffer import make_log_buffer, LogBufferFullException
+from .win_rates import WinRates, WinRatesNotReadyException
+from .projection import parse_fields, format_fields, project, InvalidFieldsException
+from .pokeapi import open_client, close_client, fetch_pokemon, fetch_pokemons, PokeAPIException, breaker
+from .single_flight import SingleFlight
+from .warmup import popularity, warm_up, warm_up_within_budget, POKEMON_POPULARITY_KEY, PAGES_POPULARITY_KEY
+
+from .schemas import (LogSchema, PokemonSchema, PokemonProjection, PokemonBatchRequest, PokemonBatchItem,
+                      PokemonBatchResponse, LogBatchRequest, LogBatchError, LogBatchResponse, LogPage, LeaderboardEntry,
+                      LeaderboardResponse, PokemonWinRate, PokemonWinRateResponse, LogTimestamp)
+from .config import (REDIS_HOST, REDIS_PORT, STATE_SECRET, SINGLE_FLIGHT_REDIS_LOCK, POKEMON_SOURCE,
+                     POKEMON_BATCH_CONCURRENCY, POKEMONS_MAX_PAGE_SIZE, NEGATIVE_CACHE_EXPIRE,
+                     WARMUP_ON_STARTUP, CACHE_COMPACT_POKEMON, LOGS_BUFFER_DRAIN_TIMEOUT, LOGS_MAX_PAGE_SIZE,
+                     LEADERBOARD_MAX_SIZE, WIN_RATES_MAX_SIZE, LOGS_PARTITION_MAINTENANCE, POKEMON_MAX_ID)
 
-from .schemas import LogSchema, PokemonSchema
-from .config import REDIS_HOST, REDIS_PORT, STATE_SECRET
+logger = logging.getLogger(__name__)
 
 app = FastAPI()
 
+single_flight = SingleFlight()
+
+aliases = AliasIndex()
+
+leaderboard = Leaderboard()
+
+win_rates = WinRates()
+
+# derived views of the logs, updated after every committed write
+log_listeners = [leaderboard, win_rates]
+
+PokemonCoder = CompactResponseCoder.for_model(PokemonSchema) if CACHE_COMPACT_POKEMON else ResponseCoder
+
 origins = [
     "http://127.0.0.1:6459",
     "http://127.0.0.1:8000",
@@ -48,7 +85,33 @@ async def startup_event():
         encoding="utf-8",
         decode_responses=True
     )
-    FastAPICache.init(RedisBackend(app.state.redis), prefix="fastapi-cache")
+    # cached values are bytes, so the cache gets its own client without response decoding
+    app.state.cache_redis = aioredis.from_url(f"redis://{REDIS_HOST}:{REDIS_PORT}")
+    app.state.cache_backend = TwoTierBackend(app.state.cache_redis)
+    app.state.cache_invalidation = asyncio.create_task(app.state.cache_backend.listen_for_invalidations())
+    FastAPICache.init(app.state.cache_backend, prefix="fastapi-cache")
+    open_client()
+    if SINGLE_FLIGHT_REDIS_LOCK:
+        single_flight.redis = app.state.redis
+    aliases.redis = app.state.redis
+    principal_cache.redis = app.state.redis
+    password_hasher.start()
+    leaderboard.redis = app.state.redis
+    win_rates.redis = app.state.redis
+    app.state.win_rates_updates = asyncio.create_task(win_rates.run(read_session_maker))
+    app.state.popularity_flush = asyncio.create_task(popularity.run(app.state.redis))
+    app.state.log_buffer = make_log_buffer(async_session_maker, app.state.redis, listeners=log_listeners)
+    if app.state.log_buffer is not None:
+        app.state.log_buffer_flush = asyncio.create_task(app.state.log_buffer.run())
+    app.state.logs_partitions = None
+    if LOGS_PARTITION_MAINTENANCE:
+        app.state.logs_partitions = asyncio.create_task(partitions.run(async_session_maker))
+    if WARMUP_ON_STARTUP:
+        app.state.warm_up = await warm_up_within_budget(warm_up(
+            app.state.redis,
+            lambda name: get_pokemon_record(poke_name=name),
+            lambda limit, offset: get_pokemons_page(limit=limit, offset=offset),
+        ))
     app.include_router(
         get_auth_router(auth_backend, fastapi_users.get_user_manager, fastapi_users.authenticator, app.state.redis),
         prefix="/auth",
@@ -56,6 +119,31 @@ async def startup_event():
     )
 
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    if app.state.log_buffer is not None:
+        await app.state.log_buffer.drain(LOGS_BUFFER_DRAIN_TIMEOUT)
+        app.state.log_buffer_flush.cancel()
+    app.state.cache_invalidation.cancel()
+    app.state.win_rates_updates.cancel()
+    app.state.popularity_flush.cancel()
+    if app.state.logs_partitions is not None:
+        app.state.logs_partitions.cancel()
+    try:
+        await popularity.flush(app.state.redis)
+    except Exception:
+        logger.warning("Failed to flush popularity counters", exc_info=True)
+    await close_client()
+    password_hasher.shutdown()
+
+
+@app.exception_handler(HashingOverloadedException)
+async def hashing_overloaded_handler(request: Request, exc: HashingOverloadedException):
+    # raised inside the fastapi-users routes (login, register), which cannot translate it themselves
+    return JSONResponse(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, content={"detail": str(exc)},
+                        headers={"Retry-After": "1"})
+
+
 app.include_router(
     fastapi_users.get_oauth_router(google_oauth_client, auth_backend, STATE_SECRET,
                                    redirect_url="http://localhost:5173/auth/callback", associate_by_email=True),
@@ -109,12 +197,144 @@ async def add_to_db(
         session: AsyncSession = Depends(get_async_session)
 ):
     try:
-        await LogsManager(session).create_log(user.id, log.winner_id, log.loser_id, log.total_rounds)
+        await LogsManager(session, app.state.log_buffer, log_listeners).create_log(
+            user.id, log.winner_id, log.loser_id, log.total_rounds
+        )
         return log
+    except LogBufferFullException as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
 
 
+@app.post(
+    "/add_to_db/bulk",
+    status_code=status.HTTP_201_CREATED,
+    response_model=LogBatchResponse,
+    dependencies=[Depends(current_user)]
+)
+async def add_to_db_bulk(
+        batch: LogBatchRequest,
+        user=Depends(current_user),
+        session: AsyncSession = Depends(get_async_session)
+):
+    logs, errors = [], []
+    for index, item in enumerate(batch.logs):
+        try:
+            logs.append(LogSchema.model_validate(item))
+        except ValidationError as e:
+            errors.append(LogBatchError(index=index, errors=e.errors(include_url=False, include_context=False)))
+    try:
+        inserted = await LogsManager(session, listeners=log_listeners).create_logs_bulk(user.id, logs)
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+    return LogBatchResponse(inserted=inserted, errors=errors)
+
+
+@app.get(
+    "/logs",
+    status_code=status.HTTP_200_OK,
+    response_model=LogPage,
+    dependencies=[Depends(current_user)]
+)
+async def get_logs(
+        user_id: Optional[uuid.UUID] = None,
+        pokemon_id: Annotated[Optional[int], Query(gt=0, le=POKEMON_MAX_ID,
+                                                   description="Logs where this pokemon won or lost")] = None,
+        created_from: Optional[LogTimestamp] = None,
+        created_to: Optional[LogTimestamp] = None,
+        limit: Annotated[int, Query(ge=1, le=LOGS_MAX_PAGE_SIZE)] = 20,
+        cursor: Optional[str] = None,
+        user=Depends(current_user),
+        session: AsyncSession = Depends(get_read_session)
+):
+    if not user.is_superuser:
+        if user_id is not None and user_id != user.id:
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not allowed to read other users' logs")
+        user_id = user.id
+    try:
+        return await LogsManager(session).get_logs(limit, cursor, user_id, pokemon_id, created_from, created_to)
+    except InvalidCursorException as e:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e))
+
+
+@app.get(
+    "/logs/export",
+    status_code=status.HTTP_200_OK,
+    dependencies=[Depends(current_user)]
+)
+async def export_logs(
+        format: Literal["csv", "parquet"] = "csv",
+        user_id: Optional[uuid.UUID] = None,
+        pokemon_id: Annotated[Optional[int], Query(gt=0, le=POKEMON_MAX_ID,
+                                                   description="Logs where this pokemon won or lost")] = None,
+        created_from: Optional[LogTimestamp] = None,
+        created_to: Optional[LogTimestamp] = None,
+        user=Depends(current_user)
+):
+    """Stream every matching log, oldest first, as CSV or Parquet."""
+    if not user.is_superuser:
+        if user_id is not None and user_id != user.id:
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not allowed to read other users' logs")
+        user_id = user.id
+    media_type, _ = export.FORMATS[format]
+    # the export opens its own session, it outlives the request's dependencies
+    chunks = export.export_logs(read_session_maker, format, user_id, pokemon_id, created_from, created_to)
+    return StreamingResponse(chunks, media_type=media_type,
+                             headers={"Content-Disposition": f'attachment; filename="logs.{format}"'})
+
+
+@app.get(
+    "/leaderboard/{board}",
+    status_code=status.HTTP_200_OK,
+    response_model=LeaderboardResponse,
+    dependencies=[Depends(current_user)]
+)
+async def get_leaderboard(
+        board: Literal["battles", "rounds", "recent"],
+        limit: Annotated[int, Query(ge=1, le=LEADERBOARD_MAX_SIZE)] = 10,
+        user=Depends(current_user)
+):
+    top = await leaderboard.top(board, limit)
+    me = await leaderboard.rank(board, user.id)
+    return LeaderboardResponse(
+        board=board,
+        top=[LeaderboardEntry(user_id=user_id, rank=rank + 1, score=score) for rank, (user_id, score) in enumerate(top)],
+        me=LeaderboardEntry(user_id=user.id, rank=me[0] + 1, score=me[1]) if me is not None else None,
+    )
+
+
+@app.get(
+    "/win-rates/top",
+    status_code=status.HTTP_200_OK,
+    response_model=List[PokemonWinRate])
+async def get_top_win_rates(
+        limit: Annotated[int, Query(ge=1, le=WIN_RATES_MAX_SIZE)] = 10,
+        min_battles: Annotated[int, Query(ge=1)] = 1
+):
+    try:
+        return win_rates.get_matrix().top(limit, min_battles)
+    except WinRatesNotReadyException as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
+
+
+@app.get(
+    "/win-rates/{pokemon_id}",
+    status_code=status.HTTP_200_OK,
+    response_model=PokemonWinRateResponse)
+async def get_pokemon_win_rate(
+        pokemon_id: Annotated[int, Path(gt=0)],
+        matchups: Annotated[int, Query(ge=0, le=WIN_RATES_MAX_SIZE)] = 5,
+        min_battles: Annotated[int, Query(ge=1)] = 1
+):
+    try:
+        matrix = win_rates.get_matrix()
+    except WinRatesNotReadyException as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
+    best, worst = matrix.matchups(pokemon_id, matchups, min_battles)
+    return PokemonWinRateResponse(**matrix.win_rate(pokemon_id), best_matchups=best, worst_matchups=worst)
+
+
 security = HTTPBasic()
 
 
@@ -139,26 +359,164 @@ async def save_pokemon(
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
 
 
+async def load_pokemon(poke_name: str) -> dict:
+    poke_name = canonical_name(poke_name)
+    if POKEMON_SOURCE == "mirror":
+        try:
+            async with read_session_maker() as session:
+                data = await mirror.get_pokemon(session, poke_name)
+            if data is not None:
+                return data
+        except Exception:
+            logger.warning("Pokemon mirror lookup failed, falling back to PokeAPI", exc_info=True)
+    # keyed by id once the name is known, so concurrent misses for "25" and "pikachu" share one fetch
+    poke_id = await aliases.resolve(poke_name)
+    key = f"pokemon:{poke_id if poke_id is not None else poke_name}"
+    return await single_flight.do(key, lambda: fetch_pokemon(poke_name))
+
+
+async def load_pokemons(limit: int, offset: int = 0) -> dict:
+    if POKEMON_SOURCE == "mirror":
+        try:
+            async with read_session_maker() as session:
+                data = await mirror.get_pokemons(session, limit, offset)
+            if data is not None:
+                return data
+        except Exception:
+            logger.warning("Pokemon mirror listing failed, falling back to PokeAPI", exc_info=True)
+    return await single_flight.do(f"pokemons:{offset}:{limit}", lambda: fetch_pokemons(limit, offset))
+
+
+async def pokemon_key_builder(func, namespace: str = "", *, request=None, response=None, args, kwargs) -> str:
+    # callers that resolved the name already pass poke_id, and cost no alias lookup here
+    poke_id = kwargs["poke_id"] if "poke_id" in kwargs else await aliases.resolve(kwargs["poke_name"])
+    key = f"{namespace}:{poke_id if poke_id is not None else canonical_name(kwargs['poke_name'])}"
+    if "fields" in kwargs:
+        key = f"{key}:{kwargs['fields']}"
+    return key
+
+
+def pokemons_page_key_builder(func, namespace: str = "", *, request=None, response=None, args, kwargs) -> str:
+    # an over-cap limit returns the capped page, so it shares that page's entry
+    limit = min(kwargs.get("limit", 20), POKEMONS_MAX_PAGE_SIZE)
+    return f"{namespace}:{kwargs.get('offset', 0)}:{limit}"
+
+
+async def pokemon_result_key(namespace: str, pokemon: PokemonSchema) -> str:
+    # names are only learned here, so the first lookup by name is stored under the id key as well
+    await aliases.learn(pokemon.name, pokemon.id)
+    return f"{namespace}:{pokemon.id}"
+
+
+@cached(expire=6000, namespace="pokemon", coder=PokemonCoder, negative_expire=NEGATIVE_CACHE_EXPIRE,
+        key_builder=pokemon_key_builder, result_key=pokemon_result_key)
+async def get_pokemon_record(
+        poke_name: str
+):
+    try:
+        return PokemonSchema(**await load_pokemon(poke_name))
+    except PokeAPIException as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail) from e
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e)) from e
+
+
+def response_data(result) -> Any:
+    if isinstance(result, Response):
+        return json.loads(result.body)
+    return jsonable_encoder(result)
+
+
+@cached(expire=6000, namespace="pokemon-fields", coder=ResponseCoder, key_builder=pokemon_key_builder)
+async def get_pokemon_projection(
+        poke_name: str,
+        fields: str
+):
+    # derived from the cached full record, so a new field set never costs an upstream call
+    record = await get_pokemon_record(poke_name=poke_name)
+    return project(response_data(record), parse_fields(fields, PokemonSchema))
+
+
 @app.get(
     "/pokemon/{poke_name}",
     status_code=status.HTTP_200_OK,
-    response_model=PokemonSchema)
-@cache(expire=6000)
+    # the full record, or a PokemonProjection when fields= is given
+    response_model=Union[PokemonSchema, PokemonProjection])
 async def get_single_pokemon(
-        poke_name: str
+        poke_name: str,
+        fields: Annotated[Optional[str], Query(description="Comma-separated fields, e.g. name,stats.base_stat")] = None
 ):
+    if fields is None:
+        result = await get_pokemon_record(poke_name=poke_name)
+        # recorded only once found, so names that 404 never reach the popularity sets
+        popularity.record(POKEMON_POPULARITY_KEY, canonical_name(poke_name))
+        return result
+
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(f"https://pokeapi.co/api/v2/pokemon/{poke_name}")
+        fields = format_fields(parse_fields(fields, PokemonSchema))
+    except InvalidFieldsException as e:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e)) from e
+    result = await get_pokemon_projection(poke_name=poke_name, fields=fields)
+    popularity.record(POKEMON_POPULARITY_KEY, canonical_name(poke_name))
+    if not isinstance(result, Response):
+        # sent as is, like the cached hits, instead of being re-validated against the union
+        return JSONResponse(content=jsonable_encoder(result))
+    return result
+
+
+@app.post(
+    "/pokemon/batch",
+    status_code=status.HTTP_200_OK,
+    response_model=PokemonBatchResponse)
+async def get_pokemon_batch(
+        batch: PokemonBatchRequest
+):
+    names = list(dict.fromkeys(batch.names))
+    try:
+        # one HMGET resolves every alias, then one MGET reads every entry
+        poke_ids = await aliases.resolve_many(names)
+        keys = [await get_pokemon_record.cache_key(poke_name=name, poke_id=poke_id)
+                for name, poke_id in zip(names, poke_ids)]
+        cached_entries = await get_many_with_ttl(keys)
+    except Exception:
+        logger.warning("Batch cache lookup failed", exc_info=True)
+        cached_entries = [(0, None)] * len(names)
+    semaphore = asyncio.Semaphore(POKEMON_BATCH_CONCURRENCY)
+
+    async def load(name: str, ttl: int, value: bytes) -> PokemonBatchItem:
+        if value is not None and (error := decode_negative(value)) is not None:
+            negative_stats["hits"] += 1
+            return PokemonBatchItem(name=name, status_code=error.status_code, detail=error.detail)
+        if value is not None and get_pokemon_record.is_fresh(ttl):
+            pokemon = json.loads(PokemonCoder.body(value))
+            return PokemonBatchItem(name=name, status_code=status.HTTP_200_OK, pokemon=pokemon)
+        # misses and stale entries go through the cached endpoint, which fetches, refreshes and stores them
+        async with semaphore:
+            try:
+                pokemon = response_data(await get_pokemon_record(poke_name=name))
+            except HTTPException as e:
+                return PokemonBatchItem(name=name, status_code=e.status_code, detail=e.detail)
+        return PokemonBatchItem(name=name, status_code=status.HTTP_200_OK, pokemon=pokemon)
 
-        if response.status_code == status.HTTP_404_NOT_FOUND:
-            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Pokemon not found")
-        elif response.status_code != status.HTTP_200_OK:
-            raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="Invalid pokemon name")
+    items = await asyncio.gather(*[load(name, ttl, value) for name, (ttl, value) in zip(names, cached_entries)])
+    loaded = dict(zip(names, items))
+    return PokemonBatchResponse(results=[loaded[name] for name in batch.names])
 
-        return PokemonSchema(**response.json())
-    except HTTPException:
-        raise
+
+@cached(expire=6000, namespace="pokemons", key_builder=pokemons_page_key_builder)
+async def get_pokemons_page(
+        limit: int = 20,
+        offset: int = 0
+):
+    if limit < 1 or not isinstance(limit, int):
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="Invalid limit value")
+    if offset < 0:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="Invalid offset value")
+
+    try:
+        return await load_pokemons(min(limit, POKEMONS_MAX_PAGE_SIZE), offset)
+    except PokeAPIException as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail) from e
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e)) from e
 
@@ -166,18 +524,69 @@ async def get_single_pokemon(
 @app.get(
     "/pokemons/",
     status_code=status.HTTP_200_OK)
-@cache(expire=6000)
 async def get_multiple_pokemons(
-        limit: int = 20
+        limit: int = 20,
+        offset: int = 0
 ):
-    if limit < 1 or not isinstance(limit, int):
+    page = await get_pokemons_page(limit=limit, offset=offset)
+    # offsets past the end return empty pages, those are not worth warming up
+    if response_data(page).get("results"):
+        popularity.record(PAGES_POPULARITY_KEY, f"{offset}:{min(limit, POKEMONS_MAX_PAGE_SIZE)}")
+    return page
+
+
+@app.get(
+    "/pokemons/stream",
+    status_code=status.HTTP_200_OK)
+async def stream_pokemons(
+        limit: Optional[int] = None,
+        offset: int = 0
+):
+    """Stream the listing as NDJSON, one row per line, fetching and caching it page by page."""
+    if limit is not None and limit < 1:
         raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="Invalid limit value")
+    if offset < 0:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="Invalid offset value")
+    end = offset + limit if limit is not None else None
 
-    try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(f"https://pokeapi.co/api/v2/pokemon?limit={limit}")
-        return response.json()
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e)) from e
+    async def get_page(page_offset: int) -> dict:
+        size = POKEMONS_MAX_PAGE_SIZE if end is None else min(POKEMONS_MAX_PAGE_SIZE, end - page_offset)
+        return response_data(await get_pokemons_page(limit=size, offset=page_offset))
+
+    # the first page is fetched up front so upstream errors still get a proper status code
+    first_page = await get_page(offset)
+
+    async def rows():
+        page, page_offset = first_page, offset
+        while True:
+            for row in page["results"]:
+                yield json.dumps(row) + "\n"
+            page_offset += len(page["results"])
+            if not page.get("next") or not page["results"] or (end is not None and page_offset >= end):
+                break
+            page = await get_page(page_offset)
+
+    return StreamingResponse(rows(), media_type="application/x-ndjson")
+
+
+@app.get(
+    "/cache/stats",
+    status_code=status.HTTP_200_OK)
+async def get_cache_stats():
+    backend = FastAPICache.get_backend()
+    stats = backend.stats() if isinstance(backend, TwoTierBackend) else {}
+    return {**stats, "negative": negative_stats}
+
+
+@app.get(
+    "/pokeapi/stats",
+    status_code=status.HTTP_200_OK)
+async def get_pokeapi_stats():
+    return {"circuit_breaker": breaker.stats()}
+
+
+@app.get(
+    "/auth/hashing/stats",
+    status_code=status.HTTP_200_OK)
+async def get_password_hashing_stats():
+    return password_hasher.stats()
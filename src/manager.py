@@ -1,15 +1,54 @@
+import base64
+import logging
 import uuid
+from collections import defaultdict
+from datetime import datetime
+from typing import AsyncIterator, Dict, List, Optional, Sequence, Tuple
 
+from sqlalchemy import Row
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from .adapter import SQLAlchemyLogsAdapter
+from .schemas import LogSchema, LogRead, LogPage
+
+logger = logging.getLogger(__name__)
+
+
+class InvalidCursorException(Exception):
+    pass
+
+
+def encode_cursor(log: LogRead) -> str:
+    return base64.urlsafe_b64encode(f"{log.created_at.isoformat()}|{log.id}".encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        created_at, log_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(created_at), int(log_id)
+    except ValueError as e:
+        raise InvalidCursorException("Invalid cursor") from e
 
 
 class LogsManager:
     def __init__(self,
-                 session: AsyncSession
+                 session: AsyncSession,
+                 buffer=None,
+                 listeners: Sequence = ()
                  ):
         self.db_adapter = SQLAlchemyLogsAdapter(session=session)
+        # a LogWriteBuffer: create_log only enqueues and the buffer writes the log later
+        self.buffer = buffer
+        # objects with ``async on_logs([(user_id, log), ...])``, called once the logs are committed
+        self.listeners = listeners
+
+    async def notify(self, logs: List[Tuple[uuid.UUID, LogSchema]]):
+        for listener in self.listeners:
+            try:
+                await listener.on_logs(logs)
+            except Exception:
+                # the logs are stored already; derived data is repaired by its rebuild command
+                logger.warning(f"Log listener {type(listener).__name__} failed", exc_info=True)
 
     async def create_log(
             self,
@@ -18,4 +57,59 @@ class LogsManager:
             loser_id: int,
             total_rounds: int
     ):
-        return await self.db_adapter.create_logs(user_id, winner_id, loser_id, total_rounds)
\ No newline at end of file
+        if self.buffer is not None:
+            return await self.buffer.put(
+                user_id, LogSchema(winner_id=winner_id, loser_id=loser_id, total_rounds=total_rounds)
+            )
+        result = await self.db_adapter.create_logs(user_id, winner_id, loser_id, total_rounds)
+        await self.notify([(user_id, LogSchema(winner_id=winner_id, loser_id=loser_id, total_rounds=total_rounds))])
+        return result
+
+    async def create_logs_bulk(
+            self,
+            user_id: uuid.UUID,
+            logs: List[LogSchema]
+    ) -> int:
+        if not logs:
+            return 0
+        inserted = await self.db_adapter.create_logs_bulk(user_id, logs)
+        await self.notify([(user_id, log) for log in logs])
+        return inserted
+
+    async def create_logs_for_users(
+            self,
+            logs: List[Tuple[uuid.UUID, LogSchema]]
+    ) -> int:
+        by_user: Dict[uuid.UUID, List[LogSchema]] = defaultdict(list)
+        for user_id, log in logs:
+            by_user[user_id].append(log)
+        for user_id, user_logs in by_user.items():
+            await self.db_adapter.insert_logs(user_id, user_logs)
+        await self.db_adapter.session.commit()
+        await self.notify(logs)
+        return len(logs)
+
+    async def get_logs(
+            self,
+            limit: int,
+            cursor: Optional[str] = None,
+            user_id: Optional[uuid.UUID] = None,
+            pokemon_id: Optional[int] = None,
+            created_from: Optional[datetime] = None,
+            created_to: Optional[datetime] = None
+    ) -> LogPage:
+        after = decode_cursor(cursor) if cursor else None
+        # one extra row tells whether there is a next page
+        logs = await self.db_adapter.get_logs(limit + 1, after, user_id, pokemon_id, created_from, created_to)
+        items = [LogRead.model_validate(log) for log in logs[:limit]]
+        next_cursor = encode_cursor(items[-1]) if len(logs) > limit else None
+        return LogPage(items=items, next_cursor=next_cursor)
+
+    def stream_logs(
+            self,
+            user_id: Optional[uuid.UUID] = None,
+            pokemon_id: Optional[int] = None,
+            created_from: Optional[datetime] = None,
+            created_to: Optional[datetime] = None
+    ) -> AsyncIterator[Sequence[Row]]:
+        return self.db_adapter.stream_logs(user_id, pokemon_id, created_from, created_to)
@@ -0,0 +1,112 @@
+import argparse
+import asyncio
+import logging
+from typing import List, Optional
+
+import httpx
+from pydantic import ValidationError
+from sqlalchemy import func, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import compact
+from .database import async_session_maker
+from .config import POKEAPI_URL, MIRROR_INGEST_CONCURRENCY, MIRROR_INGEST_BATCH_SIZE
+from .models import Pokemon
+from .pokeapi import fetch_pokemon, fetch_pokemons, open_client, close_client, PokeAPIException
+from .schemas import PokemonSchema
+
+logger = logging.getLogger(__name__)
+
+
+async def store_pokemons(session: AsyncSession, pokemons: List[PokemonSchema]):
+    stmt = insert(Pokemon).values([
+        {"id": pokemon.id, "name": pokemon.name, "data": compact.pack(PokemonSchema, pokemon.model_dump())}
+        for pokemon in pokemons
+    ])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[Pokemon.id],
+        set_={"name": stmt.excluded.name, "data": stmt.excluded.data, "updated_at": func.now()},
+    )
+    await session.execute(stmt)
+    await session.commit()
+
+
+async def ingest(
+        client: httpx.AsyncClient,
+        session_maker,
+        concurrency: int = MIRROR_INGEST_CONCURRENCY,
+        batch_size: int = MIRROR_INGEST_BATCH_SIZE,
+) -> dict:
+    """Download every Pokemon listed by PokeAPI into the ``pokemon`` table, ``concurrency`` requests at a time."""
+    count = (await fetch_pokemons(1, client=client))["count"]
+    names = [item["name"] for item in (await fetch_pokemons(count, client=client))["results"]]
+    semaphore = asyncio.Semaphore(concurrency)
+    stats = {"ingested": 0, "failed": 0}
+
+    async def download(name: str) -> Optional[PokemonSchema]:
+        async with semaphore:
+            try:
+                return PokemonSchema(**await fetch_pokemon(name, client=client))
+            except (PokeAPIException, ValidationError, httpx.HTTPError) as e:
+                logger.warning(f"Skipping pokemon '{name}': {e}")
+                return None
+
+    batch: List[PokemonSchema] = []
+    async with session_maker() as session:
+        for download_result in asyncio.as_completed([download(name) for name in names]):
+            pokemon = await download_result
+            if pokemon is None:
+                stats["failed"] += 1
+                continue
+            batch.append(pokemon)
+            if len(batch) >= batch_size:
+                await store_pokemons(session, batch)
+                stats["ingested"] += len(batch)
+                batch = []
+        if batch:
+            await store_pokemons(session, batch)
+            stats["ingested"] += len(batch)
+    return stats
+
+
+async def get_pokemon(session: AsyncSession, poke_name: str) -> Optional[dict]:
+    condition = Pokemon.id == int(poke_name) if poke_name.isdigit() else Pokemon.name == poke_name
+    result = await session.execute(select(Pokemon.data).where(condition))
+    data = result.scalar_one_or_none()
+    # rows ingested before records were stored packed hold the plain dump
+    if data is not None and compact.is_packed(data):
+        return compact.unpack(PokemonSchema, data)
+    return data
+
+
+async def get_pokemons(session: AsyncSession, limit: int, offset: int = 0) -> Optional[dict]:
+    count = (await session.execute(select(func.count()).select_from(Pokemon))).scalar_one()
+    if count == 0:
+        return None
+    result = await session.execute(
+        select(Pokemon.id, Pokemon.name).order_by(Pokemon.id).offset(offset).limit(limit)
+    )
+    return {
+        "count": count,
+        "next": f"{POKEAPI_URL}/pokemon?offset={offset + limit}&limit={limit}" if offset + limit < count else None,
+        "previous": f"{POKEAPI_URL}/pokemon?offset={max(offset - limit, 0)}&limit={limit}" if offset > 0 else None,
+        "results": [{"name": name, "url": f"{POKEAPI_URL}/pokemon/{id}/"} for id, name in result.all()],
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Mirror the PokeAPI Pokemon dataset into Postgres")
+    parser.add_argument("--concurrency", type=int, default=MIRROR_INGEST_CONCURRENCY)
+    parser.add_argument("--batch-size", type=int, default=MIRROR_INGEST_BATCH_SIZE)
+    args = parser.parse_args()
+
+    try:
+        stats = await ingest(open_client(), async_session_maker, args.concurrency, args.batch_size)
+    finally:
+        await close_client()
+    print(f"Ingested {stats['ingested']} pokemon, {stats['failed']} failed")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
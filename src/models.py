@@ -2,7 +2,7 @@ import uuid
 from datetime import datetime
 
 from fastapi_users.db import SQLAlchemyBaseUserTableUUID, SQLAlchemyBaseOAuthAccountTableUUID
-from sqlalchemy import TIMESTAMP, Identity, JSON, ForeignKey
+from sqlalchemy import DDL, TIMESTAMP, Identity, Index, JSON, ForeignKey, String, event
 from sqlalchemy.orm import mapped_column, Mapped, declarative_base, relationship
 from sqlalchemy.sql import func
 
@@ -16,7 +16,7 @@ class Role(Base):
     name: Mapped[str] = mapped_column(nullable=False)
     permissions = mapped_column(JSON, nullable=True)
 
-    users: Mapped[list["User"]] = relationship(back_populates="role", lazy='joined')
+    users: Mapped[list["User"]] = relationship(back_populates="role", lazy='raise')
 
 
 class OAuthAccount(SQLAlchemyBaseOAuthAccountTableUUID, Base):
@@ -24,22 +24,49 @@ class OAuthAccount(SQLAlchemyBaseOAuthAccountTableUUID, Base):
 
 
 class User(SQLAlchemyBaseUserTableUUID, Base):
-    logs: Mapped[list["Logs"]] = relationship(back_populates="user", lazy='joined')
+    # collections are never loaded implicitly, the queries that need them ask for them (see auth.utils)
+    logs: Mapped[list["Logs"]] = relationship(back_populates="user", lazy='raise')
     role_id: Mapped[int] = mapped_column(ForeignKey("role.id"))
     role: Mapped["Role"] = relationship(back_populates="users", lazy='joined')
     oauth_accounts: Mapped[list[OAuthAccount]] = relationship(
-        "OAuthAccount", lazy="joined"
+        "OAuthAccount", lazy="raise"
     )
     pass
 
 
 class Logs(Base):
     __tablename__ = "logs"
+    # one (filter, created_at, id) index per /logs filter, matching its keyset order
+    __table_args__ = (
+        Index("ix_logs_created_at_id", "created_at", "id"),
+        Index("ix_logs_user_id_created_at_id", "user_id", "created_at", "id"),
+        Index("ix_logs_winner_id_created_at_id", "winner_id", "created_at", "id"),
+        Index("ix_logs_loser_id_created_at_id", "loser_id", "created_at", "id"),
+        # monthly partitions are created by src.partitions, see the added_logs_partitioning migration
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
 
     id: Mapped[int] = mapped_column(Identity(increment=1, always=True), primary_key=True)
     user_id: Mapped[uuid.UUID] = mapped_column(ForeignKey("user.id"))
-    user: Mapped[User] = relationship(back_populates="logs", lazy='joined')
+    user: Mapped[User] = relationship(back_populates="logs", lazy='raise')
     winner_id: Mapped[int] = mapped_column(nullable=False)
     loser_id: Mapped[int] = mapped_column(nullable=False)
     total_rounds: Mapped[int] = mapped_column(nullable=False)
-    created_at: Mapped[datetime] = mapped_column(TIMESTAMP, nullable=False, default=func.now())
+    # part of the primary key: a partitioned table's unique constraints must include the partition key;
+    # stored as UTC whatever the session time zone, like the partition bounds and the leaderboard scores
+    created_at: Mapped[datetime] = mapped_column(TIMESTAMP, primary_key=True, nullable=False,
+                                                 default=func.timezone("UTC", func.now()))
+
+
+# catches rows no monthly partition covers yet
+event.listen(Logs.__table__, "after_create",
+             DDL("CREATE TABLE IF NOT EXISTS logs_default PARTITION OF logs DEFAULT").execute_if(dialect="postgresql"))
+
+
+class Pokemon(Base):
+    __tablename__ = "pokemon"
+
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=False)
+    name: Mapped[str] = mapped_column(String(100), nullable=False, unique=True, index=True)
+    data = mapped_column(JSON, nullable=False)
+    updated_at: Mapped[datetime] = mapped_column(TIMESTAMP, nullable=False, default=func.now(), onupdate=func.now())
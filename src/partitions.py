@@ -0,0 +1,179 @@
+import argparse
+import asyncio
+import logging
+import re
+from datetime import date, datetime, time
+from typing import List, Optional, Set
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .config import (LOGS_PARTITIONS_AHEAD, LOGS_RETENTION_MONTHS, LOGS_RETENTION_MODE, LOGS_PARTITIONS_INTERVAL,
+                     LOGS_RETENTION_LOCK_TIMEOUT)
+from .database import async_session_maker
+
+logger = logging.getLogger(__name__)
+
+TABLE = "logs"
+PARTITION_NAME = re.compile(rf"^{TABLE}_y(\d{{4}})m(\d{{2}})$")
+COLUMNS = "id, user_id, winner_id, loser_id, total_rounds, created_at"
+# serializes maintenance across workers, the value is arbitrary
+LOCK_ID = 0x6c6f6773
+
+
+def add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"{TABLE}_y{month.year:04d}m{month.month:02d}"
+
+
+async def list_partitions(session: AsyncSession) -> List[date]:
+    result = await session.execute(text(
+        "SELECT child.relname FROM pg_inherits "
+        "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+        "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+        "WHERE parent.relname = :table"
+    ), {"table": TABLE})
+    months = []
+    for name in result.scalars():
+        match = PARTITION_NAME.match(name)
+        if match:
+            months.append(date(int(match[1]), int(match[2]), 1))
+    return sorted(months)
+
+
+async def default_partition(session: AsyncSession) -> Optional[str]:
+    result = await session.execute(text(
+        "SELECT child.relname FROM pg_partitioned_table "
+        "JOIN pg_class parent ON parent.oid = pg_partitioned_table.partrelid "
+        "JOIN pg_class child ON child.oid = pg_partitioned_table.partdefid "
+        "WHERE parent.relname = :table"
+    ), {"table": TABLE})
+    return result.scalar()
+
+
+async def pending_detaches(session: AsyncSession) -> Set[str]:
+    """Partitions left half-detached by an interrupted ``DETACH PARTITION ... CONCURRENTLY``."""
+    result = await session.execute(text(
+        "SELECT child.relname FROM pg_inherits "
+        "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+        "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+        "WHERE parent.relname = :table AND pg_inherits.inhdetachpending"
+    ), {"table": TABLE})
+    return set(result.scalars())
+
+
+async def ensure_partitions(session: AsyncSession, months_ahead: int = LOGS_PARTITIONS_AHEAD,
+                            today: Optional[date] = None) -> List[str]:
+    """Create the monthly partitions from the current month to ``months_ahead`` months ahead.
+
+    Postgres refuses to create a partition while the default partition holds rows of its range, so those
+    rows are moved into the new partition in the same transaction.
+    """
+    current = (today or datetime.utcnow().date()).replace(day=1)
+    existing = set(await list_partitions(session))
+    default = await default_partition(session)
+    created = []
+    for month in (add_months(current, i) for i in range(months_ahead + 1)):
+        if month in existing:
+            continue
+        bounds = {"start": datetime.combine(month, time()), "end": datetime.combine(add_months(month, 1), time())}
+        move = default is not None and (await session.execute(text(
+            f"SELECT EXISTS (SELECT FROM {default} WHERE created_at >= :start AND created_at < :end)"
+        ), bounds)).scalar()
+        if move:
+            await session.execute(text(f"ALTER TABLE {TABLE} DETACH PARTITION {default}"))
+        await session.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {partition_name(month)} PARTITION OF {TABLE} "
+            f"FOR VALUES FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')"
+        ))
+        if move:
+            await session.execute(text(
+                f"WITH moved AS (DELETE FROM {default} WHERE created_at >= :start AND created_at < :end "
+                f"RETURNING {COLUMNS}) "
+                f"INSERT INTO {TABLE} ({COLUMNS}) OVERRIDING SYSTEM VALUE SELECT {COLUMNS} FROM moved"
+            ), bounds)
+            await session.execute(text(f"ALTER TABLE {TABLE} ATTACH PARTITION {default} DEFAULT"))
+            logger.info(f"Moved the rows of {partition_name(month)} out of {default}")
+        created.append(partition_name(month))
+    return created
+
+
+async def apply_retention(connection, retention_months: int = LOGS_RETENTION_MONTHS,
+                          mode: str = LOGS_RETENTION_MODE, today: Optional[date] = None,
+                          lock_timeout: float = LOGS_RETENTION_LOCK_TIMEOUT) -> List[str]:
+    """Detach (``mode="detach"``) or drop (``mode="drop"``) partitions older than ``retention_months``.
+
+    A partition goes once all of its month is past the cutoff; detached tables are kept for archiving.
+    ``connection`` must be in autocommit mode, as ``DETACH PARTITION ... CONCURRENTLY`` cannot run in a
+    transaction block. Postgres does not allow it while the table has a default partition either; then a
+    plain detach waits at most ``lock_timeout`` seconds for its lock, instead of holding up every query on
+    the table behind it, and the partition is retried on the next run.
+    """
+    if retention_months <= 0:
+        return []
+    cutoff = add_months((today or datetime.utcnow().date()).replace(day=1), -retention_months)
+    concurrently = await default_partition(connection) is None
+    pending = await pending_detaches(connection)
+    removed = []
+    for month in await list_partitions(connection):
+        if add_months(month, 1) > cutoff:
+            break
+        name = partition_name(month)
+        if name in pending:
+            await connection.execute(text(f"ALTER TABLE {TABLE} DETACH PARTITION {name} FINALIZE"))
+        elif concurrently:
+            await connection.execute(text(f"ALTER TABLE {TABLE} DETACH PARTITION {name} CONCURRENTLY"))
+        else:
+            await connection.execute(text(f"SET lock_timeout = {int(lock_timeout * 1000)}"))
+            try:
+                await connection.execute(text(f"ALTER TABLE {TABLE} DETACH PARTITION {name}"))
+            finally:
+                await connection.execute(text("RESET lock_timeout"))
+        if mode == "drop":
+            await connection.execute(text(f"DROP TABLE {name}"))
+        removed.append(name)
+    return removed
+
+
+async def maintain(session: AsyncSession) -> dict:
+    await session.execute(text("SELECT pg_advisory_xact_lock(:id)"), {"id": LOCK_ID})
+    created = await ensure_partitions(session)
+    await session.commit()
+
+    connection = await session.connection(execution_options={"isolation_level": "AUTOCOMMIT"})
+    await connection.execute(text("SELECT pg_advisory_lock(:id)"), {"id": LOCK_ID})
+    try:
+        removed = await apply_retention(connection)
+    finally:
+        await connection.execute(text("SELECT pg_advisory_unlock(:id)"), {"id": LOCK_ID})
+    await session.commit()
+    return {"created": created, "removed": removed}
+
+
+async def run(session_maker, interval: float = LOGS_PARTITIONS_INTERVAL):
+    while True:
+        try:
+            async with session_maker() as session:
+                result = await maintain(session)
+            if result["created"] or result["removed"]:
+                logger.info(f"Logs partitions maintained: {result}")
+        except Exception:
+            logger.warning("Logs partition maintenance failed", exc_info=True)
+        await asyncio.sleep(interval)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Create future logs partitions and apply the retention policy")
+    parser.parse_args()
+
+    async with async_session_maker() as session:
+        result = await maintain(session)
+    print(f"Created {result['created']}, {LOGS_RETENTION_MODE} {result['removed']}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
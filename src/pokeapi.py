@@ -0,0 +1,99 @@
+from typing import Optional
+
+import httpx
+from starlette import status
+
+from .circuit_breaker import CircuitBreaker, CircuitOpenException
+from .config import (POKEAPI_URL, POKEAPI_MAX_CONNECTIONS, POKEAPI_MAX_KEEPALIVE_CONNECTIONS,
+                     POKEAPI_KEEPALIVE_EXPIRY, POKEAPI_HTTP2, POKEAPI_TIMEOUT, POKEAPI_CONNECT_TIMEOUT,
+                     CIRCUIT_BREAKER_FAILURE_THRESHOLD, CIRCUIT_BREAKER_RECOVERY_TIMEOUT)
+
+
+class PokeAPIException(Exception):
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+_client: Optional[httpx.AsyncClient] = None
+
+breaker = CircuitBreaker(CIRCUIT_BREAKER_FAILURE_THRESHOLD, CIRCUIT_BREAKER_RECOVERY_TIMEOUT)
+
+
+def open_client() -> httpx.AsyncClient:
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            base_url=POKEAPI_URL,
+            http2=POKEAPI_HTTP2,
+            limits=httpx.Limits(
+                max_connections=POKEAPI_MAX_CONNECTIONS,
+                max_keepalive_connections=POKEAPI_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=POKEAPI_KEEPALIVE_EXPIRY,
+            ),
+            timeout=httpx.Timeout(POKEAPI_TIMEOUT, connect=POKEAPI_CONNECT_TIMEOUT),
+        )
+    return _client
+
+
+async def close_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def get_client() -> httpx.AsyncClient:
+    # Opened by the app lifespan; the lazy fallback covers code paths that run without it (tests, scripts).
+    return open_client()
+
+
+async def _request(client: httpx.AsyncClient, path: str, params: dict) -> httpx.Response:
+    try:
+        response = await client.get(path, params=params or None)
+    except httpx.TimeoutException as e:
+        raise PokeAPIException(status.HTTP_504_GATEWAY_TIMEOUT, "PokeAPI request timed out") from e
+    except httpx.HTTPError as e:
+        raise PokeAPIException(status.HTTP_502_BAD_GATEWAY, "PokeAPI request failed") from e
+    if response.status_code >= status.HTTP_500_INTERNAL_SERVER_ERROR:
+        raise PokeAPIException(status.HTTP_502_BAD_GATEWAY, "PokeAPI is unavailable")
+    return response
+
+
+async def _get(path: str, client: Optional[httpx.AsyncClient] = None, **params) -> httpx.Response:
+    # the breaker guards live requests on the shared client; a caller with its own client (the offline
+    # mirror ingest) neither trips it nor is stopped by it
+    if client is not None:
+        return await _request(client, path, params)
+
+    try:
+        breaker.before_call()
+    except CircuitOpenException as e:
+        raise PokeAPIException(status.HTTP_503_SERVICE_UNAVAILABLE, "PokeAPI is unavailable") from e
+    try:
+        response = await _request(get_client(), path, params)
+    except PokeAPIException:
+        breaker.record_failure()
+        raise
+    except BaseException:
+        breaker.release()
+        raise
+    breaker.record_success()
+    return response
+
+
+async def fetch_pokemon(poke_name: str, client: Optional[httpx.AsyncClient] = None) -> dict:
+    response = await _get(f"/pokemon/{poke_name}", client)
+
+    if response.status_code == status.HTTP_404_NOT_FOUND:
+        raise PokeAPIException(status.HTTP_404_NOT_FOUND, "Pokemon not found")
+    elif response.status_code != status.HTTP_200_OK:
+        raise PokeAPIException(status.HTTP_422_UNPROCESSABLE_ENTITY, "Invalid pokemon name")
+
+    return response.json()
+
+
+async def fetch_pokemons(limit: int, offset: int = 0, client: Optional[httpx.AsyncClient] = None) -> dict:
+    response = await _get("/pokemon", client, limit=limit, offset=offset)
+    return response.json()
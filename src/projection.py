@@ -0,0 +1,62 @@
+from typing import Any, Dict, Type, Union, get_args, get_origin
+
+from pydantic import BaseModel
+
+FieldTree = Dict[str, "FieldTree"]
+
+
+class InvalidFieldsException(Exception):
+    pass
+
+
+def _nested_model(annotation: Any) -> Union[Type[BaseModel], None]:
+    while get_origin(annotation) is not None:
+        args = [arg for arg in get_args(annotation) if arg is not type(None)]
+        if not args:
+            return None
+        annotation = args[0]
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return annotation
+    return None
+
+
+def parse_fields(fields: str, model: Type[BaseModel]) -> FieldTree:
+    """Parse ``fields=name,stats.base_stat,stats.stat.name`` into a tree checked against ``model``.
+
+    An empty subtree selects the whole value, so ``stats`` wins over ``stats.base_stat`` when both are given.
+    """
+    tree: FieldTree = {}
+    for path in filter(None, (path.strip() for path in fields.split(","))):
+        node, current_model, whole = tree, model, False
+        for name in path.split("."):
+            if current_model is None or name not in current_model.model_fields:
+                raise InvalidFieldsException(f"Unknown field '{path}'")
+            if name in node and not node[name]:
+                whole = True
+                break
+            node = node.setdefault(name, {})
+            current_model = _nested_model(current_model.model_fields[name].annotation)
+        if not whole:
+            node.clear()
+    if not tree:
+        raise InvalidFieldsException("No fields requested")
+    return tree
+
+
+def format_fields(tree: FieldTree, prefix: str = "") -> str:
+    """Canonical form of a field tree, so equivalent ``fields=`` values share one cache entry."""
+    paths = []
+    for name in sorted(tree):
+        path = f"{prefix}{name}"
+        paths.append(format_fields(tree[name], f"{path}.") if tree[name] else path)
+    return ",".join(paths)
+
+
+def project(data: Any, tree: FieldTree) -> Any:
+    if not tree:
+        return data
+    if isinstance(data, list):
+        return [project(item, tree) for item in data]
+    if isinstance(data, dict):
+        return {name: project(data[name], subtree) for name, subtree in tree.items() if name in data}
+    return data
@@ -1,5 +1,10 @@
-from pydantic import BaseModel, Field
-from typing import List, Optional
+import uuid
+from datetime import datetime, timezone
+
+from pydantic import AfterValidator, BaseModel, ConfigDict, Field, RootModel
+from typing import Annotated, Any, Dict, List, Optional
+
+from .config import POKEMON_MAX_ID
 
 
 class Ability(BaseModel):
@@ -101,7 +106,100 @@ class PokemonSchema(BaseModel):
     weight: int
 
 
+class PokemonProjection(RootModel[Dict[str, Any]]):
+    """Only the ``PokemonSchema`` fields picked with ``fields=``, nested the same way."""
+
+
+class PokemonBatchRequest(BaseModel):
+    names: List[str] = Field(min_length=1, max_length=50, description="Names or ids of the pokemons")
+
+
+class PokemonBatchItem(BaseModel):
+    name: str
+    status_code: int
+    pokemon: Optional[PokemonSchema] = None
+    detail: Optional[str] = None
+
+
+class PokemonBatchResponse(BaseModel):
+    results: List[PokemonBatchItem]
+
+
+def to_naive_utc(value: datetime) -> datetime:
+    """Log timestamps are stored as naive UTC, so an aware datetime is converted before it is compared."""
+    if value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+# a datetime filter on Logs.created_at; values without an offset are taken as UTC
+LogTimestamp = Annotated[datetime, AfterValidator(to_naive_utc)]
+
+
 class LogSchema(BaseModel):
-    winner_id: int = Field(gt=0, description="The ID of the winner")
-    loser_id: int = Field(gt=0, description="The ID of the loser")
+    winner_id: int = Field(gt=0, le=POKEMON_MAX_ID, description="The ID of the winner")
+    loser_id: int = Field(gt=0, le=POKEMON_MAX_ID, description="The ID of the loser")
     total_rounds: int = Field(gt=0, description="The total number of rounds")
+
+
+class LogBatchRequest(BaseModel):
+    # items are validated one by one, so a bad log is reported instead of failing the whole batch
+    logs: List[Dict[str, Any]] = Field(min_length=1, max_length=10000, description="Battle logs to store")
+
+
+class LogBatchError(BaseModel):
+    index: int
+    errors: List[Dict[str, Any]]
+
+
+class LogBatchResponse(BaseModel):
+    inserted: int
+    errors: List[LogBatchError]
+
+
+class LogRead(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    user_id: uuid.UUID
+    winner_id: int
+    loser_id: int
+    total_rounds: int
+    created_at: datetime
+
+
+class LogPage(BaseModel):
+    items: List[LogRead]
+    next_cursor: Optional[str] = Field(None, description="Pass as cursor= to get the next page")
+
+
+class LeaderboardEntry(BaseModel):
+    user_id: uuid.UUID
+    rank: int = Field(description="1 is the top of the board")
+    score: float
+
+
+class LeaderboardResponse(BaseModel):
+    board: str
+    top: List[LeaderboardEntry]
+    me: Optional[LeaderboardEntry] = None
+
+
+class PokemonWinRate(BaseModel):
+    pokemon_id: int
+    wins: int
+    losses: int
+    battles: int
+    win_rate: Optional[float] = None
+
+
+class Matchup(BaseModel):
+    opponent_id: int
+    wins: int
+    losses: int
+    win_rate: float
+
+
+class PokemonWinRateResponse(PokemonWinRate):
+    best_matchups: List[Matchup]
+    worst_matchups: List[Matchup]
@@ -0,0 +1,75 @@
+import asyncio
+import json
+import logging
+from typing import Any, Awaitable, Callable, Dict
+
+from redis.exceptions import RedisError
+
+from .config import SINGLE_FLIGHT_LOCK_TIMEOUT, SINGLE_FLIGHT_WAIT_TIMEOUT, SINGLE_FLIGHT_RESULT_TTL
+
+logger = logging.getLogger(__name__)
+
+
+class SingleFlight:
+    """Coalesce concurrent calls for the same key into a single execution.
+
+    In-worker callers share one task per key. When a redis client is set, the leader of each worker also
+    takes a redis lock, so only one worker calls upstream and hands its (JSON) result to the others through
+    a short-lived key. Failures are never stored: every waiter gets the exception and the next call retries.
+    """
+
+    def __init__(self, redis=None):
+        self.redis = redis
+        self._calls: Dict[str, asyncio.Task] = {}
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._run(key, fn))
+            self._calls[key] = task
+            task.add_done_callback(lambda t: self._forget(key, t))
+        # shield: a disconnecting client must not cancel the fetch other waiters are sharing
+        return await asyncio.shield(task)
+
+    def _forget(self, key: str, task: asyncio.Task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled():
+            task.exception()
+
+    async def _run(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        if self.redis is None:
+            return await fn()
+
+        result_key = f"singleflight:result:{key}"
+        lock = self.redis.lock(f"singleflight:lock:{key}", timeout=SINGLE_FLIGHT_LOCK_TIMEOUT,
+                               blocking_timeout=SINGLE_FLIGHT_WAIT_TIMEOUT)
+        try:
+            acquired = await lock.acquire()
+        except RedisError:
+            # without redis this worker fetches on its own, still coalesced with its other callers
+            logger.warning(f"Single-flight lock for '{key}' is unavailable, fetching without it", exc_info=True)
+            return await fn()
+        try:
+            try:
+                shared = await self.redis.get(result_key)
+            except RedisError:
+                logger.warning(f"Failed to read the shared result for '{key}'", exc_info=True)
+                shared = None
+            if shared is not None:
+                return json.loads(shared)
+
+            result = await fn()
+            if acquired:
+                try:
+                    await self.redis.set(result_key, json.dumps(result), ex=SINGLE_FLIGHT_RESULT_TTL)
+                except RedisError:
+                    logger.warning(f"Failed to share the result for '{key}'", exc_info=True)
+            return result
+        finally:
+            if acquired:
+                try:
+                    await lock.release()
+                except RedisError:
+                    # LockError included: the lock expired, or redis went away and it will
+                    pass
@@ -0,0 +1,124 @@
+import asyncio
+import logging
+from collections import Counter
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from fastapi_cache import FastAPICache
+from redis import asyncio as aioredis
+
+from .cache import TwoTierBackend
+from .config import (POPULARITY_FLUSH_INTERVAL, POPULARITY_HEADROOM, WARMUP_TOP_POKEMONS, WARMUP_TOP_PAGES, WARMUP_CONCURRENCY,
+                     WARMUP_BUDGET_SECONDS, REDIS_HOST, REDIS_PORT, SINGLE_FLIGHT_REDIS_LOCK)
+from .pokeapi import close_client
+
+logger = logging.getLogger(__name__)
+
+POKEMON_POPULARITY_KEY = "popularity:pokemon"
+PAGES_POPULARITY_KEY = "popularity:pokemons"
+
+
+class PopularityTracker:
+    """Counts requests per key in process and adds them to redis sorted sets in one pipeline per interval.
+
+    After each flush a set in ``limits`` is trimmed to its top ``limits[key]`` members.
+    """
+
+    def __init__(self, limits: Optional[Dict[str, int]] = None):
+        self.counts: Dict[str, Counter] = {}
+        self.limits = limits or {}
+
+    def record(self, key: str, member: str):
+        self.counts.setdefault(key, Counter())[member] += 1
+
+    async def flush(self, redis):
+        counts, self.counts = self.counts, {}
+        if not counts:
+            return
+        async with redis.pipeline(transaction=False) as pipe:
+            for key, members in counts.items():
+                for member, count in members.items():
+                    pipe.zincrby(key, count, member)
+                if key in self.limits:
+                    pipe.zremrangebyrank(key, 0, -self.limits[key] - 1)
+            await pipe.execute()
+
+    async def run(self, redis, interval: float = POPULARITY_FLUSH_INTERVAL):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.flush(redis)
+            except Exception:
+                logger.warning("Failed to flush popularity counters", exc_info=True)
+
+
+popularity = PopularityTracker({
+    POKEMON_POPULARITY_KEY: WARMUP_TOP_POKEMONS * POPULARITY_HEADROOM,
+    PAGES_POPULARITY_KEY: WARMUP_TOP_PAGES * POPULARITY_HEADROOM,
+})
+
+
+async def warm_up(
+        redis,
+        load_pokemon: Callable[[str], Awaitable[Any]],
+        load_page: Callable[[int, int], Awaitable[Any]],
+        top_pokemons: int = WARMUP_TOP_POKEMONS,
+        top_pages: int = WARMUP_TOP_PAGES,
+        concurrency: int = WARMUP_CONCURRENCY,
+) -> Dict[str, int]:
+    """Load the most requested Pokemon and listing pages through the cached handlers."""
+    names = await redis.zrevrange(POKEMON_POPULARITY_KEY, 0, top_pokemons - 1) if top_pokemons > 0 else []
+    pages = await redis.zrevrange(PAGES_POPULARITY_KEY, 0, top_pages - 1) if top_pages > 0 else []
+    semaphore = asyncio.Semaphore(concurrency)
+    stats = {"loaded": 0, "failed": 0}
+
+    async def load(loader: Callable[[], Awaitable[Any]], member: str):
+        async with semaphore:
+            try:
+                await loader()
+                stats["loaded"] += 1
+            except Exception as e:
+                stats["failed"] += 1
+                logger.info(f"Warm-up of '{member}' failed: {e}")
+
+    tasks = [load(lambda name=name: load_pokemon(name), name) for name in names]
+    for page in pages:
+        offset, limit = map(int, page.split(":"))
+        tasks.append(load(lambda offset=offset, limit=limit: load_page(limit, offset), page))
+    await asyncio.gather(*tasks)
+    return stats
+
+
+async def warm_up_within_budget(warm_up_task: Awaitable[Any], budget: float = WARMUP_BUDGET_SECONDS):
+    """Wait for the warm-up at most ``budget`` seconds; past that it carries on in the background."""
+    task = asyncio.ensure_future(warm_up_task)
+    try:
+        await asyncio.wait_for(asyncio.shield(task), timeout=budget)
+    except asyncio.TimeoutError:
+        logger.info(f"Cache warm-up did not finish within {budget}s, continuing in the background")
+    except Exception:
+        logger.warning("Cache warm-up failed", exc_info=True)
+    return task
+
+
+async def main():
+    # imported here: src.main imports this module for the popularity tracker
+    from .main import aliases, single_flight, get_pokemon_record, get_pokemons_page
+
+    redis = aioredis.from_url(f"redis://{REDIS_HOST}:{REDIS_PORT}", encoding="utf-8", decode_responses=True)
+    # set up as in the app's startup, so the entries are stored under the id keys the app reads
+    aliases.redis = redis
+    if SINGLE_FLIGHT_REDIS_LOCK:
+        single_flight.redis = redis
+    cache_redis = aioredis.from_url(f"redis://{REDIS_HOST}:{REDIS_PORT}")
+    FastAPICache.init(TwoTierBackend(cache_redis), prefix="fastapi-cache")
+    try:
+        stats = await warm_up(redis,
+                              lambda name: get_pokemon_record(poke_name=name),
+                              lambda limit, offset: get_pokemons_page(limit=limit, offset=offset))
+    finally:
+        await close_client()
+    print(f"Warmed up {stats['loaded']} entries, {stats['failed']} failed")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
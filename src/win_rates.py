@@ -0,0 +1,202 @@
+import asyncio
+import json
+import logging
+import time
+import uuid
+from typing import List, Optional, Tuple
+
+import numpy as np
+from scipy import sparse
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .config import POKEMON_MAX_ID, WIN_RATES_CHANNEL, WIN_RATES_RELOAD_INTERVAL, WIN_RATES_SCAN_CHUNK_SIZE
+from .models import Logs
+from .schemas import LogSchema
+
+logger = logging.getLogger(__name__)
+
+
+class WinRatesNotReadyException(Exception):
+    pass
+
+
+def in_range(winners: np.ndarray, losers: np.ndarray) -> np.ndarray:
+    return (winners > 0) & (winners <= POKEMON_MAX_ID) & (losers > 0) & (losers <= POKEMON_MAX_ID)
+
+
+class WinRateMatrix:
+    """Sparse head-to-head counts: ``counts[w, l]`` is how many battles pokemon ``w`` won against ``l``.
+
+    New battles are queued and merged into the CSR matrices in one vectorized step before the next read;
+    per-pokemon win and loss totals are kept as dense vectors and updated at once. Battles with an id above
+    ``POKEMON_MAX_ID`` are ignored, so the matrix never grows past ``POKEMON_MAX_ID + 1`` rows.
+    """
+
+    def __init__(self, counts: Optional[sparse.csr_matrix] = None):
+        if counts is None:
+            counts = sparse.csr_matrix((0, 0), dtype=np.int64)
+        self.counts = counts.tocsr()
+        # losses of pokemon l are column l, read as a row of the transpose
+        self.counts_t = self.counts.T.tocsr()
+        self.wins = np.asarray(self.counts.sum(axis=1), dtype=np.int64).ravel()
+        self.losses = np.asarray(self.counts.sum(axis=0), dtype=np.int64).ravel()
+        self._pending: List[Tuple[np.ndarray, np.ndarray]] = []
+
+    @classmethod
+    def from_counts(cls, winners: np.ndarray, losers: np.ndarray, counts: np.ndarray) -> "WinRateMatrix":
+        known = in_range(winners, losers)
+        winners, losers, counts = winners[known], losers[known], counts[known]
+        size = int(max(winners.max(initial=-1), losers.max(initial=-1))) + 1
+        # duplicate (winner, loser) pairs are summed by the COO -> CSR conversion
+        return cls(sparse.coo_matrix((counts, (winners, losers)), shape=(size, size), dtype=np.int64).tocsr())
+
+    @property
+    def size(self) -> int:
+        return self.wins.shape[0]
+
+    def _grow(self, size: int):
+        if size <= self.size:
+            return
+        self.counts.resize((size, size))
+        self.counts_t.resize((size, size))
+        self.wins = np.concatenate([self.wins, np.zeros(size - self.wins.shape[0], dtype=np.int64)])
+        self.losses = np.concatenate([self.losses, np.zeros(size - self.losses.shape[0], dtype=np.int64)])
+
+    def add(self, winners: np.ndarray, losers: np.ndarray):
+        known = in_range(winners, losers)
+        winners, losers = winners[known], losers[known]
+        if winners.size == 0:
+            return
+        self._grow(int(max(winners.max(), losers.max())) + 1)
+        np.add.at(self.wins, winners, 1)
+        np.add.at(self.losses, losers, 1)
+        self._pending.append((winners, losers))
+
+    def _merge(self):
+        if not self._pending:
+            return
+        winners = np.concatenate([w for w, _ in self._pending])
+        losers = np.concatenate([l for _, l in self._pending])
+        self._pending = []
+        delta = sparse.coo_matrix((np.ones(winners.size, dtype=np.int64), (winners, losers)),
+                                  shape=(self.size, self.size)).tocsr()
+        self.counts = self.counts + delta
+        self.counts_t = self.counts_t + delta.T.tocsr()
+
+    def win_rate(self, pokemon_id: int) -> dict:
+        known = 0 <= pokemon_id < self.size
+        wins = int(self.wins[pokemon_id]) if known else 0
+        losses = int(self.losses[pokemon_id]) if known else 0
+        battles = wins + losses
+        return {"pokemon_id": pokemon_id, "wins": wins, "losses": losses, "battles": battles,
+                "win_rate": wins / battles if battles else None}
+
+    def matchups(self, pokemon_id: int, limit: int, min_battles: int = 1) -> Tuple[List[dict], List[dict]]:
+        """Best and worst opponents of ``pokemon_id`` by head-to-head win rate."""
+        if not 0 <= pokemon_id < self.size:
+            return [], []
+        self._merge()
+        won = self.counts.getrow(pokemon_id).toarray().ravel()
+        lost = self.counts_t.getrow(pokemon_id).toarray().ravel()
+        battles = won + lost
+        opponents = np.flatnonzero(battles >= max(min_battles, 1))
+        rates = won[opponents] / battles[opponents]
+        # ties are broken by the number of battles, so well-established matchups come first
+        order = np.lexsort((-battles[opponents], -rates))
+
+        def rows(indexes: np.ndarray) -> List[dict]:
+            return [{"opponent_id": int(opponents[i]), "wins": int(won[opponents[i]]),
+                     "losses": int(lost[opponents[i]]), "win_rate": float(rates[i])} for i in indexes]
+
+        worst = np.lexsort((-battles[opponents], rates))
+        return rows(order[:limit]), rows(worst[:limit])
+
+    def top(self, limit: int, min_battles: int = 1) -> List[dict]:
+        battles = self.wins + self.losses
+        candidates = np.flatnonzero(battles >= max(min_battles, 1))
+        rates = self.wins[candidates] / battles[candidates]
+        if candidates.size > limit:
+            # only the top ``limit`` rates are sorted
+            best = np.argpartition(-rates, limit - 1)[:limit]
+        else:
+            best = np.arange(candidates.size)
+        best = best[np.lexsort((-battles[candidates[best]], -rates[best]))]
+        return [self.win_rate(int(candidates[i])) for i in best]
+
+
+async def load_matrix(session: AsyncSession, chunk_size: int = WIN_RATES_SCAN_CHUNK_SIZE) -> WinRateMatrix:
+    """Build the matrix from one aggregated scan of ``logs``, streamed in chunks."""
+    stmt = (
+        select(Logs.winner_id, Logs.loser_id, func.count())
+        .where(Logs.winner_id.between(1, POKEMON_MAX_ID), Logs.loser_id.between(1, POKEMON_MAX_ID))
+        .group_by(Logs.winner_id, Logs.loser_id)
+    )
+    winners, losers, counts = [], [], []
+    result = await session.stream(stmt.execution_options(yield_per=chunk_size))
+    async for rows in result.partitions():
+        chunk = np.array(rows, dtype=np.int64).reshape(-1, 3)
+        winners.append(chunk[:, 0])
+        losers.append(chunk[:, 1])
+        counts.append(chunk[:, 2])
+    if not winners:
+        return WinRateMatrix()
+    return WinRateMatrix.from_counts(np.concatenate(winners), np.concatenate(losers), np.concatenate(counts))
+
+
+class WinRates:
+    """Per-worker ``WinRateMatrix`` kept current as logs are written.
+
+    With a redis client, new battles are published on ``WIN_RATES_CHANNEL`` so every worker applies the ones
+    written by the others; without one they are applied locally. The matrix is reloaded from the database
+    every ``WIN_RATES_RELOAD_INTERVAL`` seconds and after redis reconnects, which bounds the drift from
+    messages missed or counted twice around a reload.
+    """
+
+    def __init__(self, redis=None, channel: str = WIN_RATES_CHANNEL):
+        self.redis = redis
+        self.channel = channel
+        self.matrix: Optional[WinRateMatrix] = None
+        self.loaded_at: Optional[float] = None
+
+    def get_matrix(self) -> WinRateMatrix:
+        if self.matrix is None:
+            raise WinRatesNotReadyException("Win rates are still loading")
+        return self.matrix
+
+    def apply(self, pairs: List[List[int]]):
+        if self.matrix is None or not pairs:
+            return
+        battles = np.array(pairs, dtype=np.int64).reshape(-1, 2)
+        self.matrix.add(battles[:, 0], battles[:, 1])
+
+    async def on_logs(self, logs: List[Tuple[uuid.UUID, LogSchema]]):
+        pairs = [[log.winner_id, log.loser_id] for _, log in logs]
+        if self.redis is None:
+            self.apply(pairs)
+        else:
+            await self.redis.publish(self.channel, json.dumps(pairs))
+
+    async def reload(self, session_maker):
+        async with session_maker() as session:
+            self.matrix = await load_matrix(session)
+        self.loaded_at = time.monotonic()
+
+    async def run(self, session_maker, reload_interval: float = WIN_RATES_RELOAD_INTERVAL):
+        while True:
+            try:
+                async with self.redis.pubsub() as pubsub:
+                    # subscribe before loading, so battles written during the load are not lost
+                    await pubsub.subscribe(self.channel)
+                    await self.reload(session_maker)
+                    while True:
+                        message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                        if message is not None:
+                            self.apply(json.loads(message["data"]))
+                        if time.monotonic() - self.loaded_at >= reload_interval:
+                            await self.reload(session_maker)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.warning("Win rate updates failed, reloading", exc_info=True)
+                await asyncio.sleep(1)
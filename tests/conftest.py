@@ -12,7 +12,8 @@ from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import NullPool
 from config import (DB_HOST_TEST, DB_NAME_TEST, DB_PASSWORD_TEST, DB_PORT_TEST, DB_USER_TEST)
 
-from src import app, get_async_session, Base
+from src import app, get_async_session, get_read_session, Base
+from src.pokeapi import breaker
 
 
 DATABASE_URL_TEST = f"postgresql+asyncpg://{DB_USER_TEST}:{DB_PASSWORD_TEST}@{DB_HOST_TEST}:{DB_PORT_TEST}/{DB_NAME_TEST}"
@@ -28,6 +29,7 @@ async def override_get_async_session() -> AsyncGenerator[AsyncSession, None]:
 
 
 app.dependency_overrides[get_async_session] = override_get_async_session
+app.dependency_overrides[get_read_session] = override_get_async_session
 
 
 @pytest.fixture(autouse=True, scope='session')
@@ -55,6 +57,14 @@ async def ac() -> AsyncGenerator[AsyncClient, None]:
         yield ac
 
 
+@pytest.fixture(autouse=True)
+def reset_circuit_breaker():
+    # the PokeAPI breaker is module state, a test that trips it must not fail the ones after it
+    breaker.reset()
+    yield
+    breaker.reset()
+
+
 @pytest.fixture(autouse=True, scope="session")
 def init_cache():
     redis_test = fakeredis.FakeStrictRedis()
@@ -1,14 +1,58 @@
+import asyncio
+import io
+import json
+import re
+import uuid
+from datetime import date, datetime, timedelta
+from types import SimpleNamespace
+
+import fakeredis
+import httpx
+import numpy as np
+import pyarrow.parquet as pq
 import pytest
+from fastapi import HTTPException
+from fastapi_cache import FastAPICache, JsonCoder, default_key_builder
+from fastapi_cache.backends.redis import RedisBackend
 from httpx import AsyncClient
-from starlette.status import HTTP_200_OK, HTTP_422_UNPROCESSABLE_ENTITY, HTTP_404_NOT_FOUND, HTTP_201_CREATED, HTTP_500_INTERNAL_SERVER_ERROR
+from starlette.responses import Response
+from starlette.status import HTTP_200_OK, HTTP_422_UNPROCESSABLE_ENTITY, HTTP_404_NOT_FOUND, HTTP_201_CREATED, HTTP_500_INTERNAL_SERVER_ERROR, HTTP_403_FORBIDDEN
 from unittest.mock import patch,  AsyncMock
 
-from sqlalchemy import select
+from pydantic import ValidationError
+from redis.exceptions import ConnectionError as RedisConnectionError
+from sqlalchemy import select, text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.dialects import postgresql
 
 from conftest import async_session_maker
+from src import mirror
+from src.aliases import AliasIndex
+from src.auth.hashing import PasswordHasher, HashingOverloadedException
+from src.auth.base_config import current_user
+from src.auth.manager import UserManager
+from src.auth.principals import principal_cache
+from src.auth.two_f_a import create_challenge, read_challenge, set_otp_to_redis, verify_otp_from_redis
+from src.auth.utils import UserDatabase
+from src import compact, export, partitions, pokeapi
+from src import main as main_module, warmup
+from src.config import POKEMON_MAX_ID
+from src.cache import LRUCache, TwoTierBackend, ResponseCoder, CompactResponseCoder, cached
+from src.circuit_breaker import CircuitBreaker, CircuitOpenException
 from src.ftp_client import FTPException
-from src.models import Logs
-from src.schemas import LogSchema, PokemonSchema
+from src.leaderboard import Leaderboard
+from src.log_buffer import LogWriteBuffer, RedisStreamLogBuffer, LogBufferFullException
+from src.main import (app, get_pokemon_record, get_single_pokemon, get_pokemon_batch, get_multiple_pokemons, stream_pokemons,
+                      add_to_db_bulk, get_logs, export_logs, get_leaderboard, get_top_win_rates, get_pokemon_win_rate)
+from src.manager import LogsManager, InvalidCursorException, encode_cursor, decode_cursor
+from src.models import Logs, Role, User
+from src.projection import parse_fields, format_fields, InvalidFieldsException
+from src.pokeapi import open_client, close_client, get_client, fetch_pokemon, PokeAPIException
+from src.single_flight import SingleFlight
+from src.win_rates import WinRateMatrix, WinRates
+from src.warmup import (PopularityTracker, warm_up, warm_up_within_budget, POKEMON_POPULARITY_KEY,
+                        PAGES_POPULARITY_KEY)
+from src.schemas import LogSchema, PokemonSchema, PokemonBatchRequest, LogBatchRequest, LogRead, LogPage
 
 
 @pytest.mark.parametrize("mail, winner_id, loser_id, total_rounds, expected_status", [
@@ -62,6 +106,591 @@ async def test_send_mail(mock_send_logs_mail, ac: AsyncClient, mail, winner_id,
 #             assert record is None, "Record found in the database"
 
 
+@patch("src.main.LogsManager")
+async def test_add_to_db_bulk(mock_logs_manager):
+    create_logs_bulk = mock_logs_manager.return_value.create_logs_bulk = AsyncMock(return_value=2)
+    user = SimpleNamespace(id=uuid.uuid4())
+    batch = LogBatchRequest(logs=[
+        {"winner_id": 1, "loser_id": 2, "total_rounds": 3},
+        {"winner_id": 0, "loser_id": 2, "total_rounds": 3},
+        {"winner_id": 4, "loser_id": 5, "total_rounds": 6},
+        {"winner_id": 1},
+    ])
+
+    response = await add_to_db_bulk(batch, user=user, session=None)
+
+    assert response.inserted == 2
+    assert [error.index for error in response.errors] == [1, 3], f"Unexpected errors {response.errors}"
+    assert response.errors[0].errors[0]["loc"] == ("winner_id",)
+    assert create_logs_bulk.call_args.args == (user.id, [LogSchema(winner_id=1, loser_id=2, total_rounds=3),
+                                                        LogSchema(winner_id=4, loser_id=5, total_rounds=6)])
+
+
+async def test_logs_keyset_pagination():
+    async with async_session_maker() as session:
+        role = Role(name="player")
+        session.add(role)
+        await session.flush()
+        user = User(email=f"{uuid.uuid4()}@example.com", hashed_password="hash", role_id=role.id)
+        session.add(user)
+        await session.flush()
+        start = datetime(2024, 1, 1)
+        # pairs of rows share a timestamp, so the id has to break the ties
+        session.add_all([Logs(user_id=user.id, winner_id=25 if i % 3 else 1, loser_id=1 if i % 3 else 25,
+                              total_rounds=i + 1, created_at=start + timedelta(minutes=i // 2)) for i in range(9)])
+        await session.commit()
+
+        manager = LogsManager(session)
+        pages, cursor = [], None
+        while True:
+            page = await manager.get_logs(4, cursor, user_id=user.id)
+            pages.append([log.total_rounds for log in page.items])
+            if page.next_cursor is None:
+                break
+            cursor = page.next_cursor
+        assert pages == [[9, 8, 7, 6], [5, 4, 3, 2], [1]], f"Unexpected pages {pages}"
+
+        page = await manager.get_logs(10, user_id=user.id, pokemon_id=25, created_from=start + timedelta(minutes=1))
+        assert [log.total_rounds for log in page.items] == [9, 8, 7, 6, 5, 4, 3]
+
+
+def test_logs_cursor_round_trips():
+    log = LogRead(id=7, user_id=uuid.uuid4(), winner_id=1, loser_id=2, total_rounds=3,
+                  created_at=datetime(2024, 1, 1, 12, 30, 15, 123456))
+    assert decode_cursor(encode_cursor(log)) == (log.created_at, 7)
+    with pytest.raises(InvalidCursorException):
+        decode_cursor("not a cursor")
+
+
+@pytest.mark.parametrize("is_superuser, requested, expected", [
+    (False, None, "own"),
+    (False, "own", "own"),
+    (False, "other", HTTP_403_FORBIDDEN),
+    (True, None, None),
+    (True, "other", "other"),
+])
+@patch("src.main.LogsManager")
+async def test_get_logs_limits_users_to_their_own_logs(mock_logs_manager, is_superuser, requested, expected):
+    manager_get_logs = mock_logs_manager.return_value.get_logs = AsyncMock(return_value=LogPage(items=[]))
+    user = SimpleNamespace(id=uuid.uuid4(), is_superuser=is_superuser)
+    ids = {None: None, "own": user.id, "other": uuid.uuid4()}
+
+    if expected == HTTP_403_FORBIDDEN:
+        with pytest.raises(HTTPException) as error:
+            await get_logs(user_id=ids[requested], user=user, session=None)
+        assert error.value.status_code == HTTP_403_FORBIDDEN
+        manager_get_logs.assert_not_called()
+    else:
+        await get_logs(user_id=ids[requested], user=user, session=None)
+        assert manager_get_logs.call_args.args[2] == ids[expected]
+
+
+
+@patch("src.main.export.export_logs")
+@patch("src.main.LogsManager")
+async def test_logs_filters_take_offsets_as_utc_and_bound_pokemon_ids(mock_logs_manager, mock_export_logs, ac: AsyncClient):
+    manager_get_logs = mock_logs_manager.return_value.get_logs = AsyncMock(return_value=LogPage(items=[]))
+    mock_export_logs.return_value = export_partitions([], 1)
+    app.dependency_overrides[current_user] = lambda: SimpleNamespace(id=uuid.uuid4(), is_superuser=True)
+    try:
+        params = {"created_from": "2024-01-01T03:00:00+03:00", "created_to": "2024-01-02T00:00:00"}
+        response = await ac.get("/logs", params=params)
+        assert response.status_code == HTTP_200_OK, response.text
+        assert manager_get_logs.call_args.args[4:] == (datetime(2024, 1, 1), datetime(2024, 1, 2))
+
+        response = await ac.get("/logs/export", params={**params, "created_from": "2024-01-01T00:00:00Z"})
+        assert response.status_code == HTTP_200_OK, response.text
+        assert mock_export_logs.call_args.args[4:] == (datetime(2024, 1, 1), datetime(2024, 1, 2))
+
+        for path in ("/logs", "/logs/export"):
+            for pokemon_id in (0, POKEMON_MAX_ID + 1, 2 ** 31):
+                response = await ac.get(path, params={"pokemon_id": pokemon_id})
+                assert response.status_code == HTTP_422_UNPROCESSABLE_ENTITY, f"Expected {pokemon_id} to be rejected"
+    finally:
+        del app.dependency_overrides[current_user]
+
+
+async def export_partitions(rows: list, chunk_size: int):
+    for start in range(0, len(rows), chunk_size):
+        yield rows[start:start + chunk_size]
+
+
+@pytest.mark.parametrize("count", [0, 5])
+async def test_export_logs_csv_and_parquet(count):
+    user_id = uuid.uuid4()
+    rows = [(i, user_id, i + 1, i + 2, 3, datetime(2024, 1, 1) + timedelta(minutes=i)) for i in range(count)]
+
+    chunks = [chunk async for chunk in export.csv_chunks(export_partitions(rows, 2))]
+    lines = b"".join(chunks).decode().splitlines()
+    assert lines[0] == ",".join(export.COLUMNS)
+    assert lines[1:] == [f"{i},{user_id},{i + 1},{i + 2},3,{datetime(2024, 1, 1) + timedelta(minutes=i)}"
+                         for i in range(count)]
+
+    chunks = [chunk async for chunk in export.parquet_chunks(export_partitions(rows, 2))]
+    assert len(chunks) == (count + 1) // 2 + 1, f"Expected one chunk per partition and the footer, but got {len(chunks)}"
+    table = pq.read_table(io.BytesIO(b"".join(chunks)))
+    assert table.num_rows == count
+    assert table.column("user_id").to_pylist() == [str(user_id)] * count
+    assert table.column("created_at").to_pylist() == [row[5] for row in rows]
+
+
+@patch("src.export.export_logs")
+async def test_export_logs_limits_users_to_their_own_logs(mock_export_logs):
+    user = SimpleNamespace(id=uuid.uuid4(), is_superuser=False)
+    with pytest.raises(HTTPException) as error:
+        await export_logs(user_id=uuid.uuid4(), user=user)
+    assert error.value.status_code == HTTP_403_FORBIDDEN
+
+    response = await export_logs(format="parquet", user=user)
+    assert mock_export_logs.call_args.args[1:3] == ("parquet", user.id)
+    assert response.media_type == "application/vnd.apache.parquet"
+
+async def test_leaderboard_updates_and_ranks():
+    board = Leaderboard(fakeredis.aioredis.FakeRedis(decode_responses=True))
+    alice, bob, carol = uuid.uuid4(), uuid.uuid4(), uuid.uuid4()
+    await board.on_logs([(alice, LogSchema(winner_id=1, loser_id=2, total_rounds=10)),
+                         (bob, LogSchema(winner_id=1, loser_id=2, total_rounds=3)),
+                         (bob, LogSchema(winner_id=1, loser_id=2, total_rounds=4))])
+
+    assert await board.top("battles", 10) == [(str(bob), 2.0), (str(alice), 1.0)]
+    assert await board.top("rounds", 1) == [(str(alice), 10.0)]
+    assert await board.rank("rounds", bob) == (1, 7.0)
+    assert await board.rank("battles", carol) is None
+
+
+async def test_leaderboard_rebuild_keeps_recent_scores_on_the_live_clock():
+    async with async_session_maker() as session:
+        # a session time zone far from UTC must not shift created_at
+        await session.execute(text("SET TIME ZONE 'Asia/Tokyo'"))
+        role = Role(name="player")
+        session.add(role)
+        await session.flush()
+        user = User(email=f"{uuid.uuid4()}@example.com", hashed_password="hash", role_id=role.id)
+        session.add(user)
+        await session.flush()
+        session.add(Logs(user_id=user.id, winner_id=1, loser_id=2, total_rounds=3))
+        await session.commit()
+
+        board = Leaderboard(fakeredis.aioredis.FakeRedis(decode_responses=True))
+        await board.on_logs([(user.id, LogSchema(winner_id=1, loser_id=2, total_rounds=3))])
+        live = (await board.rank("recent", user.id))[1]
+        await board.rebuild(session)
+        rebuilt = (await board.rank("recent", user.id))[1]
+    assert abs(rebuilt - live) < 60, f"Expected the rebuild to score on the live clock, but got {rebuilt - live:+.0f} s"
+
+
+@patch("src.manager.SQLAlchemyLogsAdapter")
+async def test_logs_manager_notifies_listeners_after_writes(mock_adapter):
+    mock_adapter.return_value.create_logs = AsyncMock(side_effect=[None, Exception("database is down")])
+    listener = SimpleNamespace(on_logs=AsyncMock())
+    failing_listener = SimpleNamespace(on_logs=AsyncMock(side_effect=Exception("redis is down")))
+    manager = LogsManager(None, listeners=[failing_listener, listener])
+    user_id = uuid.uuid4()
+
+    await manager.create_log(user_id, 1, 2, 3)
+    listener.on_logs.assert_awaited_once_with([(user_id, LogSchema(winner_id=1, loser_id=2, total_rounds=3))])
+
+    with pytest.raises(Exception):
+        await manager.create_log(user_id, 1, 2, 3)
+    assert listener.on_logs.await_count == 1, "Expected failed writes not to reach the listeners"
+
+
+async def test_get_leaderboard(monkeypatch):
+    board = Leaderboard(fakeredis.aioredis.FakeRedis(decode_responses=True))
+    monkeypatch.setattr("src.main.leaderboard", board)
+    user, other = SimpleNamespace(id=uuid.uuid4()), uuid.uuid4()
+    await board.on_logs([(other, LogSchema(winner_id=1, loser_id=2, total_rounds=3))] * 2
+                        + [(user.id, LogSchema(winner_id=1, loser_id=2, total_rounds=3))])
+
+    response = await get_leaderboard("battles", limit=1, user=user)
+    assert [(entry.user_id, entry.rank, entry.score) for entry in response.top] == [(other, 1, 2.0)]
+    assert (response.me.rank, response.me.score) == (2, 1.0)
+
+
+def test_win_rate_matrix():
+    matrix = WinRateMatrix.from_counts(np.array([25, 25, 1]), np.array([1, 4, 25]), np.array([3, 1, 1]))
+    matrix.add(np.array([30, 1]), np.array([25, 25]))
+
+    assert matrix.win_rate(25) == {"pokemon_id": 25, "wins": 4, "losses": 3, "battles": 7, "win_rate": 4 / 7}
+    assert matrix.win_rate(500)["win_rate"] is None
+    best, worst = matrix.matchups(25, 2)
+    assert [(m["opponent_id"], m["wins"], m["losses"]) for m in best] == [(4, 1, 0), (1, 3, 2)]
+    assert [m["opponent_id"] for m in worst] == [30, 1]
+    assert [m["opponent_id"] for m in matrix.matchups(25, 5, min_battles=2)[0]] == [1]
+    assert [row["pokemon_id"] for row in matrix.top(3)] == [30, 25, 1]
+    assert [row["pokemon_id"] for row in matrix.top(3, min_battles=6)] == [25]
+
+
+def test_win_rate_matrix_ignores_ids_out_of_range():
+    with pytest.raises(ValidationError):
+        LogSchema(winner_id=POKEMON_MAX_ID + 1, loser_id=1, total_rounds=3)
+    matrix = WinRateMatrix.from_counts(np.array([25, 2 ** 40]), np.array([1, 25]), np.array([1, 1]))
+    matrix.add(np.array([25, 10 ** 12]), np.array([2 ** 31, 1]))
+    assert matrix.size == 26, "Expected ids above POKEMON_MAX_ID to leave the matrix size alone"
+    assert matrix.win_rate(25)["battles"] == 1
+
+
+async def test_win_rates_endpoints(monkeypatch):
+    rates = WinRates()
+    monkeypatch.setattr("src.main.win_rates", rates)
+    with pytest.raises(HTTPException) as error:
+        await get_top_win_rates(limit=5, min_battles=1)
+    assert error.value.status_code == 503, "Expected 503 until the matrix is loaded"
+
+    rates.matrix = WinRateMatrix()
+    await rates.on_logs([(uuid.uuid4(), LogSchema(winner_id=25, loser_id=1, total_rounds=3))] * 3
+                        + [(uuid.uuid4(), LogSchema(winner_id=1, loser_id=25, total_rounds=3))])
+    response = await get_pokemon_win_rate(25, matchups=5, min_battles=1)
+    assert (response.wins, response.losses, response.win_rate) == (3, 1, 0.75)
+    assert [(m.opponent_id, m.win_rate) for m in response.best_matchups] == [(1, 0.75)]
+    assert [row["pokemon_id"] for row in await get_top_win_rates(limit=5, min_battles=1)] == [25, 1]
+
+
+@patch("src.win_rates.load_matrix", new_callable=AsyncMock)
+async def test_win_rates_apply_battles_published_by_other_workers(mock_load_matrix):
+    mock_load_matrix.return_value = WinRateMatrix()
+    redis = fakeredis.aioredis.FakeRedis()
+    worker, other_worker = WinRates(redis), WinRates(redis)
+    updates = asyncio.create_task(worker.run(FakeSession))
+    await asyncio.sleep(0.05)
+
+    await other_worker.on_logs([(uuid.uuid4(), LogSchema(winner_id=25, loser_id=1, total_rounds=3))])
+    await asyncio.sleep(0.05)
+    assert worker.get_matrix().win_rate(25)["wins"] == 1
+    updates.cancel()
+
+
+
+@pytest.mark.parametrize("lean, joined", [
+    (True, False),
+    (False, True),
+])
+async def test_user_db_get_loads_only_the_principal(lean, joined):
+    user_db = UserDatabase(AsyncMock(), lean=lean)
+    with patch.object(UserDatabase, "_get_user", new_callable=AsyncMock) as mock_get_user:
+        await user_db.get(uuid.uuid4())
+    sql = str(mock_get_user.call_args.args[0].compile(dialect=postgresql.dialect()))
+    assert ("JOIN" in sql) == joined, f"Expected joined={joined}, but got {sql}"
+    assert "logs" not in sql and "oauth_account" not in sql, f"Expected no collections to be loaded, but got {sql}"
+    assert ("hashed_password" in sql) != lean
+
+
+
+async def test_user_db_serves_principals_from_cache_until_updated():
+    user = User(id=uuid.uuid4(), email="ash@example.com", is_active=True, is_superuser=False, is_verified=True)
+    user_db = UserDatabase(AsyncMock(), lean=True)
+    with patch.object(principal_cache, "redis", fakeredis.aioredis.FakeRedis(decode_responses=True)), \
+            patch.object(UserDatabase, "_get_user", new_callable=AsyncMock, return_value=user) as mock_get_user:
+        for _ in range(2):
+            principal = await user_db.get(user.id)
+            assert (principal.id, principal.email, principal.is_active) == (user.id, user.email, True)
+        assert mock_get_user.call_count == 1, "Expected the second lookup to be served from the cache"
+
+        # the read replica still returns the old row, the update itself has to refresh the cache
+        updated = User(id=user.id, email=user.email, is_active=False, is_superuser=False, is_verified=True)
+        await UserManager(user_db).on_after_update(updated, {"is_active": False})
+        principal = await user_db.get(user.id)
+        assert principal.is_active is False, "Expected an update to replace the cached principal"
+        assert mock_get_user.call_count == 1
+
+        await UserManager(user_db).on_after_delete(updated)
+        await user_db.get(user.id)
+        assert mock_get_user.call_count == 2, "Expected a deletion to invalidate the cached principal"
+
+
+
+
+@pytest.mark.parametrize("mode", ["inline", "thread", "process"])
+async def test_password_hasher(mode):
+    hasher = PasswordHasher(mode=mode, workers=2, max_pending=2)
+    try:
+        hashed = await hasher.hash("Pikachu1!")
+        assert await hasher.verify_and_update("Pikachu1!", hashed) == (True, None)
+        assert (await hasher.verify_and_update("Raichu1!", hashed))[0] is False
+    finally:
+        hasher.shutdown()
+    stats = hasher.stats()
+    assert (stats["hashed"], stats["verified"], stats["pending"]) == (1, 2, 0)
+    assert stats["avg_hashing_ms"] > 0
+
+
+async def test_password_hasher_rejects_past_max_pending():
+    hasher = PasswordHasher(mode="thread", workers=1, max_pending=2)
+    try:
+        results = await asyncio.gather(*(hasher.hash("Pikachu1!") for _ in range(3)), return_exceptions=True)
+    finally:
+        hasher.shutdown()
+    assert [isinstance(result, HashingOverloadedException) for result in results] == [False, False, True]
+    assert hasher.stats()["rejected"] == 1
+
+
+async def test_otp_challenge():
+    redis = fakeredis.aioredis.FakeRedis(decode_responses=True)
+    user_id = uuid.uuid4()
+    token, challenge_id = create_challenge(user_id, secret="secret")
+    assert read_challenge(token, secret="secret") == (user_id, challenge_id)
+    assert read_challenge(token, secret="other") is None, "Expected a token signed with another secret to be rejected"
+    assert read_challenge(create_challenge(user_id, secret="secret", lifetime=-1)[0], secret="secret") is None
+
+    await set_otp_to_redis(challenge_id, user_id, "123456", redis)
+    assert not await verify_otp_from_redis(challenge_id, uuid.uuid4(), "123456", redis)
+    assert not await verify_otp_from_redis(challenge_id, user_id, "000000", redis)
+    assert await verify_otp_from_redis(challenge_id, user_id, "123456", redis)
+    assert not await verify_otp_from_redis(challenge_id, user_id, "123456", redis), "Expected a challenge to be single-use"
+
+    await set_otp_to_redis(challenge_id, user_id, "123456", redis)
+    for _ in range(3):
+        await verify_otp_from_redis(challenge_id, user_id, "000000", redis, max_attempts=3)
+    assert not await verify_otp_from_redis(challenge_id, user_id, "123456", redis), \
+        "Expected the challenge to be dropped after too many wrong codes"
+    assert await redis.exists(f"otp:{challenge_id}") == 0
+
+    await set_otp_to_redis(challenge_id, user_id, "123456", redis)
+    guesses = await asyncio.gather(*(verify_otp_from_redis(challenge_id, user_id, f"{guess:06d}", redis, max_attempts=3)
+                                     for guess in range(10)))
+    assert not any(guesses)
+    assert not await verify_otp_from_redis(challenge_id, user_id, "123456", redis), \
+        "Expected concurrent guesses to use up the attempts"
+
+
+@pytest.mark.parametrize("month, months, expected", [
+    (date(2024, 11, 1), 1, date(2024, 12, 1)),
+    (date(2024, 12, 1), 1, date(2025, 1, 1)),
+    (date(2024, 1, 1), -1, date(2023, 12, 1)),
+    (date(2024, 3, 1), -14, date(2023, 1, 1)),
+])
+def test_partitions_add_months(month, months, expected):
+    assert partitions.add_months(month, months) == expected
+
+
+class RecordingSession:
+    def __init__(self):
+        self.statements = []
+
+    async def execute(self, statement, params=None):
+        self.statements.append(str(statement))
+        # no default partition and nothing pending detach
+        return SimpleNamespace(scalar=lambda: None, scalars=lambda: [])
+
+    @property
+    def ddl(self) -> list:
+        return [statement for statement in self.statements if not statement.startswith("SELECT")]
+
+
+@patch("src.partitions.list_partitions", new_callable=AsyncMock)
+async def test_partitions_ensure_and_retention(mock_list_partitions):
+    mock_list_partitions.return_value = [date(2024, 1, 1), date(2024, 2, 1), date(2024, 3, 1), date(2024, 4, 1)]
+    session = RecordingSession()
+    created = await partitions.ensure_partitions(session, months_ahead=2, today=date(2024, 4, 15))
+    assert created == ["logs_y2024m05", "logs_y2024m06"], f"Expected only missing partitions, but got {created}"
+    assert "FOR VALUES FROM ('2024-06-01') TO ('2024-07-01')" in session.ddl[-1]
+
+    assert await partitions.apply_retention(session, retention_months=0, today=date(2024, 4, 15)) == []
+    session = RecordingSession()
+    removed = await partitions.apply_retention(session, retention_months=2, mode="drop", today=date(2024, 4, 15))
+    assert removed == ["logs_y2024m01"], f"Expected only partitions entirely past the cutoff, but got {removed}"
+    assert session.ddl == ["ALTER TABLE logs DETACH PARTITION logs_y2024m01 CONCURRENTLY", "DROP TABLE logs_y2024m01"]
+
+
+async def partition_of(session, log_id: int) -> str:
+    return (await session.execute(text("SELECT tableoid::regclass::text FROM logs WHERE id = :id"),
+                                  {"id": log_id})).scalar()
+
+
+async def scanned_partitions(session, start: datetime, end: datetime) -> set:
+    plan = (await session.execute(text(
+        "EXPLAIN (FORMAT JSON) SELECT * FROM logs WHERE created_at >= :start AND created_at < :end"
+    ), {"start": start, "end": end})).scalar()
+    return set(re.findall(r'"Relation Name": "(\w+)"', json.dumps(plan)))
+
+
+async def test_partitions_maintenance_on_postgres():
+    async with async_session_maker() as session:
+        role = Role(name="player")
+        session.add(role)
+        await session.flush()
+        user = User(email=f"{uuid.uuid4()}@example.com", hashed_password="hash", role_id=role.id)
+        session.add(user)
+        await session.flush()
+        # written before its month had a partition, so it sits in logs_default
+        log = Logs(user_id=user.id, winner_id=1, loser_id=2, total_rounds=3, created_at=datetime(2031, 2, 10))
+        session.add(log)
+        await session.commit()
+        assert await partition_of(session, log.id) == "logs_default"
+
+        created = await partitions.ensure_partitions(session, months_ahead=1, today=date(2031, 1, 20))
+        await session.commit()
+        assert created == ["logs_y2031m01", "logs_y2031m02"]
+        assert await partition_of(session, log.id) == "logs_y2031m02", "Expected the row to move out of logs_default"
+        assert await scanned_partitions(session, datetime(2031, 2, 1), datetime(2031, 3, 1)) == {"logs_y2031m02"}
+        await session.commit()
+
+        connection = await session.connection(execution_options={"isolation_level": "AUTOCOMMIT"})
+        removed = await partitions.apply_retention(connection, retention_months=1, mode="drop", today=date(2031, 3, 5))
+        assert removed == ["logs_y2031m01"]
+
+        # without a default partition, old partitions are detached concurrently
+        await connection.execute(text("ALTER TABLE logs DETACH PARTITION logs_default"))
+        try:
+            removed = await partitions.apply_retention(connection, retention_months=1, today=date(2031, 4, 5))
+        finally:
+            await connection.execute(text("ALTER TABLE logs ATTACH PARTITION logs_default DEFAULT"))
+        assert removed == ["logs_y2031m02"]
+        assert await partitions.list_partitions(connection) == []
+        assert await partition_of(connection, log.id) is None
+        await connection.execute(text("DROP TABLE logs_y2031m02"))
+
+
+class FakeSession:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+
+def written_batches(mock_logs_manager) -> list:
+    return [call.args[0] for call in mock_logs_manager.return_value.create_logs_for_users.call_args_list]
+
+
+@patch("src.log_buffer.LogsManager")
+async def test_log_write_buffer_flushes_by_size_and_time(mock_logs_manager):
+    mock_logs_manager.return_value.create_logs_for_users = AsyncMock()
+    buffer = LogWriteBuffer(FakeSession, max_size=10, batch_size=3, flush_interval=0.05)
+    flusher = asyncio.create_task(buffer.run())
+    user_id = uuid.uuid4()
+    logs = [LogSchema(winner_id=i, loser_id=i + 1, total_rounds=1) for i in range(1, 5)]
+
+    for log in logs[:3]:
+        await buffer.put(user_id, log)
+    await asyncio.sleep(0.01)
+    assert written_batches(mock_logs_manager) == [[(user_id, log) for log in logs[:3]]], "Expected a full batch"
+
+    await buffer.put(user_id, logs[3])
+    await asyncio.sleep(0.01)
+    assert len(written_batches(mock_logs_manager)) == 1, "Expected a short batch to wait for the interval"
+    await asyncio.sleep(0.1)
+    assert written_batches(mock_logs_manager)[1] == [(user_id, logs[3])]
+    assert buffer.stats() == {"queued": 4, "written": 4, "dropped": 0, "rejected": 0, "pending": 0}
+    flusher.cancel()
+
+
+@patch("src.log_buffer.LogsManager")
+async def test_log_write_buffer_backpressure_and_drain(mock_logs_manager):
+    mock_logs_manager.return_value.create_logs_for_users = AsyncMock()
+    buffer = LogWriteBuffer(FakeSession, max_size=2, batch_size=10, flush_interval=60, put_timeout=0.01)
+    log = LogSchema(winner_id=1, loser_id=2, total_rounds=3)
+    await buffer.put(uuid.uuid4(), log)
+    await buffer.put(uuid.uuid4(), log)
+    with pytest.raises(LogBufferFullException):
+        await buffer.put(uuid.uuid4(), log)
+
+    flusher = asyncio.create_task(buffer.run())
+    await asyncio.wait_for(buffer.drain(), 1)
+    assert [len(batch) for batch in written_batches(mock_logs_manager)] == [2], "Expected the drain to flush at once"
+    with pytest.raises(LogBufferFullException):
+        await buffer.put(uuid.uuid4(), log)
+    flusher.cancel()
+
+
+@patch("src.log_buffer.LogsManager")
+async def test_redis_stream_log_buffer_acks_after_write(mock_logs_manager):
+    create_logs_for_users = mock_logs_manager.return_value.create_logs_for_users = AsyncMock()
+    redis = fakeredis.aioredis.FakeRedis(decode_responses=True)
+    buffer = RedisStreamLogBuffer(FakeSession, redis, max_size=10, batch_size=10, flush_interval=0.01, max_retries=0)
+    await buffer._ensure_group()
+    user_id = uuid.uuid4()
+    log = LogSchema(winner_id=1, loser_id=2, total_rounds=3)
+    await buffer.put(user_id, log)
+    await buffer.put(user_id, log)
+
+    create_logs_for_users.side_effect = Exception("database is down")
+    with pytest.raises(Exception):
+        await buffer._flush(block=None)
+    assert await redis.xlen(buffer.stream) == 2, "Expected failed entries to stay in the stream"
+
+    create_logs_for_users.side_effect = None
+    buffer.consumer = "another-worker"
+    with patch("src.log_buffer.LOGS_STREAM_CLAIM_IDLE", 0):
+        await buffer.drain()
+    assert create_logs_for_users.call_args.args[0] == [(user_id, log), (user_id, log)]
+    assert await redis.xlen(buffer.stream) == 0
+
+
+def failing_writes(written: list, flaky: set):
+    """create_logs_for_users rejecting winner 999, failing on 998 and failing once on each winner in flaky."""
+    async def create_logs_for_users(logs):
+        if any(log.winner_id == 999 for _, log in logs):
+            raise IntegrityError("INSERT INTO logs", {}, Exception("violates foreign key constraint"))
+        if any(log.winner_id == 998 for _, log in logs) or flaky & {log.winner_id for _, log in logs}:
+            flaky.difference_update(log.winner_id for _, log in logs)
+            raise Exception("database is down")
+        written.extend(logs)
+    return create_logs_for_users
+
+
+@patch("src.log_buffer.asyncio.sleep", new_callable=AsyncMock)
+@patch("src.log_buffer.LogsManager")
+async def test_log_write_buffer_drops_only_rejected_logs(mock_logs_manager, mock_sleep):
+    written = []
+    mock_logs_manager.return_value.create_logs_for_users = failing_writes(written, flaky={2, 3})
+    buffer = LogWriteBuffer(FakeSession, max_size=10, batch_size=10, flush_interval=0.01, max_retries=0)
+    user_id = uuid.uuid4()
+    valid, rejected, flaky = ((user_id, LogSchema(winner_id=winner_id, loser_id=1, total_rounds=3))
+                              for winner_id in (2, 999, 3))
+
+    # an outage: the batch is retried with backoff until it goes through
+    await buffer._write_batch([valid])
+    assert written == [valid]
+    assert mock_sleep.await_count == 1
+
+    await buffer._write_batch([rejected, flaky])
+    assert written == [valid, flaky], "Expected a log failing for another reason to be retried"
+    assert buffer.counters["dropped"] == 1, "Expected only the rejected log to be dropped"
+
+
+@patch("src.log_buffer.LogsManager")
+async def test_redis_stream_log_buffer_sets_aside_entries_that_cannot_be_written(mock_logs_manager):
+    written = []
+    mock_logs_manager.return_value.create_logs_for_users = failing_writes(written, flaky={997})
+    redis = fakeredis.aioredis.FakeRedis(decode_responses=True)
+    buffer = RedisStreamLogBuffer(FakeSession, redis, max_size=10, batch_size=10, flush_interval=0.01,
+                                  max_retries=0, max_deliveries=2)
+    await buffer._ensure_group()
+    user_id = uuid.uuid4()
+    valid, rejected, failing, flaky = (LogSchema(winner_id=winner_id, loser_id=2, total_rounds=3)
+                                       for winner_id in (1, 999, 998, 997))
+    await buffer.put(user_id, valid)
+    await redis.xadd(buffer.stream, {"user_id": str(user_id),
+                                     "log": json.dumps({"winner_id": POKEMON_MAX_ID + 1, "loser_id": 2, "total_rounds": 3})})
+    for log in (rejected, failing, flaky):
+        await buffer.put(user_id, log)
+
+    with pytest.raises(Exception):
+        await buffer._flush(block=None)
+    assert written == [(user_id, valid)], "Expected the valid entry to be written despite its batch failing"
+    assert await redis.xlen(buffer.stream) == 2, "Expected only the transiently failing entries to stay pending"
+    dead = await redis.xrange(buffer.dead_letter)
+    assert [json.loads(fields["log"])["winner_id"] for _, fields in dead] == [POKEMON_MAX_ID + 1, 999]
+    assert "foreign key" in dead[1][1]["error"]
+
+    with patch("src.log_buffer.LOGS_STREAM_CLAIM_IDLE", 0):
+        assert await buffer._flush(block=None) == 2
+    assert written[-1] == (user_id, flaky)
+    assert await redis.xlen(buffer.stream) == 0, "Expected the entry to be set aside after max_deliveries"
+    assert await redis.xlen(buffer.dead_letter) == 3
+    assert buffer.counters["dropped"] == 3
+
+    # while the database is down, entries stay pending however often they are delivered
+    await buffer.put(user_id, failing)
+    with patch("src.log_buffer.LOGS_STREAM_CLAIM_IDLE", 0):
+        for _ in range(3):
+            with pytest.raises(Exception):
+                await buffer._flush(block=None)
+    assert await redis.xlen(buffer.stream) == 1
+    assert await redis.xlen(buffer.dead_letter) == 3
+
+
 # @pytest.mark.parametrize("mock_return_value, expected_status", [
 #     (None, HTTP_201_CREATED),
 #     (FTPException(), HTTP_500_INTERNAL_SERVER_ERROR),
@@ -138,3 +767,537 @@ async def test_get_multiple_pokemons(ac: AsyncClient, limit: str, expected_statu
 
     if expected_status == HTTP_200_OK:
         assert len(response.json()["results"]) <= int(limit)
+
+
+async def test_pokeapi_client_is_shared():
+    client = open_client()
+    assert get_client() is client, "Expected the pooled client to be reused between requests"
+
+    await close_client()
+    assert client.is_closed, "Expected the client to be closed on shutdown"
+    assert get_client() is not client, "Expected a fresh client after the previous one was closed"
+    await close_client()
+
+
+async def test_single_flight_coalesces_concurrent_calls():
+    single_flight = SingleFlight()
+    calls = 0
+
+    async def fetch():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        return {"name": "pikachu"}
+
+    results = await asyncio.gather(*[single_flight.do("pokemon:pikachu", fetch) for _ in range(10)])
+    assert calls == 1, f"Expected a single upstream call, but got {calls}"
+    assert all(result == {"name": "pikachu"} for result in results)
+
+
+async def test_single_flight_propagates_errors_without_caching_them():
+    single_flight = SingleFlight()
+    calls = 0
+
+    async def fetch():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        raise PokeAPIException(HTTP_404_NOT_FOUND, "Pokemon not found")
+
+    results = await asyncio.gather(*[single_flight.do("pokemon:missingno", fetch) for _ in range(5)],
+                                   return_exceptions=True)
+    assert calls == 1, f"Expected a single upstream call, but got {calls}"
+    assert all(isinstance(result, PokeAPIException) for result in results)
+
+    with pytest.raises(PokeAPIException):
+        await single_flight.do("pokemon:missingno", fetch)
+    assert calls == 2, "Expected the failed call to be retried on the next request"
+
+
+async def test_single_flight_falls_back_to_the_worker_when_redis_is_down():
+    lock = SimpleNamespace(acquire=AsyncMock(side_effect=RedisConnectionError("Connection refused")))
+    single_flight = SingleFlight(SimpleNamespace(lock=lambda *args, **kwargs: lock))
+    calls = 0
+
+    async def fetch():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        return {"name": "pikachu"}
+
+    results = await asyncio.gather(*[single_flight.do("pokemon:pikachu", fetch) for _ in range(5)])
+    assert results == [{"name": "pikachu"}] * 5
+    assert calls == 1, "Expected the worker's callers to still share one fetch"
+
+
+def test_lru_cache_evicts_by_size():
+    lru = LRUCache(max_bytes=10)
+    lru.set("a", b"12345", 60)
+    lru.set("b", b"12345", 60)
+    lru.get_with_ttl("a")
+    lru.set("c", b"123", 60)
+
+    assert lru.get_with_ttl("b") == (0, None), "Expected the least recently used entry to be evicted"
+    assert lru.get_with_ttl("a")[1] == b"12345"
+    assert lru.size == 8, f"Expected 8 bytes in cache, but got {lru.size}"
+
+    lru.set("big", b"x" * 11, 60)
+    assert lru.get_with_ttl("big") == (0, None), "Expected values larger than the cache to be skipped"
+
+
+async def test_two_tier_backend():
+    redis = fakeredis.aioredis.FakeRedis()
+    worker_1, worker_2 = TwoTierBackend(redis), TwoTierBackend(redis)
+
+    await worker_1.set("fastapi-cache::pikachu", b'{"name": "pikachu"}', 60)
+    assert await worker_2.get("fastapi-cache::pikachu") == b'{"name": "pikachu"}'
+    ttl, value = await worker_2.get_with_ttl("fastapi-cache::pikachu")
+    assert 0 < ttl <= 60, f"Expected the L1 TTL to follow redis, but got {ttl}"
+    assert worker_2.stats()["l1"]["hits"] == 1
+    assert worker_2.stats()["l2"]["hits"] == 1
+
+    worker_2._invalidate(key="fastapi-cache::pikachu")
+    assert worker_2.l1.get_with_ttl("fastapi-cache::pikachu") == (0, None)
+
+
+@pytest.fixture
+def fake_cache(monkeypatch):
+    redis = fakeredis.aioredis.FakeRedis()
+    monkeypatch.setattr(FastAPICache, "_backend", RedisBackend(redis))
+    monkeypatch.setattr(FastAPICache, "_prefix", "fastapi-cache")
+    monkeypatch.setattr(FastAPICache, "_coder", JsonCoder)
+    monkeypatch.setattr(FastAPICache, "_key_builder", default_key_builder)
+    monkeypatch.setattr(FastAPICache, "_cache_status_header", "X-FastAPI-Cache")
+    monkeypatch.setattr("src.main.aliases", AliasIndex())
+    return redis
+
+
+async def make_stale(redis, ttl: int):
+    for key in await redis.keys("fastapi-cache*"):
+        await redis.expire(key, ttl)
+
+
+@pytest.mark.parametrize("stale_while_revalidate, stale_if_error", [
+    (True, False),
+    (False, True),
+])
+async def test_cached_serves_stale_entries(fake_cache, stale_while_revalidate, stale_if_error):
+    calls = 0
+    upstream_down = False
+
+    @cached(expire=60, grace=60, stale_while_revalidate=stale_while_revalidate, stale_if_error=stale_if_error)
+    async def fetch(poke_name: str):
+        nonlocal calls
+        calls += 1
+        if upstream_down:
+            raise HTTPException(status_code=HTTP_500_INTERNAL_SERVER_ERROR)
+        return {"name": poke_name, "version": calls}
+
+    assert await fetch(poke_name="pikachu") == {"name": "pikachu", "version": 1}
+    assert await fetch(poke_name="pikachu") == {"name": "pikachu", "version": 1}
+    assert calls == 1, "Expected the second call to be served from cache"
+
+    await make_stale(fake_cache, 30)
+    upstream_down = True
+    assert await fetch(poke_name="pikachu") == {"name": "pikachu", "version": 1}, "Expected the stale entry"
+    await asyncio.sleep(0.01)
+    assert calls == 2, "Expected exactly one refresh attempt"
+
+    upstream_down = False
+    assert await fetch(poke_name="pikachu") == {"name": "pikachu", "version": 1 if stale_while_revalidate else 3}
+    await asyncio.sleep(0.01)
+    assert calls == 3
+    assert await fetch(poke_name="pikachu") == {"name": "pikachu", "version": 3}, "Expected the refreshed entry"
+
+
+def pokemon_payload(poke_id: int, name: str) -> dict:
+    return {
+        "abilities": [{"ability": {"name": "static", "url": "test"}, "is_hidden": False, "slot": 1}],
+        "forms": [{"name": name, "url": "test"}],
+        "game_indices": [{"game_index": 1, "version": {"name": "red", "url": "test"}}],
+        "height": 4,
+        "id": poke_id,
+        "moves": [{"move": {"name": "thunder", "url": "test"}, "version_group_details": [
+            {"level_learned_at": 1, "move_learn_method": {"name": "level-up", "url": "test"},
+             "version_group": {"name": "red-blue", "url": "test"}}]}],
+        "name": name,
+        "order": poke_id,
+        "species": {"name": name, "url": "test"},
+        "sprites": {"front_default": "test", "front_shiny": "test"},
+        "stats": [{"base_stat": 35, "effort": 0, "stat": {"name": "hp", "url": "test"}}],
+        "types": [{"slot": 1, "type": {"name": "electric", "url": "test"}}],
+        "weight": 60,
+    }
+
+
+STUB_POKEMONS = {"pikachu": 25, "raichu": 26, "broken": 27}
+
+
+def pokeapi_stub(request: httpx.Request) -> httpx.Response:
+    if request.url.path == "/api/v2/pokemon":
+        names = list(STUB_POKEMONS)[:int(request.url.params["limit"])]
+        return httpx.Response(HTTP_200_OK, json={
+            "count": len(STUB_POKEMONS), "next": None, "previous": None,
+            "results": [{"name": name, "url": f"https://stub/api/v2/pokemon/{name}/"} for name in names],
+        })
+    name = request.url.path.rsplit("/", 1)[-1]
+    if name == "broken":
+        return httpx.Response(HTTP_200_OK, json={"name": name})
+    return httpx.Response(HTTP_200_OK, json=pokemon_payload(STUB_POKEMONS[name], name))
+
+
+async def test_mirror_ingest():
+    for _ in range(pokeapi.breaker.failure_threshold):
+        pokeapi.breaker.record_failure()
+    assert pokeapi.breaker.state == CircuitBreaker.OPEN
+    async with httpx.AsyncClient(transport=httpx.MockTransport(pokeapi_stub), base_url="https://stub/api/v2") as stub:
+        stats = await mirror.ingest(stub, async_session_maker, concurrency=2, batch_size=1)
+    assert stats == {"ingested": 2, "failed": 1}, f"Unexpected ingestion stats {stats}"
+
+    async with async_session_maker() as session:
+        assert (await mirror.get_pokemon(session, "pikachu"))["id"] == 25
+        assert (await mirror.get_pokemon(session, "26"))["name"] == "raichu"
+        assert await mirror.get_pokemon(session, "broken") is None
+        listing = await mirror.get_pokemons(session, 1)
+        assert listing["count"] == 2
+        assert [item["name"] for item in listing["results"]] == ["pikachu"]
+
+
+async def fake_fetch_pokemon(poke_name: str) -> dict:
+    if poke_name not in STUB_POKEMONS:
+        raise PokeAPIException(HTTP_404_NOT_FOUND, "Pokemon not found")
+    return pokemon_payload(STUB_POKEMONS[poke_name], poke_name)
+
+
+@patch("src.main.fetch_pokemon", new_callable=AsyncMock)
+async def test_get_pokemon_batch(mock_fetch_pokemon, fake_cache):
+    mock_fetch_pokemon.side_effect = fake_fetch_pokemon
+    await get_single_pokemon(poke_name="pikachu")
+    mock_fetch_pokemon.reset_mock()
+
+    response = await get_pokemon_batch(PokemonBatchRequest(names=["pikachu", "raichu", "missingno", "pikachu"]))
+
+    assert [item.name for item in response.results] == ["pikachu", "raichu", "missingno", "pikachu"]
+    assert [item.status_code for item in response.results] == [HTTP_200_OK, HTTP_200_OK, HTTP_404_NOT_FOUND, HTTP_200_OK]
+    assert response.results[1].pokemon.id == 26
+    assert response.results[2].detail == "Pokemon not found"
+    fetched = sorted(call.args[0] for call in mock_fetch_pokemon.call_args_list)
+    assert fetched == ["missingno", "raichu"], f"Expected only cache misses to be fetched, but got {fetched}"
+
+
+async def fake_fetch_pokemons(limit: int, offset: int = 0) -> dict:
+    names = [f"pokemon-{i}" for i in range(250)]
+    return {
+        "count": len(names),
+        "next": "next" if offset + limit < len(names) else None,
+        "previous": None,
+        "results": [{"name": name, "url": "test"} for name in names[offset:offset + limit]],
+    }
+
+
+@patch("src.main.fetch_pokemons", new_callable=AsyncMock)
+async def test_get_multiple_pokemons_caps_page_size(mock_fetch_pokemons, fake_cache):
+    mock_fetch_pokemons.side_effect = fake_fetch_pokemons
+    page = await get_multiple_pokemons(limit=100000, offset=200)
+    assert len(page["results"]) == 50
+    assert mock_fetch_pokemons.call_args.args == (100, 200), "Expected the page size to be capped"
+
+    await get_multiple_pokemons(limit=1000, offset=200)
+    assert mock_fetch_pokemons.call_count == 1, "Expected over-cap limits to share the capped page's cache entry"
+    assert len(await fake_cache.keys("fastapi-cache:pokemons:*")) == 1
+
+
+@pytest.mark.parametrize("limit, offset, expected_rows, expected_fetches", [
+    (None, 0, 250, 3),
+    (120, 10, 120, 2),
+    (5, 248, 2, 1),
+])
+@patch("src.main.fetch_pokemons", new_callable=AsyncMock)
+async def test_stream_pokemons(mock_fetch_pokemons, fake_cache, limit, offset, expected_rows, expected_fetches):
+    mock_fetch_pokemons.side_effect = fake_fetch_pokemons
+    response = await stream_pokemons(limit=limit, offset=offset)
+    rows = [json.loads(line) async for line in response.body_iterator]
+
+    assert len(rows) == expected_rows, f"Expected {expected_rows} rows, but got {len(rows)}"
+    assert rows[0]["name"] == f"pokemon-{offset}"
+    assert mock_fetch_pokemons.call_count == expected_fetches
+
+
+async def test_stream_pokemons_reads_pages_served_as_responses(monkeypatch):
+    async def page_response(limit: int, offset: int) -> Response:
+        # as a coder that keeps the stored bytes would return a hit
+        page = await fake_fetch_pokemons(limit, offset)
+        return Response(content=json.dumps(page), media_type="application/json")
+
+    monkeypatch.setattr("src.main.get_pokemons_page", page_response)
+    response = await stream_pokemons(limit=5, offset=0)
+    rows = [json.loads(line) async for line in response.body_iterator]
+    assert [row["name"] for row in rows] == [f"pokemon-{i}" for i in range(5)]
+
+
+@patch("src.main.fetch_pokemon", new_callable=AsyncMock)
+async def test_get_single_pokemon_serves_preserialized_hits(mock_fetch_pokemon, fake_cache):
+    mock_fetch_pokemon.side_effect = fake_fetch_pokemon
+    miss = await get_single_pokemon(poke_name="pikachu")
+    hit = await get_single_pokemon(poke_name="pikachu")
+
+    assert isinstance(hit, Response), "Expected cache hits to be sent as stored bytes"
+    assert hit.body == miss.body
+    assert hit.media_type == "application/json"
+    assert hit.headers["X-FastAPI-Cache"] == "HIT"
+    assert PokemonSchema.model_validate_json(hit.body) == PokemonSchema(**pokemon_payload(25, "pikachu"))
+    mock_fetch_pokemon.assert_called_once()
+
+
+@patch("src.main.fetch_pokemon", new_callable=AsyncMock)
+async def test_get_single_pokemon_shares_entry_across_aliases(mock_fetch_pokemon, fake_cache):
+    mock_fetch_pokemon.side_effect = fake_fetch_pokemon
+    responses = [await get_single_pokemon(poke_name=name) for name in ["Pikachu", "pikachu", "25", " PIKACHU "]]
+
+    assert [response.headers["X-FastAPI-Cache"] for response in responses] == ["MISS", "HIT", "HIT", "HIT"]
+    assert len({response.body for response in responses}) == 1
+    mock_fetch_pokemon.assert_called_once_with("pikachu")
+    keys = await fake_cache.keys("fastapi-cache:pokemon:*")
+    assert keys == [b"fastapi-cache:pokemon:25"], f"Expected a single entry under the id key, but got {keys}"
+
+
+async def test_alias_index_is_shared_through_redis():
+    redis = fakeredis.aioredis.FakeRedis(decode_responses=True)
+    await AliasIndex(redis).learn("mr-mime", 122)
+
+    index = AliasIndex(redis)
+    assert await index.resolve("Mr Mime") == 122
+    assert await index.resolve("122") == 122
+    assert await index.resolve("missingno") is None
+
+    index = AliasIndex(redis)
+    with patch.object(redis, "hmget", wraps=redis.hmget) as hmget, patch.object(redis, "hget") as hget:
+        assert await index.resolve_many(["Mr Mime", "25", "missingno", "mr-mime"]) == [122, 25, None, 122]
+    assert hmget.call_count == 1 and hget.call_count == 0, "Expected one round-trip for every name"
+
+
+async def slow_fetch_pokemon(poke_name: str) -> dict:
+    await asyncio.sleep(0.05)
+    return await fake_fetch_pokemon(poke_name)
+
+
+@patch("src.main.fetch_pokemon", new_callable=AsyncMock)
+async def test_concurrent_misses_for_known_aliases_share_one_fetch(mock_fetch_pokemon, fake_cache):
+    mock_fetch_pokemon.side_effect = slow_fetch_pokemon
+    await main_module.aliases.learn("pikachu", 25)
+    responses = await asyncio.gather(*[get_single_pokemon(poke_name=name) for name in ["pikachu", "25", "Pikachu"]])
+    assert len({response.body for response in responses}) == 1
+    mock_fetch_pokemon.assert_called_once()
+
+
+@patch("src.main.fetch_pokemon", new_callable=AsyncMock)
+async def test_get_pokemon_batch_resolves_aliases_in_one_round_trip(mock_fetch_pokemon, fake_cache):
+    mock_fetch_pokemon.side_effect = fake_fetch_pokemon
+    redis = fakeredis.aioredis.FakeRedis(decode_responses=True)
+    main_module.aliases.redis = redis
+    await get_single_pokemon(poke_name="pikachu")
+    main_module.aliases._ids.clear()
+
+    with patch.object(redis, "hmget", wraps=redis.hmget) as hmget, patch.object(redis, "hget") as hget:
+        response = await get_pokemon_batch(PokemonBatchRequest(names=["pikachu", "PIKACHU", "25"]))
+    assert [item.status_code for item in response.results] == [HTTP_200_OK] * 3
+    assert hmget.call_count == 1 and hget.call_count == 0
+    mock_fetch_pokemon.assert_called_once()
+
+
+@pytest.mark.parametrize("compress_level", [0, 6])
+def test_compact_encoding_round_trips(compress_level: int):
+    pokemon = PokemonSchema(**pokemon_payload(25, "pikachu"))
+    pokemon.moves *= 50
+    encoded = compact.encode(PokemonSchema, pokemon.model_dump(), compress_level)
+
+    assert compact.decode(PokemonSchema, encoded) == pokemon.model_dump()
+    assert len(encoded) < len(pokemon.model_dump_json()) / 4, "Expected the compact entry to be much smaller"
+
+
+def test_compact_response_coder_rebuilds_full_body():
+    coder = CompactResponseCoder.for_model(PokemonSchema)
+    pokemon = PokemonSchema(**pokemon_payload(25, "pikachu"))
+
+    assert coder.decode(coder.encode(pokemon)).body == pokemon.model_dump_json().encode()
+    legacy = ResponseCoder.encode(pokemon)
+    assert coder.body(legacy) == pokemon.model_dump_json().encode(), "Expected plain entries to still decode"
+
+
+@pytest.mark.parametrize("fields, expected", [
+    ("name,id", "id,name"),
+    ("stats.base_stat, name", "name,stats.base_stat"),
+    ("stats.stat.name,stats", "stats"),
+    ("stats,stats.stat.name", "stats"),
+])
+def test_parse_fields(fields: str, expected: str):
+    assert format_fields(parse_fields(fields, PokemonSchema)) == expected
+
+
+@pytest.mark.parametrize("fields", ["unknown", "name.first", "stats.stat.unknown", " , "])
+def test_parse_fields_rejects_invalid_fields(fields: str):
+    with pytest.raises(InvalidFieldsException):
+        parse_fields(fields, PokemonSchema)
+
+
+@patch("src.main.fetch_pokemon", new_callable=AsyncMock)
+async def test_get_single_pokemon_projection(mock_fetch_pokemon, fake_cache):
+    mock_fetch_pokemon.side_effect = fake_fetch_pokemon
+    response = await get_single_pokemon(poke_name="pikachu", fields="name,stats.base_stat,sprites")
+    assert json.loads(response.body) == {
+        "name": "pikachu",
+        "stats": [{"base_stat": 35}],
+        "sprites": {"front_default": "test", "front_shiny": "test"},
+    }
+
+    response = await get_single_pokemon(poke_name="pikachu", fields="types.type.name")
+    assert json.loads(response.body) == {"types": [{"type": {"name": "electric"}}]}
+    mock_fetch_pokemon.assert_called_once()
+
+    with pytest.raises(HTTPException) as e:
+        await get_single_pokemon(poke_name="pikachu", fields="unknown")
+    assert e.value.status_code == HTTP_422_UNPROCESSABLE_ENTITY
+
+
+def test_get_single_pokemon_documents_projections():
+    schema = app.openapi()["paths"]["/pokemon/{poke_name}"]["get"]["responses"]["200"]["content"]["application/json"]
+    refs = [option["$ref"].rsplit("/", 1)[-1] for option in schema["schema"]["anyOf"]]
+    assert "PokemonProjection" in refs and any(ref.startswith("PokemonSchema") for ref in refs)
+
+
+@patch("src.main.fetch_pokemon", new_callable=AsyncMock)
+async def test_get_single_pokemon_caches_not_found(mock_fetch_pokemon, fake_cache):
+    mock_fetch_pokemon.side_effect = fake_fetch_pokemon
+    for _ in range(3):
+        with pytest.raises(HTTPException) as e:
+            await get_single_pokemon(poke_name="missingno")
+        assert e.value.status_code == HTTP_404_NOT_FOUND
+    mock_fetch_pokemon.assert_called_once()
+
+    response = await get_pokemon_batch(PokemonBatchRequest(names=["missingno"]))
+    assert response.results[0].status_code == HTTP_404_NOT_FOUND
+    mock_fetch_pokemon.assert_called_once()
+
+
+
+@patch("src.main.fetch_pokemons", new_callable=AsyncMock)
+@patch("src.main.fetch_pokemon", new_callable=AsyncMock)
+async def test_popularity_records_only_found_pages_and_pokemons(mock_fetch_pokemon, mock_fetch_pokemons, fake_cache,
+                                                                monkeypatch):
+    mock_fetch_pokemon.side_effect = fake_fetch_pokemon
+    mock_fetch_pokemons.side_effect = fake_fetch_pokemons
+    tracker = PopularityTracker()
+    monkeypatch.setattr("src.main.popularity", tracker)
+
+    await get_single_pokemon(poke_name="Pikachu")
+    with pytest.raises(HTTPException):
+        await get_single_pokemon(poke_name="missingno")
+    await get_multiple_pokemons(limit=20, offset=0)
+    await get_multiple_pokemons(limit=20, offset=100000)
+
+    assert tracker.counts == {POKEMON_POPULARITY_KEY: {"pikachu": 1}, PAGES_POPULARITY_KEY: {"0:20": 1}}
+
+def test_circuit_breaker(monkeypatch):
+    now = 1000.0
+    monkeypatch.setattr("src.circuit_breaker.time.monotonic", lambda: now)
+    breaker = CircuitBreaker(failure_threshold=2, recovery_timeout=30)
+
+    breaker.before_call()
+    breaker.record_failure()
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    with pytest.raises(CircuitOpenException):
+        breaker.before_call()
+
+    now += 31
+    breaker.before_call()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    with pytest.raises(CircuitOpenException):
+        breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN, "Expected a failed probe to reopen the circuit"
+
+    now += 31
+    breaker.before_call()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.stats() == {"state": "closed", "consecutive_failures": 0, "rejected": 2, "times_opened": 2}
+
+
+async def test_pokeapi_fails_fast_when_circuit_is_open(monkeypatch):
+    calls = 0
+
+    def unavailable(request: httpx.Request) -> httpx.Response:
+        nonlocal calls
+        calls += 1
+        return httpx.Response(503)
+
+    monkeypatch.setattr("src.pokeapi.breaker", CircuitBreaker(failure_threshold=2, recovery_timeout=30))
+    async with httpx.AsyncClient(transport=httpx.MockTransport(unavailable), base_url="https://stub") as stub:
+        monkeypatch.setattr("src.pokeapi.get_client", lambda: stub)
+        statuses = []
+        for _ in range(4):
+            with pytest.raises(PokeAPIException) as e:
+                await fetch_pokemon("pikachu")
+            statuses.append(e.value.status_code)
+        assert calls == 2, f"Expected upstream calls to stop once the circuit opened, but got {calls}"
+        assert statuses == [502, 502, 503, 503]
+
+        # a caller with its own client, like the mirror ingest, is not stopped by the open circuit
+        with pytest.raises(PokeAPIException) as e:
+            await fetch_pokemon("pikachu", client=stub)
+        assert (e.value.status_code, calls) == (502, 3)
+
+
+@patch("src.main.fetch_pokemon", new_callable=AsyncMock)
+async def test_warm_up_cli_stores_entries_under_id_keys(mock_fetch_pokemon, fake_cache, monkeypatch):
+    mock_fetch_pokemon.side_effect = fake_fetch_pokemon
+    redis = fakeredis.aioredis.FakeRedis(decode_responses=True)
+    await redis.zadd(POKEMON_POPULARITY_KEY, {"pikachu": 1})
+    await AliasIndex(redis).learn("pikachu", 25)
+    monkeypatch.setattr("src.warmup.aioredis.from_url",
+                        lambda url, **kwargs: redis if kwargs.get("decode_responses") else fake_cache)
+    monkeypatch.setattr(FastAPICache, "init", lambda backend, prefix: None)
+    monkeypatch.setattr("src.main.single_flight", SingleFlight())
+    await get_pokemon_record(poke_name="pikachu")
+    # a fresh process only knows the aliases shared through redis
+    main_module.aliases._ids.clear()
+    mock_fetch_pokemon.reset_mock()
+    await warmup.main()
+
+    mock_fetch_pokemon.assert_not_called()
+    assert await fake_cache.keys("fastapi-cache:pokemon:*") == [b"fastapi-cache:pokemon:25"]
+
+
+async def test_warm_up_loads_most_popular_keys():
+    redis = fakeredis.aioredis.FakeRedis(decode_responses=True)
+    tracker = PopularityTracker({POKEMON_POPULARITY_KEY: 2})
+    for name, hits in (("pikachu", 5), ("raichu", 3), ("missingno", 1)):
+        for _ in range(hits):
+            tracker.record(POKEMON_POPULARITY_KEY, name)
+    tracker.record(PAGES_POPULARITY_KEY, "0:20")
+    await tracker.flush(redis)
+    assert tracker.counts == {}
+    assert await redis.zscore(POKEMON_POPULARITY_KEY, "pikachu") == 5
+    assert await redis.zscore(POKEMON_POPULARITY_KEY, "missingno") is None, "Expected the set to be trimmed"
+
+    load_pokemon, load_page = AsyncMock(), AsyncMock()
+    stats = await warm_up(redis, load_pokemon, load_page, top_pokemons=2, top_pages=5, concurrency=2)
+
+    assert sorted(call.args[0] for call in load_pokemon.call_args_list) == ["pikachu", "raichu"]
+    load_page.assert_called_once_with(20, 0)
+    assert stats == {"loaded": 3, "failed": 0}
+
+
+async def test_warm_up_respects_budget():
+    finished = asyncio.Event()
+
+    async def slow_warm_up():
+        await asyncio.sleep(0.2)
+        finished.set()
+
+    task = await warm_up_within_budget(slow_warm_up(), budget=0.01)
+    assert not task.done(), "Expected the warm-up to keep running past the budget"
+    await task
+    assert finished.is_set()